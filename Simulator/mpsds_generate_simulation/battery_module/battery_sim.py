@@ -14,7 +14,135 @@ def kwh_to_ah(kwh, voltage):
     """Convert kilowatt-hours to Amp-hours"""
     return (kwh * 1000) / voltage  # Convert kWh to Wh, then to Ah
 
-def battery_status(battery_capacity_ah, voltage, solar_prod, total_consumpt, charge_eff, discharge_eff, energy_loss_convrt, degrading_ratio, initial_state_charge=100.0, current_time=None):
+class BatteryModel:
+    """
+    Battery state kept in memory between updates, for long-running (real-time) simulations.
+
+    Same model and same history format as battery_status, but the history file is only read once (in the constructor)
+    and only written by save(), instead of on every update.
+
+    Parameters:
+    - battery_capacity_ah, voltage, charge_eff, discharge_eff, energy_loss_convrt, degrading_ratio, initial_state_charge:
+      see battery_status
+    - history_file (str, optional): JSON file the history is loaded from and saved to (default: 'battery_history.json')
+    """
+
+    def __init__(self, battery_capacity_ah, voltage, charge_eff, discharge_eff, energy_loss_convrt, degrading_ratio, initial_state_charge=100.0, history_file='battery_history.json'):
+        self.battery_capacity_ah = battery_capacity_ah
+        self.voltage = voltage
+        self.charge_eff = charge_eff
+        self.discharge_eff = discharge_eff
+        self.energy_loss_convrt = energy_loss_convrt
+        self.degrading_ratio = degrading_ratio
+        self.initial_state_charge = initial_state_charge
+        self.history_file = history_file
+
+        # Loaded history, or None until the first update initializes it
+        self.history = None
+        if history_file and os.path.exists(history_file):
+            with open(history_file, 'r') as f:
+                self.history = json.load(f)
+
+    def update(self, solar_prod, total_consumpt, current_time=None):
+        """
+        Apply one reading (solar production and consumption in kWh since the last update) and return the battery status.
+
+        Returns:
+        dict: Battery status with charge_level_ah, charge_level_kwh, discharging_rate, health_status
+        """
+        if current_time is None:
+            current_time = datetime.now()
+
+        # Convert capacity to kWh
+        battery_capacity_kwh = ah_to_kwh(self.battery_capacity_ah, self.voltage)
+        voltage = self.voltage
+
+        # Load or initialize history
+        if self.history is not None:
+            history = self.history
+            last_update = datetime.fromisoformat(history['last_update'])
+            total_cycles = history['total_cycles']
+            current_health = history['current_health']
+            state_charge = history['readings'][-1]['state_charge'] if history['readings'] else self.initial_state_charge
+        else:
+            history = {
+                'last_update': current_time.isoformat(),
+                'total_cycles': 0,
+                'voltage': voltage,
+                'current_health': 100,
+                'readings': []
+            }
+            self.history = history
+            last_update = current_time
+            total_cycles = 0
+            current_health = 100
+            state_charge = self.initial_state_charge
+
+        # Time elapsed since last update (in hours)
+        time_elapsed = (current_time - last_update).total_seconds() / 3600
+
+        # Energy calculations
+        net_energy = solar_prod - total_consumpt
+        current_charge_kwh = (battery_capacity_kwh * state_charge / 100)
+
+        if net_energy > 0:
+            energy_in = net_energy * self.charge_eff * (1 - self.energy_loss_convrt)
+            new_charge_kwh = min(battery_capacity_kwh, current_charge_kwh + energy_in)
+            discharging_rate = 0
+        else:
+            energy_out = abs(net_energy) / self.discharge_eff / (1 - self.energy_loss_convrt)
+            new_charge_kwh = max(0, current_charge_kwh - energy_out)
+            discharging_rate = energy_out / time_elapsed if time_elapsed > 0 else 0
+
+        new_charge_ah = kwh_to_ah(new_charge_kwh, voltage)
+        new_state_charge = (new_charge_kwh / battery_capacity_kwh) * 100
+        cycle_fraction = abs(new_state_charge - state_charge) / 100
+        total_cycles += cycle_fraction
+
+        # Degradation
+        time_factor = time_elapsed * self.degrading_ratio / (365 * 24)
+        cycle_factor = cycle_fraction * self.degrading_ratio / 1000
+        current_health = max(0, current_health - (time_factor + cycle_factor))
+
+        # Current reading
+        current_reading = {
+            'timestamp': current_time.isoformat(),
+            'state_charge': new_state_charge,
+            'charge_level_ah': new_charge_ah,
+            'charge_level_kwh': new_charge_kwh,
+            'discharging_rate': discharging_rate,
+            'health_status': current_health,
+            'cycles': total_cycles,
+            'solar_prod': solar_prod,
+            'total_consumpt': total_consumpt
+        }
+
+        # Update history
+        history['last_update'] = current_time.isoformat()
+        history['total_cycles'] = total_cycles
+        history['current_health'] = current_health
+        history['readings'].append(current_reading)
+
+        return {
+            'battery': {
+                'charge_level_ah': round(new_charge_ah, 2),
+                'charge_level_kwh': round(new_charge_kwh, 2),
+                'discharging_rate': round(discharging_rate, 2),
+                'health_status': round(current_health, 2)
+            }
+        }
+
+    def save(self):
+        """Write the history to history_file (same content battery_status writes after every call)."""
+        if self.history is None or not self.history_file:
+            return
+        tmp_file = self.history_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.history, f, indent=2)
+        os.replace(tmp_file, self.history_file)
+
+
+def battery_status(battery_capacity_ah, voltage, solar_prod, total_consumpt, charge_eff, discharge_eff, energy_loss_convrt, degrading_ratio, initial_state_charge=100.0, current_time=None, history_file='battery_history.json'):
     """
     Simulates and returns battery status over time, managing state via history.
 
@@ -29,93 +157,13 @@ def battery_status(battery_capacity_ah, voltage, solar_prod, total_consumpt, cha
     - degrading_ratio (float): Battery degradation ratio per cycle/time
     - initial_state_charge (float, optional): Initial state of charge (%) if no history (default: 100.0)
     - current_time (datetime, optional): Time of update (defaults to now)
+    - history_file (str, optional): JSON file keeping the battery history between calls (default: 'battery_history.json')
 
     Returns:
     dict: Battery status with charge_level_ah, charge_level_kwh, discharging_rate, health_status
     """
-    if current_time is None:
-        current_time = datetime.now()
-
-    # Convert capacity to kWh
-    battery_capacity_kwh = ah_to_kwh(battery_capacity_ah, voltage)
-
-    # History file
-    HISTORY_FILE = 'battery_history.json'
-
-    # Load or initialize history
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'r') as f:
-            history = json.load(f)
-        last_update = datetime.fromisoformat(history['last_update'])
-        total_cycles = history['total_cycles']
-        current_health = history['current_health']
-        state_charge = history['readings'][-1]['state_charge'] if history['readings'] else initial_state_charge
-    else:
-        history = {
-            'last_update': current_time.isoformat(),
-            'total_cycles': 0,
-            'voltage': voltage,
-            'current_health': 100,
-            'readings': []
-        }
-        last_update = current_time
-        total_cycles = 0
-        current_health = 100
-        state_charge = initial_state_charge
-
-    # Time elapsed since last update (in hours)
-    time_elapsed = (current_time - last_update).total_seconds() / 3600
-
-    # Energy calculations
-    net_energy = solar_prod - total_consumpt
-    current_charge_kwh = (battery_capacity_kwh * state_charge / 100)
-
-    if net_energy > 0:
-        energy_in = net_energy * charge_eff * (1 - energy_loss_convrt)
-        new_charge_kwh = min(battery_capacity_kwh, current_charge_kwh + energy_in)
-        discharging_rate = 0
-    else:
-        energy_out = abs(net_energy) / discharge_eff / (1 - energy_loss_convrt)
-        new_charge_kwh = max(0, current_charge_kwh - energy_out)
-        discharging_rate = energy_out / time_elapsed if time_elapsed > 0 else 0
-
-    new_charge_ah = kwh_to_ah(new_charge_kwh, voltage)
-    new_state_charge = (new_charge_kwh / battery_capacity_kwh) * 100
-    cycle_fraction = abs(new_state_charge - state_charge) / 100
-    total_cycles += cycle_fraction
-
-    # Degradation
-    time_factor = time_elapsed * degrading_ratio / (365 * 24)
-    cycle_factor = cycle_fraction * degrading_ratio / 1000
-    current_health = max(0, current_health - (time_factor + cycle_factor))
-
-    # Current reading
-    current_reading = {
-        'timestamp': current_time.isoformat(),
-        'state_charge': new_state_charge,
-        'charge_level_ah': new_charge_ah,
-        'charge_level_kwh': new_charge_kwh,
-        'discharging_rate': discharging_rate,
-        'health_status': current_health,
-        'cycles': total_cycles,
-        'solar_prod': solar_prod,
-        'total_consumpt': total_consumpt
-    }
-
-    # Update history
-    history['last_update'] = current_time.isoformat()
-    history['total_cycles'] = total_cycles
-    history['current_health'] = current_health
-    history['readings'].append(current_reading)
-
-    with open(HISTORY_FILE, 'w') as f:
-        json.dump(history, f, indent=2)
-
-    return {
-        'battery': {
-            'charge_level_ah': round(new_charge_ah, 2),
-            'charge_level_kwh': round(new_charge_kwh, 2),
-            'discharging_rate': round(discharging_rate, 2),
-            'health_status': round(current_health, 2)
-        }
-    }
\ No newline at end of file
+    battery = BatteryModel(battery_capacity_ah, voltage, charge_eff, discharge_eff, energy_loss_convrt, degrading_ratio,
+                           initial_state_charge=initial_state_charge, history_file=history_file)
+    status = battery.update(solar_prod, total_consumpt, current_time=current_time)
+    battery.save()
+    return status
@@ -0,0 +1,479 @@
+"""
+#########################################################################################################################################################
+
+Benchmarks of the simulator hot paths.
+
+benchmark_engine() times one fast-forward engine: simulated 5-minute ticks per second of wall time. Only the engine is
+timed. The house gets fixed climate values (no PVGIS request), the action log goes to a temporary folder and the
+timing covers the simulation of the horizon plus building the per-interval results. The best of `repeat` runs is
+reported, the same seed is used for every run.
+
+run_suite() runs the benchmark cases (CASES): run_simulation over 1 day / 1 month / 1 year with 1 / 10 / 100 NPCs,
+get_battery_data over a year, get_device_satistical_data with many devices, generate_output and
+standardize_timestamp_format. Every case runs in its own worker process, offline: PVGIS, OpenWeatherMap and the
+irradiance model are replaced by the fixtures of benchmark_fixtures.json. It reports ticks/s or records/s and the
+peak RSS of the worker, and compares them with the stored baseline (benchmark_baseline.json): a case slower or
+bigger than the baseline by more than the tolerance is a regression. --save-baseline stores the results as the new
+baseline. Baselines are only comparable on the same machine.
+
+check_engines() is the equivalence check of the two engines: the same config and seed run through the event engine
+and the per-tick population engine over several weeks, with a temperature that changes every hour, must give the same
+electricity, water and per-device series and the same action log.
+
+Usage: python benchmark.py [config_file] [--days N] [--engine event|population] [--seed SEED] [--repeat R]
+       python benchmark.py [config_file] --check-engines [--days N] [--seed SEED]
+       python benchmark.py --suite [--cases PATTERN ...] [--repeat R] [--baseline FILE] [--tolerance T] [--save-baseline]
+
+#########################################################################################################################################################
+"""
+
+
+import argparse
+import contextlib
+import copy
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from npc import House, ActionCatalog, ActionLogWriter, EventScheduler, create_npcs
+from instrumentation import peak_rss_mb
+
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_FILE = os.path.join(MODULE_DIR, "benchmark_fixtures.json")
+BASELINE_FILE = os.path.join(MODULE_DIR, "benchmark_baseline.json")
+CONFIG_FILE = os.path.join(MODULE_DIR, "config_default.json")
+
+
+def benchmark_engine(config_data, days=30, engine="event", seed=0, repeat=3, start_date="2021-01-01"):
+    """
+    Time one fast-forward engine on config_data.
+
+    Args:
+        config_data (dict): House configuration.
+        days (float): Simulated horizon in days.
+        engine (str): "event" (EventScheduler) or "population" (NPCPopulation).
+        seed (int): Seed of the NPC random streams.
+        repeat (int): Number of timed runs, the best one is reported.
+        start_date (str): First simulated day (YYYY-MM-DD).
+
+    Returns:
+        dict: engine, days, ticks, best/all run times (s) and ticks per second of the best run.
+    """
+    start_time = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone(timedelta(hours=1)))
+    end_time = start_time + timedelta(days=days)
+    catalog = ActionCatalog.from_config(config_data)
+
+    run_times = []
+    ticks = 0
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            house = House(config_data, temperature=20, humidity=50, month=start_time.month, year=start_time.year)
+            action_log = ActionLogWriter(house_name=house.name, FILEPATH=f"{tmp_dir}/user_data.json")
+
+            run_start = time.perf_counter()
+            if engine == "population":
+                from npc_population import NPCPopulation
+                population = NPCPopulation.from_config(config_data, house, start_time, seed=seed, action_log=action_log, catalog=catalog)
+                electricity_consumption = population.run(end_time)[0]
+            else:
+                npcs = create_npcs(config_data, house, start_time, catalog, action_log, seed=seed)
+                scheduler = EventScheduler(house, npcs, start_time, end_time, step=timedelta(minutes=5))
+                scheduler.run()
+                electricity_consumption = scheduler.results()[0]
+            run_times.append(time.perf_counter() - run_start)
+
+            action_log.close()
+            ticks = len(electricity_consumption)
+
+    best = min(run_times)
+    return {
+        "engine": engine,
+        "days": days,
+        "ticks": ticks,
+        "best_s": best,
+        "run_times_s": run_times,
+        "ticks_per_s": ticks / best if best > 0 else float("inf")
+    }
+
+
+def check_engines(config_data, days=28, seed=7, start_date="2024-01-01"):
+    """
+    Run config_data through the event and the population engine with the same seed and compare the results.
+
+    The house gets a synthetic TMY series (daily and yearly cycles), so the temperature penalties of the needs change
+    over the skipped ticks of the event engine.
+
+    Args:
+        config_data (dict): House configuration.
+        days (float): Simulated horizon in days.
+        seed (int): Seed of the NPC random streams.
+        start_date (str): First simulated day (YYYY-MM-DD).
+
+    Returns:
+        dict: Number of differing intervals of every series, the action log lengths and the first differing action
+            (None when the logs are the same), and "equal".
+    """
+    from climateEnviroment.temperature_humidty_airquality import TMYSeries
+    from npc_population import NPCPopulation
+
+    start_time = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone(timedelta(hours=1)))
+    end_time = start_time + timedelta(days=days)
+    hours = np.arange(8760)
+    climate = TMYSeries(temperature=10 + 8 * np.sin(2 * np.pi * hours / 24) + 8 * np.sin(2 * np.pi * hours / 8760),
+                        humidity=55 + 20 * np.cos(2 * np.pi * hours / 24))
+    catalog = ActionCatalog.from_config(config_data)
+
+    runs = {}
+    for engine in ("event", "population"):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            house = House(config_data, temperature=20, humidity=50, month=start_time.month, year=start_time.year, climate=climate)
+            action_log = ActionLogWriter(house_name=house.name, FILEPATH=f"{tmp_dir}/user_data.json")
+            if engine == "population":
+                population = NPCPopulation.from_config(config_data, house, start_time, seed=seed, action_log=action_log, catalog=catalog)
+                results = population.run(end_time)
+            else:
+                npcs = create_npcs(config_data, house, start_time, catalog, action_log, seed=seed)
+                scheduler = EventScheduler(house, npcs, start_time, end_time, step=timedelta(minutes=5))
+                scheduler.run()
+                results = scheduler.results()
+            action_log.flush()
+            with open(action_log.log_path) as f:
+                actions = [json.loads(line) for line in f]
+            action_log.close()
+        runs[engine] = (results, actions)
+
+    (event_results, event_actions), (population_results, population_actions) = runs["event"], runs["population"]
+    report = {name: sum(event_series[timestamp] != population_series.get(timestamp) for timestamp in event_series)
+              for name, event_series, population_series in zip(("electricity", "water", "devices"), event_results, population_results)}
+    report["actions"] = {"event": len(event_actions), "population": len(population_actions)}
+    report["first_differing_action"] = next(({"event": event_action, "population": population_action}
+                                             for event_action, population_action in zip(event_actions, population_actions)
+                                             if event_action != population_action), None)
+    report["equal"] = (not any(report[name] for name in ("electricity", "water", "devices"))
+                       and event_actions == population_actions)
+    return report
+
+
+########################################################## Fixtures ##########################################################
+
+def load_fixtures(path=FIXTURES_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def fixture_irradiance(fixtures, tz, start_date, end_date):
+    """
+    Same keys as solar_irradiance.get_solar_irradiance (every 5 minutes from start_date to end_date included, local
+    time of tz), with the fixture day profile as values.
+    """
+    zone = ZoneInfo(tz)
+    step = fixtures["irradiance_step_seconds"]
+    day = fixtures["irradiance_day"]
+    epoch = int(datetime.fromisoformat(start_date).replace(tzinfo=zone).timestamp())
+    end_epoch = datetime.fromisoformat(end_date).replace(tzinfo=zone).timestamp()
+    irradiance = {}
+    while epoch <= end_epoch:
+        moment = datetime.fromtimestamp(epoch, zone)
+        irradiance[str(moment)] = day[(moment.hour * 3600 + moment.minute * 60 + moment.second) // step]
+        epoch += step
+    return irradiance
+
+
+def fixture_irradiance_array(fixtures, tz, start_date, end_date):
+    """fixture_irradiance as (epochs, ghi) arrays, like solar_irradiance.get_solar_irradiance_array."""
+    irradiance = fixture_irradiance(fixtures, tz, start_date, end_date)
+    epochs = np.array([int(datetime.fromisoformat(timestamp).timestamp()) for timestamp in irradiance], dtype=np.int64)
+    return epochs, np.array(list(irradiance.values()), dtype=float)
+
+
+@contextlib.contextmanager
+def offline_fixtures(fixtures):
+    """Replace the climate, air quality and irradiance calls of the simulator by the fixtures while the block runs."""
+    from climateEnviroment import temperature_humidty_airquality as getTempHomemade
+    import solar_module.solar_irradiance as solar_module
+
+    climate = fixtures["climate"]
+    climate_series = getTempHomemade.TMYSeries.constant(climate["temperature"], climate["humidity"])
+    patches = [
+        (getTempHomemade, "get_tmy_series", lambda: climate_series),
+        (getTempHomemade, "get_temp_hum", lambda when=None: (climate["temperature"], climate["humidity"])),
+        (getTempHomemade, "get_aq", lambda: (climate["air_quality"], climate["air_quality_description"])),
+        (solar_module, "get_solar_irradiance", lambda lat, lon, tz, start_date, end_date: fixture_irradiance(fixtures, tz, start_date, end_date)),
+        (solar_module, "get_solar_irradiance_array", lambda lat, lon, tz, start_date, end_date: fixture_irradiance_array(fixtures, tz, start_date, end_date))
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, replacement in patches:
+        setattr(module, name, replacement)
+    try:
+        yield
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+
+
+def scaled_config(config_data, npcs):
+    """Copy of config_data with `npcs` occupants, cycling over (and renaming) the NPCs of the config."""
+    config_data = copy.deepcopy(config_data)
+    base_npcs = config_data["basic_parameters"]["npc"]
+    config_data["basic_parameters"]["npc"] = [dict(base_npcs[i % len(base_npcs)], name=f"{base_npcs[i % len(base_npcs)]['name']} {i + 1}")
+                                              for i in range(npcs)]
+    config_data["basic_parameters"]["number_of_people"] = npcs
+    return config_data
+
+
+def _day_series(fixtures, days, seed=0):
+    """Solar production (kW) and a synthetic household consumption (kW) over `days` days, same timestamp keys."""
+    from puppeteer import get_solar_production
+
+    end_date = (datetime(2021, 1, 1) + timedelta(days=days)).strftime("%Y-%m-%d")
+    solar_prod = get_solar_production(fixture_irradiance(fixtures, "Europe/Madrid", "2021-01-01", end_date),
+                                      pannel_eff=0.2, num_pannels=10, panel_area_m2=1.5)
+    rng = np.random.default_rng(seed)
+    consumption = dict(zip(solar_prod, (0.3 + rng.gamma(1.5, 0.4, len(solar_prod))).tolist()))
+    return solar_prod, consumption
+
+
+########################################################## Cases ##########################################################
+# Every case factory does the (untimed) setup and returns (run, unit): run() does the timed work once and returns the
+# number of units it processed.
+
+def _run_simulation_case(fixtures, days, npcs, seed=0):
+    from npc import run_simulation
+
+    with open(CONFIG_FILE) as f:
+        config = scaled_config(json.load(f), npcs)
+    end_date = (datetime(2021, 1, 1) + timedelta(days=days)).strftime("%Y-%m-%d")
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results = run_simulation(config, output_path=os.path.join(tmp_dir, "user_data.json"), start_date="2021-01-01",
+                                     end_date=end_date, seed=seed)
+        return len(results[0])
+    return run, "ticks"
+
+
+def _battery_case(fixtures, days):
+    from puppeteer import get_battery_data
+
+    solar_prod, consumption = _day_series(fixtures, days)
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            battery_data = get_battery_data(battery_capacity_ah=100, voltage=48, solar_prod=solar_prod, total_consumpt=consumption,
+                                            charge_eff=0.95, discharge_eff=0.95, energy_loss_convrt=0.02, degrading_ratio=0.03,
+                                            initial_state_charge=95.0, history_file=os.path.join(tmp_dir, "battery_history.json"))
+        return len(battery_data)
+    return run, "records"
+
+
+def _device_usage(timestamps, devices, seed=0):
+    """Per-timestamp device usage in the run_simulation format, `devices` electricity and water devices, some idle."""
+    rng = np.random.default_rng(seed)
+    electricity = [f"Room{i % 12}_device{i}" for i in range(devices)]
+    water = [f"Room{i % 12}_tap{i}" for i in range(devices)]
+    device_usage = {}
+    for ts in timestamps:
+        active = rng.random(2 * devices) < 0.3
+        values = rng.gamma(1.2, 0.05, 2 * devices)
+        device_usage[ts] = {
+            "electricity": {name: float(value) for name, value, on in zip(electricity, values[:devices], active[:devices]) if on},
+            "water": {name: float(value) * 100 for name, value, on in zip(water, values[devices:], active[devices:]) if on}
+        }
+    return device_usage
+
+
+def _statistics_case(fixtures, days, devices):
+    from puppeteer import get_device_satistical_data
+
+    solar_prod, _ = _day_series(fixtures, days)
+    device_usage = _device_usage(solar_prod, devices)
+
+    def run():
+        return len(get_device_satistical_data(dev_dict=device_usage))
+    return run, "records"
+
+
+def _output_case(fixtures, days):
+    from puppeteer import generate_output, get_device_satistical_data, get_solar_grid_consumption, get_battery_data
+
+    solar_prod, consumption = _day_series(fixtures, days)
+    water = {ts: value * 10 for ts, value in consumption.items()}
+    device_usage = _device_usage(solar_prod, 12)
+    statistics = get_device_satistical_data(dev_dict=device_usage)
+    with tempfile.TemporaryDirectory() as tmp_dir, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        grid = get_solar_grid_consumption(solar_production=solar_prod, total_electr_consumption=consumption)
+        battery_data = get_battery_data(battery_capacity_ah=100, voltage=48, solar_prod=solar_prod, total_consumpt=consumption,
+                                        charge_eff=0.95, discharge_eff=0.95, energy_loss_convrt=0.02, degrading_ratio=0.03,
+                                        initial_state_charge=95.0, history_file=os.path.join(tmp_dir, "battery_history.json"))
+    climate = fixtures["climate"]
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            generate_output(houseID="benchmark_house", solar_production=solar_prod, electricity_consumption=consumption,
+                            water_consumption=water, device_consumption=device_usage, solar_grid_consumption=grid,
+                            battery_data=battery_data, device_statistical_data=statistics,
+                            temperature=climate["temperature"], humidity=climate["humidity"], air_quality=climate["air_quality"],
+                            air_quality_description=climate["air_quality_description"], output_dir=tmp_dir)
+        return len(solar_prod)
+    return run, "records"
+
+
+def _timestamp_case(fixtures, count):
+    from puppeteer import standardize_timestamp_format
+
+    start = datetime(2021, 1, 1, tzinfo=timezone(timedelta(hours=1)))
+    timestamps = [(start + timedelta(minutes=5 * i)).isoformat() for i in range(count)]
+
+    def run():
+        for timestamp in timestamps:
+            standardize_timestamp_format(timestamp)
+        return count
+    return run, "records"
+
+
+CASES = {}
+for _days in (1, 30, 365):
+    for _npcs in (1, 10, 100):
+        CASES[f"run_simulation/{_days}d/{_npcs}npc"] = (_run_simulation_case, {"days": _days, "npcs": _npcs})
+CASES["get_battery_data/365d"] = (_battery_case, {"days": 365})
+CASES["get_device_satistical_data/7d/200dev"] = (_statistics_case, {"days": 7, "devices": 200})
+CASES["generate_output/30d"] = (_output_case, {"days": 30})
+CASES["standardize_timestamp_format/100k"] = (_timestamp_case, {"count": 100000})
+
+
+def run_case(name, repeat=3, fixtures_file=FIXTURES_FILE):
+    """
+    Worker: set up and time one case of CASES offline, the best of `repeat` runs. The stdout of the simulator is dropped.
+
+    Returns:
+        dict: case, unit, units, best/all run times (s), units per second of the best run and peak RSS (MB).
+    """
+    factory, params = CASES[name]
+    fixtures = load_fixtures(fixtures_file)
+    run_times = []
+    with offline_fixtures(fixtures), open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        run, unit = factory(fixtures, **params)
+        for _ in range(repeat):
+            run_start = time.perf_counter()
+            units = run()
+            run_times.append(time.perf_counter() - run_start)
+
+    best = min(run_times)
+    return {
+        "case": name,
+        "unit": unit,
+        "units": units,
+        "best_s": best,
+        "run_times_s": run_times,
+        "per_s": units / best if best > 0 else float("inf"),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def compare_to_baseline(result, baseline, tolerance):
+    """'ok', 'regression' (slower or bigger than the baseline by more than tolerance) or 'new' (not in the baseline)."""
+    reference = baseline.get(result["case"])
+    if reference is None:
+        return "new"
+    slower = result["per_s"] < reference["per_s"] * (1 - tolerance)
+    bigger = result["peak_rss_mb"] is not None and reference.get("peak_rss_mb") is not None and result["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + tolerance)
+    return "regression" if slower or bigger else "ok"
+
+
+def run_suite(patterns=None, repeat=3, baseline_file=BASELINE_FILE, tolerance=0.2, save_baseline=False):
+    """
+    Run the cases matching `patterns` (fnmatch, all of them by default), each one in a fresh worker process.
+
+    Args:
+        patterns (list): Case name patterns, e.g. ["run_simulation/30d/*"].
+        repeat (int): Timed runs per case, the best one is reported.
+        baseline_file (str): Stored baseline to compare with.
+        tolerance (float): Allowed slowdown / memory growth before a case is reported as a regression (0.2 = 20%).
+        save_baseline (bool): Store these results in baseline_file (keeping the cases that did not run).
+
+    Returns:
+        list: One run_case() dict per case, plus "status" and the baseline "baseline_per_s".
+    """
+    names = [name for name in CASES if not patterns or any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+    if not names:
+        raise ValueError(f"No benchmark case matches {patterns}.")
+
+    baseline = {}
+    if os.path.exists(baseline_file):
+        with open(baseline_file) as f:
+            baseline = json.load(f)["cases"]
+
+    results = []
+    for name in names:
+        # One process per case, so the peak RSS is the one of that case
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            result = pool.submit(run_case, name, repeat).result()
+        result["status"] = compare_to_baseline(result, baseline, tolerance)
+        result["baseline_per_s"] = baseline.get(name, {}).get("per_s")
+        results.append(result)
+
+        color = {"ok": "\033[92m", "regression": "\033[91m", "new": "\033[93m"}[result["status"]]
+        versus = f" (baseline {result['baseline_per_s']:,.0f})" if result["baseline_per_s"] else ""
+        print(f"{color}{name:<40} {result['per_s']:>14,.0f} {result['unit']}/s{versus}  peak RSS {result['peak_rss_mb']:.0f} MB  "
+              f"[{result['status']}]\033[0m")
+
+    if save_baseline:
+        baseline.update({result["case"]: {"unit": result["unit"], "per_s": result["per_s"], "peak_rss_mb": result["peak_rss_mb"]}
+                         for result in results})
+        with open(baseline_file, "w") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+                       "repeat": repeat, "cases": dict(sorted(baseline.items()))}, f, indent=4)
+        print(f"Baseline saved to {baseline_file}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the simulator: one fast-forward engine, or the whole suite with --suite.")
+    parser.add_argument("config_file", nargs="?", default="config_default.json", help="House config (default: config_default.json)")
+    parser.add_argument("--days", type=float, default=30, help="Simulated days (default: 30)")
+    parser.add_argument("--engine", choices=["event", "population"], default="event", help="Engine to time (default: event)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the NPC random streams (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs, the best one is reported (default: 3)")
+    parser.add_argument("--suite", action="store_true", help="Run the benchmark suite instead of a single engine")
+    parser.add_argument("--cases", nargs="+", default=None, help="Suite case patterns, e.g. 'run_simulation/30d/*' (default: all)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file of the suite (default: benchmark_baseline.json)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown or memory growth (default: 0.2)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the suite results as the new baseline")
+    parser.add_argument("--check-engines", action="store_true", help="Check that the event and population engines give the same results")
+    args = parser.parse_args()
+
+    if args.suite:
+        results = run_suite(args.cases, repeat=args.repeat, baseline_file=args.baseline, tolerance=args.tolerance,
+                            save_baseline=args.save_baseline)
+        regressions = [result["case"] for result in results if result["status"] == "regression"]
+        if regressions:
+            print(f"\033[91m{len(regressions)} regression(s): {', '.join(regressions)}\033[0m")
+            sys.exit(1)
+    elif args.check_engines:
+        with open(args.config_file) as f:
+            config = json.load(f)
+        report = check_engines(config, days=args.days, seed=args.seed)
+        color = "\033[92m" if report["equal"] else "\033[91m"
+        print(f"{color}Engines {'match' if report['equal'] else 'differ'} over {args.days:g} days (seed {args.seed}): "
+              f"differing intervals electricity {report['electricity']}, water {report['water']}, devices {report['devices']}; "
+              f"actions {report['actions']['event']} vs {report['actions']['population']}\033[0m")
+        if not report["equal"]:
+            if report["first_differing_action"]:
+                print(f"First differing action: {report['first_differing_action']}")
+            sys.exit(1)
+    else:
+        with open(args.config_file) as f:
+            config = json.load(f)
+        result = benchmark_engine(config, days=args.days, engine=args.engine, seed=args.seed, repeat=args.repeat)
+        print(f"\033[92m{result['engine']} engine: {result['ticks']} ticks ({result['days']} days) in {result['best_s']:.3f} s "
+              f"-> {result['ticks_per_s']:,.0f} ticks/s (best of {len(result['run_times_s'])})\033[0m")
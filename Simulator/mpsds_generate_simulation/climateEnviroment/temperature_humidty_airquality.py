@@ -1,63 +1,232 @@
+"""
+#########################################################################################################################################################
+
+Climate (PVGIS TMY temperature and humidity) and air quality (OpenWeatherMap AQI) readings of the house.
+
+The TMY (typical meteorological year) is kept as a TMYSeries: one array of temperatures and one of humidities indexed
+by hour of the year, so the simulation reads the climate of every interval with a lookup instead of one constant.
+
+The readings go through a ProviderCache per provider (provider_cache), in memory and on disk, so the several calls of a
+run, of the real time loop and of the worker processes of a fleet make one request per TTL:
+
+    PVGIS TMY           30 days (a typical meteorological year does not change)
+    OpenWeatherMap AQ   1 hour
+
+With the "offline" provider (set_provider("offline") or the environment variable CLIMATE_PROVIDER=offline) no request
+is made: the readings are the "climate" values of a fixtures file (default: benchmark_fixtures.json), the same every
+hour, for runs without network and reproducible results.
+
+#########################################################################################################################################################
+"""
+
+import calendar
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
 import requests
 import pvlib
 
+from provider_cache import ProviderCache
 
-########################################### TEMPERATURE AND HUMIDITY ###########################################
 
-def get_temp_hum():
-    # Latitude and longitude for the location
-    latitude, longitude = 41.38879, 2.15899
+TMY_TTL_SECONDS = 30 * 24 * 3600
+AQ_TTL_SECONDS = 3600
 
-    # Retrieve TMY data from PVGIS
-    tmy_data, metadata, inputs, _ = pvlib.iotools.get_pvgis_tmy(latitude, longitude, outputformat='json', usehorizon=True)
-    
-    # Extract the temperature and humidity data from the DataFrame
-    temperature = tmy_data['temp_air']  # 'temp_air' is the column for air temperature
-    humidity = tmy_data['relative_humidity']  # 'relative_humidity' is the column for relative humidity
+# Latitude and longitude of the readings
+TEMP_HUM_LOCATION = (41.38879, 2.15899)
+AQ_LOCATION = (41.502039828950366, 2.103702324404792)
+
+DEFAULT_FIXTURES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmark_fixtures.json")
+PROVIDERS = ("online", "offline")
+
+_tmy_cache = ProviderCache("pvgis_tmy", TMY_TTL_SECONDS)
+_aq_cache = ProviderCache("openweathermap_aq", AQ_TTL_SECONDS)
+_provider = {"name": os.environ.get("CLIMATE_PROVIDER", "online"), "fixtures_file": os.environ.get("CLIMATE_FIXTURES", DEFAULT_FIXTURES_FILE)}
+_fixtures = {}
+_series = {}
+
+AQI_DESCRIPTIONS = {
+    1: "Air quality outside is good",
+    2: "Air quality outside is fair",
+    3: "Air quality outside is moderate",
+    4: "Air quality outside is poor",
+    5: "Air quality outside is very poor"
+}
+
+
+def set_provider(name: str, fixtures_file: str = None):
+    """
+    Choose where the readings come from.
+
+    Args:
+        name (str): "online" (PVGIS and OpenWeatherMap, cached) or "offline" (fixtures file, no request).
+        fixtures_file (str): JSON file with a "climate" object (temperature, humidity, air_quality,
+            air_quality_description) for the offline provider (default: benchmark_fixtures.json).
+    """
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown climate provider '{name}', expected one of {', '.join(PROVIDERS)}.")
+    _provider["name"] = name
+    _provider["fixtures_file"] = fixtures_file or DEFAULT_FIXTURES_FILE
+    # Set in the environment too, so the worker processes of a run use the same provider
+    os.environ["CLIMATE_PROVIDER"] = name
+    os.environ["CLIMATE_FIXTURES"] = _provider["fixtures_file"]
+
+
+def _fixture_climate():
+    """The "climate" object of the fixtures file, read once."""
+    path = _provider["fixtures_file"]
+    if path not in _fixtures:
+        with open(path) as f:
+            _fixtures[path] = json.load(f)["climate"]
+    return _fixtures[path]
+
+
+########################################### TEMPERATURE AND HUMIDITY ###########################################
+
+HOURS_PER_YEAR = 8760
+
+
+def hour_of_year(epochs):
+    """
+    Hour of the (non-leap) year, in UTC like the TMY index, of epoch seconds (a number or an array). 29 February reads
+    the hours of 28 February.
+    """
+    moments = np.asarray(epochs, dtype=np.float64).astype(np.int64).astype("datetime64[s]")
+    year_start = moments.astype("datetime64[Y]")
+    seconds_of_year = (moments - year_start).astype(np.int64)
+    years = year_start.astype(np.int64) + 1970
+    leap = (years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0))
+    seconds_of_year = seconds_of_year - np.where(leap & (seconds_of_year >= 59 * 86400), 86400, 0)
+    return np.minimum(seconds_of_year // 3600, HOURS_PER_YEAR - 1)
+
+
+class TMYSeries:
+    """
+    Hourly temperature and humidity of a typical meteorological year, as arrays indexed by hour of the year, so the
+    climate of any instant is one lookup and the climate of a whole horizon one gather.
+
+    Args:
+        temperature (array): 8760 air temperatures in Celsius, hour 0 is 1 January 00:00 UTC.
+        humidity (array): 8760 relative humidities in percentage.
+    """
+
+    def __init__(self, temperature, humidity):
+        self.temperature = np.asarray(temperature, dtype=np.float64)
+        self.humidity = np.asarray(humidity, dtype=np.float64)
+        if self.temperature.shape != (HOURS_PER_YEAR,) or self.humidity.shape != (HOURS_PER_YEAR,):
+            raise ValueError(f"A TMY series has {HOURS_PER_YEAR} hourly values, got {self.temperature.shape} and {self.humidity.shape}.")
+
+    @classmethod
+    def constant(cls, temperature: float, humidity: float):
+        """The same reading every hour (offline provider)."""
+        return cls(np.full(HOURS_PER_YEAR, temperature, dtype=np.float64), np.full(HOURS_PER_YEAR, humidity, dtype=np.float64))
+
+    def at(self, when):
+        """
+        Temperature and humidity of one instant.
+
+        Args:
+            when (datetime or float): Aware datetime (naive: local time) or epoch seconds.
+
+        Returns:
+            tuple: (temperature in Celsius, humidity in percentage).
+        """
+        moment = time.gmtime(when.timestamp() if isinstance(when, datetime) else when)
+        day = moment.tm_yday - 1
+        if day >= 59 and calendar.isleap(moment.tm_year):
+            day -= 1
+        hour = day * 24 + moment.tm_hour
+        return float(self.temperature[hour]), float(self.humidity[hour])
+
+    def gather(self, epochs):
+        """
+        Temperature and humidity of many instants at once.
+
+        Args:
+            epochs (array): Epoch seconds.
+
+        Returns:
+            tuple: (temperature array, humidity array), one value per instant.
+        """
+        hours = hour_of_year(epochs)
+        return self.temperature[hours], self.humidity[hours]
+
+
+def _fetch_tmy(latitude, longitude):
+    # Retrieve TMY data from PVGIS (the first item is the data whatever the pvlib version)
+    tmy_data = pvlib.iotools.get_pvgis_tmy(latitude, longitude, outputformat='json', usehorizon=True)[0]
     
-    # Get the current temperature and humidity (first row of the DataFrame)
-    current_temperature = temperature.iloc[0]
-    current_humidity = humidity.iloc[0]
-    return current_temperature, current_humidity
+    # Rows placed by hour of the year: the months of a TMY come from different years
+    hours = hour_of_year([moment.timestamp() for moment in tmy_data.index])
+    if len(np.unique(hours)) != HOURS_PER_YEAR:
+        raise ValueError(f"PVGIS returned a TMY with {len(np.unique(hours))} distinct hours instead of {HOURS_PER_YEAR}.")
+    temperature = np.empty(HOURS_PER_YEAR)
+    humidity = np.empty(HOURS_PER_YEAR)
+    temperature[hours] = tmy_data['temp_air'].to_numpy()  # 'temp_air' is the column for air temperature
+    humidity[hours] = tmy_data['relative_humidity'].to_numpy()  # 'relative_humidity' is the column for relative humidity
+    return {"temperature": temperature.tolist(), "humidity": humidity.tolist()}
+
+
+def get_tmy_series():
+    """TMYSeries of the house location: the PVGIS TMY (cached), or the fixtures reading every hour when offline."""
+    if _provider["name"] == "offline":
+        key = ("offline", _provider["fixtures_file"])
+        if key not in _series:
+            climate = _fixture_climate()
+            _series[key] = (None, TMYSeries.constant(climate["temperature"], climate["humidity"]))
+        return _series[key][1]
+
+    latitude, longitude = TEMP_HUM_LOCATION
+    data = _tmy_cache.get(f"{latitude},{longitude}:hourly", lambda: _fetch_tmy(latitude, longitude))
+    # Arrays built once per reading of the cache
+    key = ("online", latitude, longitude)
+    if key not in _series or _series[key][0] is not data:
+        _series[key] = (data, TMYSeries(data["temperature"], data["humidity"]))
+    return _series[key][1]
+
+
+def get_temp_hum(when=None):
+    """Temperature and humidity of the hour of `when` (datetime or epoch seconds, default: now) in the TMY series."""
+    return get_tmy_series().at(when if when is not None else time.time())
+
+
+def _fetch_aq(appid):
+    # Add the appid to the URL
+    url = f"http://api.openweathermap.org/data/2.5/air_pollution?lat={AQ_LOCATION[0]}&lon={AQ_LOCATION[1]}&appid=" + appid
+
+    # Send the GET request
+    response = requests.get(url, timeout=10)
+
+    # Check if the response is successful
+    if response.status_code != 200:
+        raise requests.HTTPError(f"status code {response.status_code}")
+    data = response.json()
+
+    # Retrieve the AQI value from the response
+    aqi = data["list"][0]["main"]["aqi"]
+    return aqi, AQI_DESCRIPTIONS.get(aqi)
 
 
 def get_aq():
+    if _provider["name"] == "offline":
+        climate = _fixture_climate()
+        return climate["air_quality"], climate["air_quality_description"]
     
     #Get appid from environment variable
-    import os
     appid = os.environ.get('APPID_AQ')
     if appid is None:
         print("Error: APPID_AQ environment variable not set.")
         return None, None
-    # Add the appid to the URL
-    url = "http://api.openweathermap.org/data/2.5/air_pollution?lat=41.502039828950366&lon=2.103702324404792&appid=" + appid
 
-    # Send the GET request
-    response = requests.get(url)
-
-    # Check if the response is successful
-    if response.status_code == 200:
-        data = response.json()
-        
-        # Retrieve the AQI value from the response
-        aqi = data["list"][0]["main"]["aqi"]
-
-        if aqi == 1:
-            description = "Air quality outside is good"
-        elif aqi == 2:
-            description = "Air quality outside is fair"
-        elif aqi == 3:
-            description = "Air quality outside is moderate"
-        elif aqi == 4:
-            description = "Air quality outside is poor"
-        elif aqi == 5:
-            description = "Air quality outside is very poor"
-        
-        return aqi, description
-
-
-    else:
-        print(f"Error: Unable to fetch data (status code {response.status_code})")
+    try:
+        aqi, description = _aq_cache.get(f"{AQ_LOCATION[0]},{AQ_LOCATION[1]}", lambda: _fetch_aq(appid))
+    except (requests.RequestException, KeyError, ValueError) as error:
+        print(f"Error: Unable to fetch data ({error})")
+        return None, None
+    return aqi, description
 
 
 
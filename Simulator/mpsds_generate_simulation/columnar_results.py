@@ -0,0 +1,150 @@
+"""
+#########################################################################################################################################################
+
+Columnar results of run_simulation.
+
+run_simulation returns three dicts keyed by ISO timestamps (electricity, water and device usage per 5-minute interval),
+and every stage of puppeteer.py re-parses those keys. ColumnarResults keeps the same data as NumPy arrays: an int64
+epoch time index (start of every interval), float arrays with the electricity (kWh) and water (liters) of every
+interval and a dense (time x device) matrix with the usage of every device. to_dicts() gives back the dict shape and
+from_dicts() builds the arrays from it.
+
+#########################################################################################################################################################
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+
+class ColumnarResults:
+    """
+    Per-interval results of a simulation as arrays.
+
+    Args:
+        time_index (np.ndarray): int64 epoch seconds of the start of every interval.
+        electricity (np.ndarray): Electricity used in every interval (kWh), water heating included.
+        water (np.ndarray): Water used in every interval (liters).
+        device_keys (list): Column names of the device matrices ("Kitchen_stove", "Bathroom_shower", ...).
+        device_is_water (np.ndarray): True for the columns in liters (water devices), False for the ones in kWh.
+        device_usage (np.ndarray): (time x device) usage of every device, 0 where it was not used.
+        device_used (np.ndarray): (time x device) True where the device shows up in the device dict of the interval.
+        utc_offset (int): UTC offset of the timestamps in seconds (the simulation runs in +01:00).
+    """
+
+    def __init__(self, time_index, electricity, water, device_keys, device_is_water, device_usage, device_used, utc_offset=3600):
+        self.time_index = np.asarray(time_index, dtype=np.int64)
+        self.electricity = np.asarray(electricity, dtype=float)
+        self.water = np.asarray(water, dtype=float)
+        self.device_keys = list(device_keys)
+        self.device_is_water = np.asarray(device_is_water, dtype=bool).reshape(len(self.device_keys))
+        self.device_usage = np.asarray(device_usage, dtype=float).reshape(len(self.time_index), len(self.device_keys))
+        self.device_used = np.asarray(device_used, dtype=bool).reshape(len(self.time_index), len(self.device_keys))
+        self.utc_offset = int(utc_offset)
+
+    @classmethod
+    def from_intervals(cls, start_time, step_seconds, intervals, device_keys, device_is_water):
+        """
+        Build the arrays from the (electricity, water, {"electricity": {...}, "water": {...}}) tuple of every interval,
+        as produced tick by tick by the simulation engines. Interval i starts at start_time + i * step_seconds.
+        """
+        intervals = list(intervals)
+        columns = {}
+        for column, key in enumerate(device_keys):
+            columns.setdefault(key, column)
+        device_usage = np.zeros((len(intervals), len(device_keys)))
+        device_used = np.zeros((len(intervals), len(device_keys)), dtype=bool)
+        electricity = np.zeros(len(intervals))
+        water = np.zeros(len(intervals))
+        for row, (interval_electricity, interval_water, interval_devices) in enumerate(intervals):
+            electricity[row] = interval_electricity
+            water[row] = interval_water
+            for category in ("electricity", "water"):
+                for device_key, value in interval_devices[category].items():
+                    device_usage[row, columns[device_key]] = value
+                    device_used[row, columns[device_key]] = True
+
+        time_index = int(start_time.timestamp()) + np.arange(len(intervals), dtype=np.int64) * int(step_seconds)
+        utc_offset = start_time.utcoffset().total_seconds() if start_time.utcoffset() is not None else 0
+        return cls(time_index, electricity, water, device_keys, device_is_water, device_usage, device_used, utc_offset)
+
+    @classmethod
+    def from_dicts(cls, electricity_consumption, water_consumption, device_usage):
+        """Build the arrays from the three dicts returned by run_simulation (timestamps in the same UTC offset)."""
+        timestamps = list(electricity_consumption)
+        moments = [datetime.fromisoformat(timestamp) for timestamp in timestamps]
+        device_keys, device_is_water = [], []
+        for timestamp in timestamps:
+            for category in ("electricity", "water"):
+                for device_key in device_usage.get(timestamp, {}).get(category, {}):
+                    if device_key not in device_keys:
+                        device_keys.append(device_key)
+                        device_is_water.append(category == "water")
+
+        columns = {key: column for column, key in enumerate(device_keys)}
+        usage = np.zeros((len(timestamps), len(device_keys)))
+        used = np.zeros((len(timestamps), len(device_keys)), dtype=bool)
+        for row, timestamp in enumerate(timestamps):
+            for category in ("electricity", "water"):
+                for device_key, value in device_usage.get(timestamp, {}).get(category, {}).items():
+                    usage[row, columns[device_key]] = value
+                    used[row, columns[device_key]] = True
+
+        utc_offset = moments[0].utcoffset().total_seconds() if moments and moments[0].utcoffset() is not None else 0
+        return cls(time_index=[int(moment.timestamp()) for moment in moments],
+                   electricity=[electricity_consumption[timestamp] for timestamp in timestamps],
+                   water=[water_consumption.get(timestamp, 0) for timestamp in timestamps],
+                   device_keys=device_keys,
+                   device_is_water=device_is_water,
+                   device_usage=usage,
+                   device_used=used,
+                   utc_offset=utc_offset)
+
+    def __len__(self):
+        return len(self.time_index)
+
+    @property
+    def timezone(self):
+        return timezone(timedelta(seconds=self.utc_offset))
+
+    def datetimes(self):
+        """Start of every interval as an aware datetime."""
+        tz = self.timezone
+        return [datetime.fromtimestamp(int(moment), tz) for moment in self.time_index]
+
+    def timestamps(self):
+        """Start of every interval as the ISO string run_simulation uses as key."""
+        return [moment.isoformat() for moment in self.datetimes()]
+
+    def device_dicts(self, timestamps=None):
+        """The device_usage dict of run_simulation: {timestamp: {"electricity": {...}, "water": {...}}}."""
+        timestamps = timestamps or self.timestamps()
+        keys = self.device_keys
+        device_usage = {}
+        for row, timestamp in enumerate(timestamps):
+            interval_devices = {"electricity": {}, "water": {}}
+            for column in np.flatnonzero(self.device_used[row]):
+                category = "water" if self.device_is_water[column] else "electricity"
+                interval_devices[category][keys[column]] = float(self.device_usage[row, column])
+            device_usage[timestamp] = interval_devices
+        return device_usage
+
+    def to_dicts(self):
+        """(electricity_consumption, water_consumption, device_usage) keyed by ISO timestamp, like run_simulation."""
+        timestamps = self.timestamps()
+        electricity_consumption = dict(zip(timestamps, self.electricity.tolist()))
+        water_consumption = dict(zip(timestamps, self.water.tolist()))
+        return electricity_consumption, water_consumption, self.device_dicts(timestamps)
+
+    def align(self, series):
+        """
+        Values of a {timestamp: value} dict (solar production, ...) at every interval of the time index, NaN where the
+        dict has no value. Timestamps are matched by instant, whatever their format or UTC offset.
+        """
+        return align_series(self.time_index, series)
+
+
+def align_series(time_index, series):
+    """Values of a {timestamp: value} dict at every epoch second of time_index (matched by instant), NaN where missing."""
+    by_instant = {int(datetime.fromisoformat(timestamp.replace(" ", "T")).timestamp()): value for timestamp, value in series.items()}
+    return np.array([by_instant.get(int(moment), np.nan) for moment in time_index], dtype=float)
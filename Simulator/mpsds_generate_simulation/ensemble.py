@@ -0,0 +1,204 @@
+"""
+#########################################################################################################################################################
+
+Monte Carlo ensemble of one house: K fast-forward replicas with independent seeds, summarized as percentile bands.
+
+The NPCs are stochastic, so one trajectory says little about what the house will need. Every replica runs the
+consumption, grid and battery stages of complete_simulation_generate (on arrays) in a worker process with its own
+child seed (numpy SeedSequence.spawn), and the parent folds the electricity, water, grid and battery series of each
+replica into streaming accumulators (streaming_stats) as soon as it arrives, in replica order. Memory holds the
+accumulators and a few replicas in flight, never the whole ensemble.
+
+The output is one compact JSON file, <output_dir>/<house>_ensemble.json: the time index (start + step), and for every
+series the mean, standard deviation, P10, P50 and P90 per interval, plus the per-replica totals. The percentiles are
+exact for up to 8 replicas (fewer than the 9 P² markers of P10/P50/P90, "quantiles_exact" in the file) and P² estimates
+from 9 replicas on; NaN (no solar data for the interval) is written as null.
+
+Usage: python ensemble.py <config_file> [--replicas K] [--workers N] [--seed SEED] [--output sim_result]
+
+#########################################################################################################################################################
+"""
+
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from random_streams import spawn_seeds
+from streaming_stats import RunningMoments, StreamingQuantiles
+from time_index import TimeIndex
+
+
+SERIES = ("electricity", "water", "grid", "battery")
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+def simulation_time_index(start_date: str, end_date: str, step_seconds: int = 300):
+    """Epoch seconds of the intervals run_simulation produces between two dates (+01:00, like the simulation)."""
+    return TimeIndex.from_horizon(start_date, end_date, step_seconds).epochs
+
+
+def run_replica(config: dict, seed, start_date: str, end_date: str, solar_values):
+    """
+    Worker: one replica of the house. The action log goes to a temporary folder and the stdout of the stages is
+    dropped.
+
+    Returns:
+        dict: float arrays over the simulation time index for every name in SERIES (kWh, liters, kW, kWh).
+    """
+    # Imported in the worker, puppeteer creates the results folder on import
+    from npc import run_simulation
+    from puppeteer import get_battery_data_columnar
+
+    with tempfile.TemporaryDirectory() as tmp_dir, open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = run_simulation(config, output_path=os.path.join(tmp_dir, "user_data.json"), start_date=start_date,
+                                 end_date=end_date, seed=seed, columnar=True)
+        battery_data = get_battery_data_columnar(battery_capacity_ah=config["battery"]["capacity_ah"],
+                                                 voltage=config["battery"]["voltage"],
+                                                 solar_values=solar_values,
+                                                 results=results,
+                                                 charge_eff=config["battery"]["charging_efficiency"],
+                                                 discharge_eff=config["battery"]["discharging_efficiency"],
+                                                 energy_loss_convrt=config["battery"]["energy_loss_conversion"],
+                                                 degrading_ratio=config["battery"]["degrading_ratio"],
+                                                 initial_state_charge=config["battery"]["initial_state_of_charge_percent"],
+                                                 history_file=None)
+
+    battery = np.full(len(results), np.nan)
+    battery[~np.isnan(solar_values)] = [status["battery"]["charge_level_kwh"] for status in battery_data.values()]
+    return {
+        "electricity": results.electricity,
+        "water": results.water,
+        "grid": results.electricity - solar_values,
+        "battery": battery
+    }
+
+
+def _ordered_results(pool, tasks, window):
+    """Results of the (function, *args) tasks in order, with at most `window` of them submitted at a time."""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(*task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _json_values(values):
+    return [None if math.isnan(value) else value for value in values.tolist()]
+
+
+def run_ensemble(config_file: str, replicas: int = 20, seed=None, max_workers: int = None, output_dir: str = "sim_result"):
+    """
+    Run `replicas` replicas of a fast-forward house config and write <output_dir>/<house>_ensemble.json.
+
+    Args:
+        config_file (str): House config (fast_forward).
+        replicas (int): Number of replicas (K).
+        seed (int): Ensemble seed, spawned into one child seed per replica. None is not reproducible.
+        max_workers (int): Number of worker processes (default: os.cpu_count()); 1 runs the replicas in this process.
+        output_dir (str): Folder for the ensemble file.
+
+    Returns:
+        dict: The ensemble summary (house id, output file, replicas, totals mean/P10/P50/P90, wall time).
+    """
+    with open(config_file) as f:
+        config = json.load(f)
+    if config["basic_parameters"]["type_of_simulation"]["type"] != "fast_forward":
+        raise ValueError("Ensembles only support fast_forward configs.")
+    if replicas < 1:
+        raise ValueError("An ensemble needs at least one replica.")
+
+    # Imported here, puppeteer creates the results folder on import
+    import solar_module.solar_irradiance as solar_module
+    from puppeteer import get_solar_production
+
+    house_id = config["basic_parameters"]["name"].lower().replace(" ", "_")
+    start_date = config["basic_parameters"]["type_of_simulation"]["start_date"]
+    end_date = config["basic_parameters"]["type_of_simulation"]["end_date"]
+    ensemble_start = time.perf_counter()
+
+    # Solar production does not depend on the NPCs: computed once, aligned on the simulation intervals
+    time_index = TimeIndex.from_horizon(start_date, end_date)
+    latitud_barcelona, longitud_barcelona = 41.38879, 2.15899  # Barcelona, España
+    # Until 01:00 of the end date like the fast-forward solar stage: the last +01:00 intervals reach it in summer time
+    solar_prod = get_solar_production(solar_irr_data_json=solar_module.get_solar_irradiance(latitud_barcelona, longitud_barcelona, 'Europe/Madrid', start_date, f"{end_date} 01:00"),
+                                      pannel_eff=config["solar_panels"]["panel_eff"],
+                                      num_pannels=config["solar_panels"]["number_of_panels"],
+                                      panel_area_m2=config["solar_panels"]["size_of_panels_m2"])
+    solar_values = time_index.align(solar_prod)
+
+    moments = {name: RunningMoments() for name in SERIES}
+    quantiles = {name: StreamingQuantiles(QUANTILES) for name in SERIES}
+    totals = {"electricity": [], "water": [], "grid": []}
+
+    print(f"Running {replicas} replicas of {house_id} with {max_workers or os.cpu_count()} workers...")
+    tasks = [(run_replica, config, replica_seed, start_date, end_date, solar_values) for replica_seed in spawn_seeds(seed, replicas)]
+    if max_workers == 1:
+        run_context = contextlib.nullcontext()
+        replica_results = (function(*args) for function, *args in tasks)
+    else:
+        run_context = ProcessPoolExecutor(max_workers=max_workers)
+        replica_results = _ordered_results(run_context, tasks, window=2 * (max_workers or os.cpu_count()))
+    with run_context:
+        for number, series in enumerate(replica_results, start=1):
+            for name in SERIES:
+                moments[name].add(series[name])
+                quantiles[name].add(series[name])
+            for name in totals:
+                totals[name].append(float(np.nansum(series[name])))
+            print(f"\033[92mReplica {number}/{replicas} done\033[0m")
+
+    output = {
+        "house_id": house_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "replicas": replicas,
+        "seed": seed,
+        "time_index": {"start": int(time_index.epochs[0]) if len(time_index) else None, "step_seconds": 300, "length": len(time_index)},
+        "quantiles_exact": quantiles["electricity"].exact,
+        "series": {},
+        "totals": totals
+    }
+    for name in SERIES:
+        output["series"][name] = {
+            "mean": _json_values(moments[name].mean()),
+            "std": _json_values(moments[name].std()),
+            **{f"p{round(quantile * 100)}": _json_values(quantiles[name].quantile(quantile)) for quantile in QUANTILES}
+        }
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f"{house_id}_ensemble.json")
+    with open(output_file, "w") as f:
+        json.dump(output, f, separators=(",", ":"))
+
+    summary = {"house_id": house_id, "output_file": output_file, "replicas": replicas, "wall_time_s": time.perf_counter() - ensemble_start}
+    for name, values in totals.items():
+        summary[f"total_{name}"] = {"mean": float(np.mean(values)),
+                                    **{f"p{round(quantile * 100)}": float(np.percentile(values, quantile * 100)) for quantile in QUANTILES}}
+    print(f"Ensemble finished in {summary['wall_time_s']:.2f} s. Output: {output_file}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a Monte Carlo ensemble of one house and write percentile bands.")
+    parser.add_argument("config_file", help="House config file (fast_forward)")
+    parser.add_argument("--replicas", type=int, default=20, help="Number of replicas (default: 20)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=None, help="Ensemble seed for reproducible runs")
+    parser.add_argument("--output", default="sim_result", help="Output folder (default: sim_result)")
+    args = parser.parse_args()
+
+    summary = run_ensemble(args.config_file, replicas=args.replicas, seed=args.seed, max_workers=args.workers, output_dir=args.output)
+    for name in ("electricity", "water", "grid"):
+        band = summary[f"total_{name}"]
+        print(f"Total {name}: mean {band['mean']:.2f}, P10 {band['p10']:.2f}, P50 {band['p50']:.2f}, P90 {band['p90']:.2f}")
@@ -0,0 +1,168 @@
+"""
+#########################################################################################################################################################
+
+Fleet runner: runs complete_simulation_generate for many house configs at once, one house per worker process.
+
+Every house gets its own folder under the fleet output folder, named after its config file (with its position in
+the sorted config list when two configs share a file name, e.g. a/house.json and b/house.json), so the action log
+(results/user_data.json), the battery history (battery_history.json) and the final output
+(sim_result/<house>_output.json) of two houses never clobber each other. The run ends with a merged fleet_summary.json with the totals and the timing of every house.
+
+With --seed every house gets its own child seed (numpy SeedSequence.spawn, in sorted config order), so a fleet run is
+reproducible whatever the number of workers.
+
+Usage: python fleet.py <config_dir_or_files...> [--workers N] [--output fleet_results] [--seed SEED]
+
+#########################################################################################################################################################
+"""
+
+
+import argparse
+import contextlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from random_streams import spawn_seeds
+
+
+def find_configs(paths):
+    """Expand directories into the *.json files they contain. Files are returned as given."""
+    configs = []
+    for path in paths:
+        if os.path.isdir(path):
+            configs.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json")))
+        else:
+            configs.append(path)
+    return configs
+
+
+def house_folder_names(configs):
+    """
+    {config file: folder name} of the houses of a fleet: the config file name without its extension, followed by the
+    position of the config in `configs` when several configs have the same file name.
+    """
+    stems = [os.path.splitext(os.path.basename(config_file))[0] for config_file in configs]
+    names = {}
+    for index, (config_file, stem) in enumerate(zip(configs, stems)):
+        if config_file in names:
+            raise ValueError(f"Config {config_file} is listed more than once.")
+        names[config_file] = f"{stem}_{index}" if stems.count(stem) > 1 else stem
+    if len(set(names.values())) != len(names):
+        raise ValueError("Two house configs get the same output folder, rename one of them: " + ", ".join(sorted(configs)))
+    return names
+
+
+def house_paths(config_file: str, output_root: str, folder_name: str = None):
+    """Isolated output locations for one house config (in <output_root>/<folder_name>, the config file name by default)."""
+    house_dir = os.path.join(output_root, folder_name or os.path.splitext(os.path.basename(config_file))[0])
+    return {
+        "house_dir": house_dir,
+        "results_dir": os.path.join(house_dir, "results"),
+        "sim_result_dir": os.path.join(house_dir, "sim_result"),
+        "battery_history_file": os.path.join(house_dir, "battery_history.json"),
+        "log_file": os.path.join(house_dir, "run.log")
+    }
+
+
+def run_house(config_file: str, output_root: str, seed=None, folder_name: str = None):
+    """
+    Worker: run every stage for one house config with its own output paths (see house_paths). The stdout of the
+    stages goes to <house_dir>/run.log so the workers do not interleave on the terminal.
+
+    Returns:
+        dict: The summary of complete_simulation_generate plus config file, paths, wall/CPU time and the error (if any).
+    """
+    # Imported in the worker, puppeteer creates the results folder on import
+    from puppeteer import complete_simulation_generate
+
+    paths = house_paths(config_file, output_root, folder_name)
+    os.makedirs(paths["house_dir"], exist_ok=True)
+
+    entry = {"config_file": config_file, "house_dir": paths["house_dir"], "error": None}
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        with open(config_file) as f:
+            type_of_simulation = json.load(f)["basic_parameters"]["type_of_simulation"]["type"]
+        if type_of_simulation != "fast_forward":
+            raise ValueError(f"Fleet runs only support fast_forward configs, got '{type_of_simulation}'.")
+
+        with open(paths["log_file"], "w") as log, contextlib.redirect_stdout(log):
+            summary = complete_simulation_generate(config_file,
+                                                   results_dir=paths["results_dir"],
+                                                   sim_result_dir=paths["sim_result_dir"],
+                                                   battery_history_file=paths["battery_history_file"],
+                                                   seed=seed)
+        entry.update(summary or {})
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+    entry["wall_time_s"] = time.perf_counter() - wall_start
+    entry["cpu_time_s"] = time.process_time() - cpu_start
+    return entry
+
+
+def run_fleet(config_paths, output_root: str = "fleet_results", max_workers: int = None, seed=None):
+    """
+    Run every house config across a process pool and write <output_root>/fleet_summary.json.
+
+    Args:
+        config_paths (list): Config files and/or folders of config files.
+        output_root (str): Folder that gets one sub-folder per house.
+        max_workers (int): Number of worker processes (default: os.cpu_count()).
+        seed (int): Fleet seed, spawned into one child seed per house. None is not reproducible.
+
+    Returns:
+        dict: The fleet summary (per-house entries, fleet totals and timing).
+    """
+    configs = sorted(find_configs(config_paths))
+    if not configs:
+        raise ValueError("No house configs found.")
+    folder_names = house_folder_names(configs)
+    os.makedirs(output_root, exist_ok=True)
+
+    print(f"Running {len(configs)} houses with {max_workers or os.cpu_count()} workers...")
+    fleet_start = time.perf_counter()
+    houses = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        house_seeds = spawn_seeds(seed, len(configs)) if seed is not None else [None] * len(configs)
+        futures = {pool.submit(run_house, config_file, output_root, house_seed, folder_names[config_file]): config_file
+                   for config_file, house_seed in zip(configs, house_seeds)}
+        for future in as_completed(futures):
+            entry = future.result()
+            houses.append(entry)
+            if entry["error"]:
+                print(f"\033[91m{entry['config_file']} failed after {entry['wall_time_s']:.2f} s: {entry['error']}\033[0m")
+            else:
+                print(f"\033[92m{entry['config_file']} done in {entry['wall_time_s']:.2f} s\033[0m")
+
+    houses.sort(key=lambda entry: entry["config_file"])
+    completed = [entry for entry in houses if not entry["error"]]
+    summary = {
+        "number_of_houses": len(houses),
+        "completed": len(completed),
+        "failed": len(houses) - len(completed),
+        "total_electricity_kwh": sum(entry["total_electricity_kwh"] for entry in completed),
+        "total_water_liters": sum(entry["total_water_liters"] for entry in completed),
+        "total_grid_consumption": sum(entry["total_grid_consumption"] for entry in completed),
+        "wall_time_s": time.perf_counter() - fleet_start,
+        "sum_of_house_wall_time_s": sum(entry["wall_time_s"] for entry in houses),
+        "houses": houses
+    }
+
+    summary_file = os.path.join(output_root, "fleet_summary.json")
+    with open(summary_file, "w") as f:
+        json.dump(summary, f, indent=4)
+    print(f"Fleet finished in {summary['wall_time_s']:.2f} s ({summary['completed']}/{summary['number_of_houses']} houses). Summary: {summary_file}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the simulation for many house configs in parallel.")
+    parser.add_argument("configs", nargs="+", help="House config files or folders of config files")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--output", default="fleet_results", help="Output folder (default: fleet_results)")
+    parser.add_argument("--seed", type=int, default=None, help="Fleet seed for reproducible runs")
+    args = parser.parse_args()
+
+    run_fleet(args.configs, output_root=args.output, max_workers=args.workers, seed=args.seed)
@@ -0,0 +1,251 @@
+"""
+#########################################################################################################################################################
+
+Instrumentation of complete_simulation_generate: wall time, CPU time and peak memory per stage, plus counters.
+
+An Instrumentation is made the active one while it is entered (`with Instrumentation() as instrumentation:`), so the
+code of the stages only calls the module functions: begin_stage(name) closes the current stage and opens the next one
+(the stages of puppeteer.py run one after the other), count(name, amount) adds to a counter (ticks, actions logged,
+bytes written, timestamps standardized...) and track(name, records) times a streaming stage, i.e. the time spent in
+that generator minus the time of the stages it pulls from. Stages timed elsewhere (the stages of a
+stage_graph.StageGraph, timed in their workers) are added with record_stage(name, wall, cpu, peak, measure), and note(name, value)
+adds an entry to the summary (e.g. the timeline and critical path of the graph). Without an active Instrumentation
+they do nothing. Counters can be updated from several threads.
+
+With profile=True the whole run is also under cProfile and tracemalloc: the per-stage peaks are then the traced peaks
+of every stage (tracemalloc.reset_peak), and dump() writes the .pstats file and the tracemalloc snapshot next to the
+JSON summary. Without it the memory figure is the peak RSS of the process so far (getrusage, where available). For
+the stages of a StageGraph that is the peak RSS of the process the stage ran in (a worker process for the "process"
+stages), measured when the stage ended: process-wide, it includes the stages that ran next to it ("memory_measure"
+of the stage is "process_peak_rss").
+
+#########################################################################################################################################################
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+_active = None
+
+
+def peak_rss_mb():
+    """Peak resident memory of the process in MB, None where getrusage is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def peak_memory_mb():
+    """Traced peak since the last reset_peak while tracemalloc runs, peak RSS otherwise."""
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    return peak_rss_mb()
+
+
+class Instrumentation:
+    """
+    Stage timings and counters of one run.
+
+    Args:
+        profile (bool): Also run cProfile and tracemalloc (slower), for dump().
+    """
+
+    def __init__(self, profile=False):
+        self.profile = profile
+        self.stages = {}
+        self.counters = {}
+        self.notes = {}
+        self._counters_lock = threading.Lock()
+        self._current = None
+        self._streams = []
+        self._previous = None
+        self._profiler = None
+        self._started_tracemalloc = False
+        self.snapshot = None
+        self.wall_time_s = None
+        self.cpu_time_s = None
+
+    def __enter__(self):
+        global _active
+        self._previous, _active = _active, self
+        if self.profile:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._wall_start, self._cpu_start = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        self.end_stage()
+        self.wall_time_s = time.perf_counter() - self._wall_start
+        self.cpu_time_s = time.process_time() - self._cpu_start
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self.profile:
+            self.snapshot = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        _active = self._previous
+        return False
+
+    def _stage(self, name):
+        return self.stages.setdefault(name, {"wall_time_s": 0.0, "cpu_time_s": 0.0, "peak_memory_mb": None, "calls": 0})
+
+    def begin_stage(self, name):
+        """Close the current stage (if any) and start timing `name`."""
+        self.end_stage()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._current = (name, time.perf_counter(), time.process_time())
+
+    def end_stage(self):
+        if self._current is None:
+            return
+        name, wall_start, cpu_start = self._current
+        stage = self._stage(name)
+        stage["wall_time_s"] += time.perf_counter() - wall_start
+        stage["cpu_time_s"] += time.process_time() - cpu_start
+        stage["calls"] += 1
+        peak = peak_memory_mb()
+        if peak is not None:
+            stage["peak_memory_mb"] = max(stage["peak_memory_mb"] or 0.0, peak)
+        self._current = None
+
+    def count(self, name, amount=1):
+        with self._counters_lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_stage(self, name, wall_time_s, cpu_time_s, peak_memory_mb=None, memory_measure=None):
+        """
+        Add a stage timed elsewhere, with the memory figure measured there (see the module docstring) and how it was
+        measured, when there is one.
+        """
+        stage = self._stage(name)
+        stage["wall_time_s"] += wall_time_s
+        stage["cpu_time_s"] += cpu_time_s
+        stage["calls"] += 1
+        if peak_memory_mb is not None:
+            stage["peak_memory_mb"] = max(stage["peak_memory_mb"] or 0.0, peak_memory_mb)
+            stage["memory_measure"] = memory_measure
+
+    def note(self, name, value):
+        """Add a JSON-serializable entry to the summary."""
+        self.notes[name] = value
+
+    def track(self, name, records):
+        """
+        Yield from `records`, adding the time spent in it to stage `name`. Tracked generators chained into each other
+        must be tracked in pipeline order (source first); the summary reports each one without its upstream stages.
+        "calls" counts the records and the peak memory is the one of the whole chain, as the stages run interleaved.
+        """
+        # Registered now: the generators start from the last one of the chain
+        self._streams.append(name)
+        return self._timed(self._stage(name), iter(records))
+
+    @staticmethod
+    def _timed(stage, iterator):
+        while True:
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            try:
+                record = next(iterator)
+            except StopIteration:
+                stage["peak_memory_mb"] = peak_memory_mb()
+                return
+            finally:
+                stage["wall_time_s"] += time.perf_counter() - wall_start
+                stage["cpu_time_s"] += time.process_time() - cpu_start
+            stage["calls"] += 1
+            yield record
+
+    def summary(self):
+        """Plain dict (JSON-serializable) with the total and per-stage times, peaks and counters."""
+        stages = {name: dict(stage) for name, stage in self.stages.items()}
+        # Streaming stages were timed including the stages they pull from
+        for upstream, downstream in zip(self._streams, self._streams[1:]):
+            for key in ("wall_time_s", "cpu_time_s"):
+                stages[downstream][key] -= self.stages[upstream][key]
+        summary = {
+            "wall_time_s": self.wall_time_s,
+            "cpu_time_s": self.cpu_time_s,
+            "peak_memory_mb": peak_rss_mb(),
+            "memory_measure": "tracemalloc" if self.profile else "peak_rss",
+            "stages": stages,
+            "counters": dict(self.counters),
+            **self.notes
+        }
+        if self.snapshot is not None:
+            # Largest live allocations at the end of the run
+            summary["top_allocations"] = [{"location": str(statistic.traceback[0]), "size_mb": statistic.size / (1024 * 1024), "blocks": statistic.count}
+                                          for statistic in self.snapshot.statistics("lineno")[:10]]
+        return summary
+
+    def write(self, path):
+        """Write summary() as JSON. Returns the path."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+        return path
+
+    def dump(self, base_path):
+        """
+        Write the cProfile stats (<base_path>.pstats) and the tracemalloc snapshot (<base_path>.tracemalloc) of a
+        profile=True run. Returns the two paths.
+        """
+        if not self.profile:
+            raise ValueError("dump() needs an Instrumentation created with profile=True.")
+        os.makedirs(os.path.dirname(base_path) or ".", exist_ok=True)
+        self._profiler.dump_stats(base_path + ".pstats")
+        self.snapshot.dump(base_path + ".tracemalloc")
+        return base_path + ".pstats", base_path + ".tracemalloc"
+
+
+def begin_stage(name):
+    """Start stage `name` of the active Instrumentation (closing the current one)."""
+    if _active is not None:
+        _active.begin_stage(name)
+
+
+def end_stage():
+    if _active is not None:
+        _active.end_stage()
+
+
+def count(name, amount=1):
+    """Add to a counter of the active Instrumentation."""
+    if _active is not None:
+        _active.count(name, amount)
+
+
+def record_stage(name, wall_time_s, cpu_time_s, peak_memory_mb=None, memory_measure=None):
+    """Add a stage timed elsewhere to the active Instrumentation."""
+    if _active is not None:
+        _active.record_stage(name, wall_time_s, cpu_time_s, peak_memory_mb, memory_measure)
+
+
+def note(name, value):
+    """Add an entry to the summary of the active Instrumentation."""
+    if _active is not None:
+        _active.note(name, value)
+
+
+def track(name, records):
+    """Time a streaming stage on the active Instrumentation; returns `records` unchanged when there is none."""
+    if _active is None:
+        return records
+    return _active.track(name, records)
@@ -1,14 +1,23 @@
 
 import time
 from datetime import datetime, timedelta, timezone
-import random
 import matplotlib.pyplot as plt
+import numpy as np
 import json
 import os
+import math
+import heapq
+from collections.abc import Mapping, MutableMapping
+from types import MappingProxyType
 
 
 # Personal modules
 from climateEnviroment import temperature_humidty_airquality as getTempHomemade
+from random_streams import RandomStream, spawn_streams
+from columnar_results import ColumnarResults
+from simulation_checkpoint import save_checkpoint, load_checkpoint
+from sim_clock import to_epoch, local_time
+import instrumentation
 
 
 
@@ -75,11 +84,242 @@ def add_action_to_json(NPCtime, action="NAN", device_used="NAN", energy_used=0,
         print(f"[{timestamp}] \033[93mAdded action to JSON\033[0m")
 
 
+class ActionLogWriter:
+    """
+    Buffered, append-only replacement for add_action_to_json.
+
+    Actions are kept in memory and flushed in batches to an NDJSON log next to FILEPATH
+    ("results/user_data.actions.ndjson"), while the running totals live in a small sidecar
+    ("results/user_data.header.json"). compact() rebuilds FILEPATH with the usual
+    {"house_name", ..., "actions": [...]} shape, keeping the actions of previous runs like
+    create_json_reg + add_action_to_json did.
+    """
+
+    def __init__(self, house_name: str, FILEPATH="results/user_data.json", typeOfSimulation="fast_forward", start_date=None, end_date=None, buffer_size=1000):
+        self.filepath = FILEPATH
+        base_path = os.path.splitext(FILEPATH)[0]
+        self.log_path = base_path + ".actions.ndjson"
+        self.header_path = base_path + ".header.json"
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.actions_logged = 0
+        self.bytes_written = 0
+
+        # Ensure the directory exists
+        os.makedirs(os.path.dirname(FILEPATH) or ".", exist_ok=True)
+
+        self.header = {
+            "house_name": house_name,
+            "total_energy_used": 0,
+            "total_water_used": 0,
+            "total_time": 0,
+            "type_of_simulation": typeOfSimulation,
+            "start_date": start_date,
+            "end_date": end_date
+        }
+        # An existing register is carried over (totals and actions) like create_json_reg did
+        previous_actions = []
+        if os.path.exists(FILEPATH):
+            with open(FILEPATH, "r") as file:
+                previous = json.load(file)
+            for key in self.header:
+                if key in previous:
+                    self.header[key] = previous[key]
+            previous_actions = previous.get("actions", [])
+
+        # Start the log of this run with the previous actions
+        with open(self.log_path, "w") as file:
+            for action in previous_actions:
+                file.write(json.dumps(action) + "\n")
+        self._write_header()
+
+    def add_action(self, NPCtime, action="NAN", device_used="NAN", energy_used=0, water_used=0, duration=0, npc_name="Unknown", clock=None):
+        """
+        Same arguments as add_action_to_json, but only touches the disk once per buffer_size actions.
+        NPCtime can also be epoch seconds with the sim_clock.LocalTime of the NPC as clock; the ISO timestamp is only
+        built when the action is written.
+        """
+        self.buffer.append((NPCtime, clock, npc_name, action, device_used, energy_used, water_used, duration))
+        self.header["total_energy_used"] += energy_used
+        self.header["total_water_used"] += water_used
+        self.header["total_time"] += duration
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered actions to the NDJSON log and refresh the totals sidecar."""
+        if self.buffer:
+            chunk = "".join(json.dumps(self._record(entry)) + "\n" for entry in self.buffer)
+            with open(self.log_path, "a") as file:
+                file.write(chunk)
+            self.bytes_written += len(chunk)
+            self.actions_logged += len(self.buffer)
+            instrumentation.count("actions_logged", len(self.buffer))
+            instrumentation.count("bytes_written", len(chunk))
+            self.buffer = []
+        self._write_header()
+
+    @staticmethod
+    def _record(entry):
+        """Action dict of a buffered entry, as written to the log."""
+        NPCtime, clock, npc_name, action, device_used, energy_used, water_used, duration = entry
+        return {
+            "timestamp": clock.isoformat(NPCtime) if clock is not None else NPCtime.isoformat(),
+            "npc": npc_name,
+            "action": action,
+            "device_used": device_used,
+            "energy_used": energy_used,
+            "water_used": water_used,
+            "duration": duration
+        }
+
+    def _write_header(self):
+        with open(self.header_path, "w") as file:
+            json.dump(dict(self.header, actions_logged=self.actions_logged), file, indent=4)
+
+    def iter_actions(self):
+        """Yield the logged actions in order (flushed ones from disk, then the buffer)."""
+        with open(self.log_path, "r") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        for entry in self.buffer:
+            yield self._record(entry)
+
+    def compact(self):
+        """
+        Rebuild FILEPATH as a single {"house_name", ..., "actions": [...]} JSON document.
+
+        The file is written incrementally, one action per line, so the actions of the run are never
+        all held in memory. Returns the path of the compacted file.
+        """
+        self.flush()
+
+        tmp_path = self.filepath + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write("{\n")
+            for key, value in self.header.items():
+                file.write(f"    {json.dumps(key)}: {json.dumps(value)},\n")
+            file.write('    "actions": [')
+            separator = "\n        "
+            for action in self.iter_actions():
+                file.write(separator + json.dumps(action))
+                separator = ",\n        "
+            file.write("\n    ]\n}\n")
+            instrumentation.count("bytes_written", file.tell())
+        os.replace(tmp_path, self.filepath)
+        return self.filepath
+
+    def close(self):
+        """Flush what is left and write the compatible JSON file."""
+        return self.compact()
+
+    def checkpoint_state(self):
+        """Flush, then return what is needed to continue this log after a checkpoint."""
+        self.flush()
+        return {
+            "filepath": self.filepath,
+            "buffer_size": self.buffer_size,
+            "header": dict(self.header),
+            "actions_logged": self.actions_logged,
+            "bytes_written": self.bytes_written,
+            "log_size": os.path.getsize(self.log_path)
+        }
+
+    @classmethod
+    def from_checkpoint(cls, state, FILEPATH=None):
+        """
+        Reopen the log of a checkpointed run: the NDJSON log is cut back to its size at the checkpoint, dropping
+        the actions logged after it, and the totals are restored.
+        """
+        writer = cls.__new__(cls)
+        writer.filepath = FILEPATH or state["filepath"]
+        base_path = os.path.splitext(writer.filepath)[0]
+        writer.log_path = base_path + ".actions.ndjson"
+        writer.header_path = base_path + ".header.json"
+        writer.buffer_size = state["buffer_size"]
+        writer.buffer = []
+        writer.header = dict(state["header"])
+        writer.actions_logged = state["actions_logged"]
+        writer.bytes_written = state["bytes_written"]
+
+        if not os.path.exists(writer.log_path) or os.path.getsize(writer.log_path) < state["log_size"]:
+            raise ValueError(f"Action log {writer.log_path} is missing or shorter than at the checkpoint.")
+        with open(writer.log_path, "r+") as file:
+            file.truncate(state["log_size"])
+        writer._write_header()
+        return writer
+
+
+class DeviceState(MutableMapping):
+    """
+    State of one device of a House in the old dict format ({"type", "info", "in_use", "used_by"}). "in_use" and
+    "used_by" are read from and written to the device arrays of the house; "type" and "info" cannot be replaced.
+    """
+
+    _WRITABLE = ("in_use", "used_by")
+
+    def __init__(self, house, device_id):
+        self._house = house
+        self._device_id = device_id
+
+    def __getitem__(self, key):
+        if key == "in_use":
+            return bool(self._house.device_in_use[self._device_id])
+        if key == "used_by":
+            return self._house.device_used_by[self._device_id]
+        if key == "type":
+            return self._house.device_info[self._device_id]["type"]
+        if key == "info":
+            return self._house.device_info[self._device_id]["device"]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._WRITABLE:
+            raise TypeError(f"Device state '{key}' is read-only, only {' and '.join(self._WRITABLE)} can be set.")
+        if key == "in_use":
+            self._house.device_in_use[self._device_id] = bool(value)
+        else:
+            self._house.device_used_by[self._device_id] = value
+
+    def __delitem__(self, key):
+        raise TypeError("Device state keys cannot be deleted.")
+
+    def __iter__(self):
+        return iter(("type", "info", "in_use", "used_by"))
+
+    def __len__(self):
+        return 4
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class DeviceStates(Mapping):
+    """{"Room_device": DeviceState} of a House: devices cannot be added or removed, their states write through."""
+
+    def __init__(self, house):
+        self._house = house
+
+    def __getitem__(self, key):
+        return DeviceState(self._house, self._house.device_ids_by_key[key])
+
+    def __iter__(self):
+        return iter(self._house.device_ids_by_key)
+
+    def __len__(self):
+        return len(self._house.device_ids_by_key)
+
+    def __repr__(self):
+        return repr({key: dict(state) for key, state in self.items()})
+
+
 # Data for plotting
 
 
 class House:
-    def __init__(self, config_data, temperature=20, humidity=50, month=1, year=2025):
+    def __init__(self, config_data, temperature=20, humidity=50, month=1, year=2025, climate=None):
         # Basic parameters
         self.name = config_data["basic_parameters"]["name"]
         self.number_of_people = config_data["basic_parameters"]["number_of_people"]
@@ -93,9 +333,10 @@ class House:
             "garden": config_data["basic_parameters"]["garden"]
         }
         
-        # Environmental conditions
+        # Environmental conditions (temperature and humidity follow the climate series, a TMYSeries, when there is one)
         self.temperature = temperature
         self.humidity = humidity
+        self.climate = climate
         self.month = month
         self.year = year
         
@@ -148,21 +389,93 @@ class House:
         self.total_electricity_used_kwh = 0
         self.total_water_used_liters = 0
         
-        # Add device state tracking
-        self.device_states = {}
-        for device in self.water_devices + self.electricity_devices:
-            key = f"{device['room']}_{device['device']}"
-            self.device_states[key] = {
-                "type": "water" if device in self.water_devices else "electricity",
-                "info": device,
-                "in_use": False,
-                "used_by": None
-            }
-            
+        # Device registry: every (room, device) gets an integer ID, lookups are normalized once here
+        self.device_ids = {}            # (room.lower(), device.lower()) -> device ID
+        self.device_ids_by_name = {}    # device.lower() -> ID of the first device with that name (water first)
+        self.device_info = []           # ID -> {"type": ..., "device": config entry}, as get_device_by_name returns it
+        self.device_keys = []           # ID -> "Room_device" key used in the outputs
+        self.device_ids_by_key = {}     # "Room_device" key -> ID
+        for device_type, devices in (("water", self.water_devices), ("electricity", self.electricity_devices)):
+            for device in devices:
+                device_id = len(self.device_info)
+                self.device_info.append({"type": device_type, "device": device})
+                self.device_keys.append(f"{device['room']}_{device['device']}")
+                self.device_ids_by_key.setdefault(self.device_keys[-1], device_id)
+                self.device_ids.setdefault((device.get("room", "").lower(), device["device"].lower()), device_id)
+                self.device_ids_by_name.setdefault(device["device"].lower(), device_id)
+
+        # Precomputed coefficients per device ID
+        self.device_is_water = np.array([info["type"] == "water" for info in self.device_info], dtype=bool)
+        self.device_power_watts = np.array([info["device"].get("power_watts", 0) if info["type"] == "electricity" else 0
+                                            for info in self.device_info], dtype=float)
+        self.device_flow_lpm = np.array([info["device"].get("flow_rate_liters_per_minute", 0) if info["type"] == "water" else 0
+                                         for info in self.device_info], dtype=float)
+        self.device_heats_water = np.array([info["type"] == "water" and info["device"]["device"] in ["shower", "sink"]
+                                            and self.water_heating["method"] == "electricity"
+                                            for info in self.device_info], dtype=bool)
+
+        # Device state tracking, indexed by device ID
+        self.device_in_use = np.zeros(len(self.device_info), dtype=bool)
+        self.device_used_by = [None] * len(self.device_info)
+
+        # Raw (name, room) strings -> ID, so repeated lookups skip the .lower() calls
+        self._device_id_cache = {}
+        self._device_id_by_name_cache = {}
+
+    def device_id(self, device_name, room_name):
+        """Integer ID of `device_name` in `room_name` (case-insensitive), or None if the room does not have it."""
+        key = (device_name, room_name)
+        if key not in self._device_id_cache:
+            self._device_id_cache[key] = self.device_ids.get((room_name.lower(), device_name.lower()))
+        return self._device_id_cache[key]
+
+    def device_id_by_name(self, device_name):
+        """Integer ID of the first water or electricity device called `device_name`, or None."""
+        if device_name not in self._device_id_by_name_cache:
+            self._device_id_by_name_cache[device_name] = self.device_ids_by_name.get(device_name.lower())
+        return self._device_id_by_name_cache[device_name]
+
+    @property
+    def device_states(self):
+        """
+        Device states keyed by "Room_device", in the old dict format. A view of the device arrays: setting "in_use" or
+        "used_by" of a device updates them, anything else raises TypeError.
+        """
+        return DeviceStates(self)
+
+    def checkpoint_state(self):
+        """Mutable state of the house (conditions, totals, device locks) as plain data."""
+        return {
+            "temperature": self.temperature,
+            "humidity": self.humidity,
+            "total_electricity_used_kwh": self.total_electricity_used_kwh,
+            "total_water_used_liters": self.total_water_used_liters,
+            "device_electricity_usage": dict(self.device_electricity_usage),
+            "device_in_use": self.device_in_use.tolist(),
+            "device_used_by": list(self.device_used_by)
+        }
+
+    def restore_state(self, state):
+        self.temperature = state["temperature"]
+        self.humidity = state["humidity"]
+        self.total_electricity_used_kwh = state["total_electricity_used_kwh"]
+        self.total_water_used_liters = state["total_water_used_liters"]
+        self.device_electricity_usage = dict(state["device_electricity_usage"])
+        self.device_in_use = np.array(state["device_in_use"], dtype=bool)
+        self.device_used_by = list(state["device_used_by"])
+
+    def acquire_device(self, device_id, npc_name):
+        self.device_in_use[device_id] = True
+        self.device_used_by[device_id] = npc_name
+
+    def release_device(self, device_id):
+        self.device_in_use[device_id] = False
+        self.device_used_by[device_id] = None
+
     def is_device_available(self, device_name, room_name):
-        key = f"{room_name}_{device_name}"
-        if key in self.device_states:
-            return not self.device_states[key]["in_use"]
+        device_id = self.device_id(device_name, room_name)
+        if device_id is not None:
+            return not self.device_in_use[device_id]
         return False
         
     def get_total_rooms(self):
@@ -179,61 +492,419 @@ class House:
     
     def get_device_by_name(self, device_name):
         """Find a device by its name in either water or electricity devices"""
-        for device in self.water_devices:
-            if device["device"].lower() == device_name.lower():
-                return {"type": "water", "device": device}
-        
-        for device in self.electricity_devices:
-            if device["device"].lower() == device_name.lower():
-                return {"type": "electricity", "device": device}
-        
-        return None
+        device_id = self.device_id_by_name(device_name)
+        if device_id is None:
+            return None
+        return self.device_info[device_id]
 
     
     def has_device_in_room(self, device_name, room_name):
         """Check if a device exists in a specific room"""
-        for device in self.water_devices + self.electricity_devices:
-            if (device["device"].lower() == device_name.lower() and 
-                device.get("room", "").lower() == room_name.lower()):
-                return True
-        return False
+        return self.device_id(device_name, room_name) is not None
     
     
     
+class OutOfHomeSchedule:
+    """
+    out_of_home_periods compiled once into minute-of-day tables.
+
+    A period {"start": "09:00", "end": "17:00"} covers every instant from 09:00:00 to 17:00:00 (both included,
+    like the old strptime check). Periods with end < start wrap over midnight and cover both the evening and
+    the early morning part. Lookups are two integer divisions and an array index; when periods overlap the
+    first one in the list wins.
+    """
+
+    MINUTES_PER_DAY = 1440
+
+    def __init__(self, out_of_home_periods):
+        self.periods = list(out_of_home_periods)
+        self.reasons = [period["reason"] for period in self.periods]
+        self.end_minutes = [self._minute_of_day(period["end"]) for period in self.periods]
+        self.wraps = []
+
+        # Period index per minute, -1 when at home. inner_period covers the whole minute, second0_period only its
+        # first second (which also includes the inclusive end of a period).
+        self.inner_period = np.full(self.MINUTES_PER_DAY, -1, dtype=np.int16)
+        self.second0_period = np.full(self.MINUTES_PER_DAY, -1, dtype=np.int16)
+
+        # Fill in reverse so that the first matching period overwrites the later ones
+        for index in reversed(range(len(self.periods))):
+            start = self._minute_of_day(self.periods[index]["start"])
+            end = self.end_minutes[index]
+            if end >= start:
+                minutes = np.arange(start, end)
+            else:  # Crosses midnight
+                minutes = np.concatenate((np.arange(start, self.MINUTES_PER_DAY), np.arange(0, end)))
+            self.inner_period[minutes] = index
+            self.second0_period[minutes] = index
+            self.second0_period[end] = index
+        for index, period in enumerate(self.periods):
+            self.wraps.append(self.end_minutes[index] < self._minute_of_day(period["start"]))
+        # Plain lists for the per-visit lookups (indexing a list is cheaper than a NumPy array)
+        self._inner_list = self.inner_period.tolist()
+        self._second0_list = self.second0_period.tolist()
+
+    @staticmethod
+    def _minute_of_day(hh_mm):
+        hours, minutes = hh_mm.split(":")
+        return int(hours) * 60 + int(minutes)
+
+    @staticmethod
+    def _second_of_day(moment):
+        return moment.hour * 3600 + moment.minute * 60 + moment.second + moment.microsecond / 1e6
+
+    def period_at_second(self, second_of_day):
+        """Index of the out-of-home period covering a wall-clock second of the day (see sim_clock.LocalTime), or -1."""
+        minute = int(second_of_day // 60)
+        if second_of_day % 60 == 0:
+            return self._second0_list[minute]
+        return self._inner_list[minute]
+
+    def period_at(self, moment):
+        """Index of the out-of-home period covering `moment` (wall time of the datetime), or -1."""
+        return self.period_at_second(self._second_of_day(moment))
+
+    def lookup_second(self, second_of_day):
+        """lookup() for a wall-clock second of the day."""
+        index = self.period_at_second(second_of_day)
+        if index < 0:
+            return False, None
+        return True, self.reasons[index]
+
+    def lookup(self, moment):
+        """Same result as NPC.is_out_of_home: (True, reason) or (False, None)."""
+        return self.lookup_second(self._second_of_day(moment))
+
+    def until_second(self, second_of_day):
+        """
+        End (inclusive) of the period covering a wall-clock second of the day, in seconds from the start of that
+        day (past 86400 when the period ends the next day), or None when at home.
+        """
+        index = self.period_at_second(second_of_day)
+        if index < 0:
+            return None
+        end_minute = self.end_minutes[index]
+        end_second = end_minute * 60
+        if self.wraps[index] and int(second_of_day // 60) > end_minute:
+            end_second += 86400
+        return end_second
+
+    def until(self, moment):
+        """End (inclusive) of the period covering `moment`, or None when at home."""
+        end_second = self.until_second(self._second_of_day(moment))
+        if end_second is None:
+            return None
+        day_start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        return day_start + timedelta(seconds=end_second)
+
+    def out_of_home_mask(self, step_minutes=5):
+        """Boolean array over one day (every `step_minutes`, starting at 00:00) that is True while out of home."""
+        return self.second0_period[::step_minutes] >= 0
+
+    def presence_mask(self, step_minutes=5):
+        """Boolean array over one day (every `step_minutes`, starting at 00:00) that is True while at home."""
+        return ~self.out_of_home_mask(step_minutes)
+
+
+# Needs an action can change, in the order of Action.need_vector / ActionCatalog.need_matrix
+NEED_NAMES = ("hunger", "energy", "hygiene", "fun")
+
+# Actions of the NPCs (durations in minutes). A config can replace them with its own "actions" list in the same format.
+DEFAULT_ACTIONS = [
+    {
+        "name": "cook",
+        "duration": 30,
+        "location": "Kitchen",
+        "required_device": "stove",
+        "need_changes": {"hunger": 0, "energy": -20, "hygiene": -25, "fun": 15},
+        "next_action": "eat",
+        "allowed_age_groups": ["adult", "elderly"]
+    },
+    {
+        "name": "eat",
+        "duration": 20,
+        "location": "Dining Room",
+        "need_changes": {"hunger": -70, "energy": 20, "hygiene": -20, "fun": 20},
+        "next_action": "use_dishwasher",
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "use_dishwasher",
+        "duration": 5,
+        "location": "Kitchen",
+        "required_device": "dishwasher",
+        "need_changes": {"hunger": 0, "energy": -5, "hygiene": 7, "fun": -10},
+        "next_action": "wash_hands",
+        "allowed_age_groups": ["adult", "elderly"]
+    },
+    {
+        "name": "wash_hands",
+        "duration": 2,
+        "location": "Bathroom",
+        "required_device": "sink",
+        "need_changes": {"hunger": 0, "energy": -2, "hygiene": 30, "fun": 0},
+        "next_action": "brush_teeth",
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "brush_teeth",
+        "duration": 5,
+        "location": "Bathroom",
+        "required_device": "sink",
+        "need_changes": {"hunger": 0, "energy": -5, "hygiene": 35, "fun": 0},
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "nap_sleep",
+        "duration": 30,
+        "location": "Bedroom",
+        "need_changes": {"hunger": 20, "energy": 80, "hygiene": -15, "fun": 5},
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "shower",
+        "duration": 10,
+        "location": "Bathroom",
+        "required_device": "shower",
+        "need_changes": {"hunger": 0, "energy": 5, "hygiene": 55, "fun": 0},
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "watch_tv",
+        "duration": 60,
+        "location": "Living Room",
+        "required_device": "tv",
+        "need_changes": {"hunger": 15, "energy": 5, "hygiene": -5, "fun": 35},
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "play_games",
+        "duration": 15,
+        "location": "Living Room",
+        "required_device": "gaming_console",
+        "need_changes": {"hunger": 20, "energy": -20, "hygiene": -15, "fun": 30},
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "go_for_walk",
+        "duration": 20,
+        "location": "Outside",
+        "need_changes": {"hunger": 35, "energy": -30, "hygiene": -15, "fun": 25},
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "use_toilet",
+        "duration": 3,
+        "location": "Bathroom",
+        "required_device": "toilet",
+        "need_changes": {"hunger": 0, "energy": -1, "hygiene": 5, "fun": 0},
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "call_friend",
+        "duration": 5,
+        "location": "Living Room",
+        "need_changes": {"hunger": 5, "energy": -5, "hygiene": 0, "fun": 10},
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "read_book",
+        "duration": 15,
+        "location": "Bedroom",
+        "need_changes": {"hunger": 10, "energy": -5, "hygiene": 0, "fun": 20},
+        "allowed_age_groups": ["child", "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "go_shopping",
+        "duration": 25,
+        "location": "Outside",
+        "need_changes": {"hunger": 5, "energy": -5, "hygiene": 0, "fun": 10},
+        "allowed_age_groups": ["adult", "elderly", "teenager"]
+    },
+    {
+        "name": "go_for_jog",
+        "duration": 20,
+        "location": "Outside",
+        "need_changes": {"hunger": 25, "energy": -20, "hygiene": -15, "fun": 25},
+        "next_action": "shower",
+        "allowed_age_groups": ["adult", "teenager"]
+    },
+    {
+        "name": "go_to_gym",
+        "duration": 30,
+        "location": "Outside",
+        "need_changes": {"hunger": 30, "energy": -35, "hygiene": -20, "fun": 30},
+        "next_action": "shower",
+        "allowed_age_groups": ["adult", "teenager"]
+    },
+    {
+        "name": "clean_house",
+        "duration": 30,
+        "location": "Living Room",
+        "required_device": "vacuum_cleaner",
+        "need_changes": {"hunger": 20, "energy": -20, "hygiene": 20, "fun": -20},
+        "allowed_age_groups": ["adult", "elderly"]
+    },
+    {
+        "name": "study",
+        "duration": 25,
+        "location": "Bedroom",
+        "required_device": "computer",
+        "need_changes": {"hunger": 15, "energy": -25, "hygiene": -10, "fun": -15},
+        "allowed_age_groups": [ "teenager", "adult", "elderly"]
+    },
+    {
+        "name": "overthink",
+        "duration": 10,
+        "location": "Bedroom",
+        "need_changes": {"hunger": 5, "energy": -10, "hygiene": 0, "fun": -10},
+        "allowed_age_groups": ["adult", "elderly", "t"]
+    }
+]
+
+# Actions the NPC decision rules (NPC.decide_next_action, npc_population) pick by name: every catalog must define them
+REQUIRED_ACTIONS = ("use_toilet", "nap_sleep", "cook", "shower", "watch_tv", "play_games", "go_for_jog", "go_to_gym",
+                    "clean_house", "study", "overthink", "call_friend", "read_book", "go_shopping")
+
+
 class Action:
-    def __init__(self, name, duration, location, required_device=None, need_changes=None, next_action=None, allowed_age_groups=None):
-        self.name = name
-        self.location = location
-        self.required_device = required_device
-        self.need_changes = need_changes or {}
-        self.next_action = next_action
+    """
+    One immutable entry of an ActionCatalog, shared by every NPC of the process.
+
+    need_vector holds need_changes in NEED_NAMES order, so finishing an action is a single vector add.
+    next_action is the name of the action that follows in a chain (cook -> eat -> ...), or None.
+    """
+
+    __slots__ = ("action_id", "name", "duration", "location", "required_device", "need_changes", "need_vector", "next_action", "allowed_age_groups")
+
+    def __init__(self, name, duration, location, required_device=None, need_changes=None, next_action=None, allowed_age_groups=None, action_id=-1, in_minutes=None):
+        unknown = set(need_changes or {}) - set(NEED_NAMES)
+        if unknown:
+            raise ValueError(f"Action '{name}' changes unknown needs: {sorted(unknown)}")
+        if in_minutes is None:
+            in_minutes = actions_in_minutes
         
+        set_attribute = object.__setattr__
+        set_attribute(self, "action_id", action_id)
+        set_attribute(self, "name", name)
+        set_attribute(self, "location", location)
+        set_attribute(self, "required_device", required_device)
+        set_attribute(self, "need_changes", MappingProxyType(dict(need_changes or {})))
+        set_attribute(self, "need_vector", tuple(self.need_changes.get(need, 0) for need in NEED_NAMES))
+        set_attribute(self, "next_action", next_action)
         # Default to all age groups if not specified
-        self.allowed_age_groups = allowed_age_groups or ["child", "teenager", "adult", "elderly"]
-        
-        if actions_in_minutes:  # Assuming this is a global flag for time units
-            self.duration = duration * 60
-        else:
-            self.duration = duration
+        set_attribute(self, "allowed_age_groups", tuple(allowed_age_groups or ("child", "teenager", "adult", "elderly")))
+        set_attribute(self, "duration", duration * 60 if in_minutes else duration)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Action '{self.name}' is shared by all the NPCs and cannot be modified.")
+
+    def __repr__(self):
+        return f"Action({self.action_id}, {self.name!r})"
+
+
+class ActionCatalog:
+    """
+    Frozen set of actions built once and shared by every NPC (and the NPCPopulation engine).
+
+    Actions have integer IDs (their position in the catalog), can be looked up by name (catalog["cook"]) and their need
+    changes are also available as one (number_of_actions, len(NEED_NAMES)) read-only array, need_matrix.
+    The catalog must define every action of REQUIRED_ACTIONS, and every next_action must name one of its actions
+    (ValueError otherwise).
+    """
+
+    def __init__(self, definitions=DEFAULT_ACTIONS, in_minutes=None):
+        actions = []
+        for action_id, definition in enumerate(definitions):
+            actions.append(Action(action_id=action_id, in_minutes=in_minutes, **definition))
+        self.actions = tuple(actions)
+        self.by_name = MappingProxyType({action.name: action for action in self.actions})
+        if len(self.by_name) != len(self.actions):
+            raise ValueError("Action names must be unique.")
+        missing = [name for name in REQUIRED_ACTIONS if name not in self.by_name]
+        if missing:
+            raise ValueError(f"The action catalog does not define the actions the NPCs need: {', '.join(missing)}.")
+        for action in self.actions:
+            if action.next_action is not None and action.next_action not in self.by_name:
+                raise ValueError(f"Action '{action.name}' chains into unknown action '{action.next_action}'.")
         
+        self.need_matrix = np.array([action.need_vector for action in self.actions], dtype=float).reshape(len(self.actions), len(NEED_NAMES))
+        self.need_matrix.flags.writeable = False
+        self._chains = {}
+
+    @classmethod
+    def from_json(cls, filepath, in_minutes=None):
+        """Load a catalog from a JSON file holding a list of actions (or a config with an "actions" list)."""
+        with open(filepath, "r") as file:
+            data = json.load(file)
+        if isinstance(data, dict):
+            data = data["actions"]
+        return cls(data, in_minutes)
+
+    @classmethod
+    def from_config(cls, config_data, in_minutes=None):
+        """Catalog of a config: its own "actions" list if it has one, otherwise the shared default catalog."""
+        if config_data.get("actions"):
+            return cls(config_data["actions"], in_minutes)
+        return default_catalog(in_minutes)
+
+    def __getitem__(self, name):
+        return self.by_name[name]
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __iter__(self):
+        return iter(self.actions)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def chain(self, name):
+        """The actions of the chain starting at `name`, following next_action."""
+        if name not in self._chains:
+            chain = []
+            current = self.by_name[name]
+            while current:
+                chain.append(current)
+                current = self.by_name[current.next_action] if current.next_action else None
+            self._chains[name] = tuple(chain)
+        return self._chains[name]
+
+
+# One default catalog per process and time unit
+_default_catalogs = {}
+
+def default_catalog(in_minutes=None):
+    """The shared catalog of DEFAULT_ACTIONS, built on first use."""
+    if in_minutes is None:
+        in_minutes = actions_in_minutes
+    if in_minutes not in _default_catalogs:
+        _default_catalogs[in_minutes] = ActionCatalog(DEFAULT_ACTIONS, in_minutes)
+    return _default_catalogs[in_minutes]
+
 
 class NPC:
-    def __init__(self, name, out_of_home_periods, house, age_group, simulation_type="fast_forward"):
+    def __init__(self, name, out_of_home_periods, house, age_group, simulation_type="fast_forward", rng=None, catalog=None):
         self.name = name
         self.age_group = age_group
         self.out_of_home_periods = out_of_home_periods
+        self.schedule = OutOfHomeSchedule(out_of_home_periods)
         self.house = house
         self.current_room = "Living Room"
         self.state = "Idle"
-        self.action_start_time = None
+        # Instants are epoch seconds (see sim_clock), the *_time properties give them as datetimes
+        self.action_start = None
         self.current_action = None
-        self.action_end_time = None
+        self.action_end = None
         self.action_chain = []
+        # Own random stream (random_streams.RandomStream), unseeded unless the run gives one
+        self.rng = rng if rng is not None else RandomStream()
         self.needs = {
-            "hunger": random.randint(0, 100),
-            "energy": random.randint(0, 100),
-            "hygiene": random.randint(0, 100),
-            "fun": random.randint(0, 100),
+            "hunger": self.rng.randint(0, 100),
+            "energy": self.rng.randint(0, 100),
+            "hygiene": self.rng.randint(0, 100),
+            "fun": self.rng.randint(0, 100),
             "temperature": 22
         }
         # Initialize datetimes based on simulation type
@@ -241,166 +912,78 @@ class NPC:
             self.time = datetime.now(timezone.utc)
         else:  # Default to naive for "fast_forward" to match original behavior
             self.time = datetime.now()
-        self.last_toilet_time = self.time
-        self.actions = {}
-        self._setup_actions()
-
-    def _setup_actions(self):
-        """Setup actions with their proper chains as per diagram"""
-        # Create actions first
-        self.actions = {
-            "cook": Action(
-                name="cook",
-                duration=30,
-                location="Kitchen",
-                required_device="stove",
-                need_changes={"hunger": 0, "energy": -20, "hygiene": -25, "fun": 15},
-                allowed_age_groups=["adult", "elderly"]
-            ),
-            "eat": Action(
-                name="eat",
-                duration=20,
-                location="Dining Room",
-                need_changes={"hunger": -70, "energy": 20, "hygiene": -20, "fun": 20},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "use_dishwasher": Action(
-                name="use_dishwasher",
-                duration=5,
-                location="Kitchen",
-                required_device="dishwasher",
-                need_changes={"hunger": 0, "energy": -5, "hygiene": 7, "fun": -10},
-                allowed_age_groups=["adult", "elderly"]
-            ),
-            "wash_hands": Action(
-                name="wash_hands",
-                duration=2,
-                location="Bathroom",
-                required_device="sink",
-                need_changes={"hunger": 0, "energy": -2, "hygiene": 30, "fun": 0},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "brush_teeth": Action(
-                name="brush_teeth",
-                duration=5,
-                location="Bathroom",
-                required_device="sink",
-                need_changes={"hunger": 0, "energy": -5, "hygiene": 35, "fun": 0},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "nap_sleep": Action(
-                name="nap_sleep",
-                duration=30,
-                location="Bedroom",
-                need_changes={"hunger": 20, "energy": 80, "hygiene": -15, "fun": 5},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "shower": Action(
-                name="shower",
-                duration=10,
-                location="Bathroom",
-                required_device="shower",
-                need_changes={"hunger": 0, "energy": 5, "hygiene": 55, "fun": 0},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "watch_tv": Action(
-                name="watch_tv",
-                duration=60,
-                location="Living Room",
-                required_device="tv",
-                need_changes={"hunger": 15, "energy": 5, "hygiene": -5, "fun": 35},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "play_games": Action(
-                name="play_games",
-                duration=15,
-                location="Living Room",
-                required_device="gaming_console",
-                need_changes={"hunger": 20, "energy": -20, "hygiene": -15, "fun": 30},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "go_for_walk": Action(
-                name="go_for_walk",
-                duration=20,
-                location="Outside",
-                need_changes={"hunger": 35, "energy": -30, "hygiene": -15, "fun": 25},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "use_toilet": Action(
-                name="use_toilet",
-                duration=3,
-                location="Bathroom",
-                required_device="toilet",
-                need_changes={"hunger": 0, "energy": -1, "hygiene": 5, "fun": 0},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "call_friend": Action(
-                name="call_friend",
-                duration=5,
-                location="Living Room",
-                need_changes={"hunger": 5, "energy": -5, "hygiene": 0, "fun": 10},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "read_book": Action(
-                name="read_book",
-                duration=15,
-                location="Bedroom",
-                need_changes={"hunger": 10, "energy": -5, "hygiene": 0, "fun": 20},
-                allowed_age_groups=["child", "teenager", "adult", "elderly"]
-            ),
-            "go_shopping": Action(
-                name="go_shopping",
-                duration=25,
-                location="Outside",
-                need_changes={"hunger": 5, "energy": -5, "hygiene": 0, "fun": 10},
-                allowed_age_groups=["adult", "elderly", "teenager"]
-            ),
-            "go_for_jog": Action(
-                name="go_for_jog",
-                duration=20,
-                location="Outside",
-                need_changes={"hunger": 25, "energy": -20, "hygiene": -15, "fun": 25},
-                allowed_age_groups=["adult", "teenager"]
-            ),
-            "go_to_gym": Action(
-                name="go_to_gym",
-                duration=30,
-                location="Outside",
-                need_changes={"hunger": 30, "energy": -35, "hygiene": -20, "fun": 30},
-                allowed_age_groups=["adult", "teenager"]
-            ),
-            "clean_house": Action(
-                name="clean_house",
-                duration=30,
-                location="Living Room",
-                required_device="vacuum_cleaner",
-                need_changes={"hunger": 20, "energy": -20, "hygiene": 20, "fun": -20},
-                allowed_age_groups=["adult", "elderly"]
-            ),
-            "study": Action(
-                name="study",
-                duration=25,
-                location="Bedroom",
-                required_device="computer",
-                need_changes={"hunger": 15, "energy": -25, "hygiene": -10, "fun": -15},
-                allowed_age_groups=[ "teenager", "adult", "elderly"]
-            ),
-            "overthink": Action(
-                name="overthink",
-                duration=10,
-                location="Bedroom",
-                need_changes={"hunger": 5, "energy": -10, "hygiene": 0, "fun": -10},
-                allowed_age_groups=["adult", "elderly", "t"]
-            ),
+        self.last_toilet = self.now
+        self.action_log = None  # ActionLogWriter, falls back to add_action_to_json when None
+        # Shared, read-only actions (by name)
+        self.catalog = catalog if catalog is not None else default_catalog()
+        self.actions = self.catalog.by_name
+
+    @property
+    def time(self):
+        return self.clock.datetime(self.now)
+
+    @time.setter
+    def time(self, moment):
+        # The wall clock (out-of-home schedule, log timestamps) follows the timezone of the datetime
+        self.clock = local_time(moment.tzinfo)
+        self.now = to_epoch(moment)
+
+    @property
+    def action_start_time(self):
+        return self.clock.datetime(self.action_start) if self.action_start is not None else None
+
+    @action_start_time.setter
+    def action_start_time(self, moment):
+        self.action_start = to_epoch(moment) if moment is not None else None
+
+    @property
+    def action_end_time(self):
+        return self.clock.datetime(self.action_end) if self.action_end is not None else None
+
+    @action_end_time.setter
+    def action_end_time(self, moment):
+        self.action_end = to_epoch(moment) if moment is not None else None
+
+    @property
+    def last_toilet_time(self):
+        return self.clock.datetime(self.last_toilet)
+
+    @last_toilet_time.setter
+    def last_toilet_time(self, moment):
+        self.last_toilet = to_epoch(moment)
+
+    def checkpoint_state(self):
+        """Mutable state of the NPC as plain data (actions by catalog ID, random stream state)."""
+        return {
+            "name": self.name,
+            "needs": dict(self.needs),
+            "state": self.state,
+            "current_room": self.current_room,
+            "current_action": self.current_action.action_id if self.current_action else None,
+            "action_chain": [action.action_id for action in self.action_chain],
+            "action_start_time": self.action_start_time,
+            "action_end_time": self.action_end_time,
+            "time": self.time,
+            "last_toilet_time": self.last_toilet_time,
+            "activity": getattr(self, "activity", None),
+            "rng": self.rng.getstate()
         }
-        
-        # Setup action chains as per diagram
-        self.actions["cook"].next_action = "eat"
-        self.actions["eat"].next_action = "use_dishwasher"
-        self.actions["use_dishwasher"].next_action = "wash_hands"
-        self.actions["wash_hands"].next_action = "brush_teeth"
-        self.actions["go_for_jog"].next_action = "shower"
-        self.actions["go_to_gym"].next_action = "shower"
+
+    def restore_state(self, state):
+        if state["name"] != self.name:
+            raise ValueError(f"Checkpoint NPC '{state['name']}' does not match '{self.name}'.")
+        actions = self.catalog.actions
+        self.needs = dict(state["needs"])
+        self.state = state["state"]
+        self.current_room = state["current_room"]
+        self.current_action = actions[state["current_action"]] if state["current_action"] is not None else None
+        self.action_chain = [actions[action_id] for action_id in state["action_chain"]]
+        self.action_start_time = state["action_start_time"]
+        self.action_end_time = state["action_end_time"]
+        self.time = state["time"]
+        self.last_toilet_time = state["last_toilet_time"]
+        self.activity = state["activity"]
+        self.rng.setstate(state["rng"])
 
     def update_needs(self):
         """Update needs based on time and house conditions"""
@@ -415,29 +998,54 @@ class NPC:
             self.needs["energy"] = max(0, self.needs["energy"] - int(temp_diff / 5))
             self.needs["fun"] = max(0, self.needs["fun"] - int(temp_diff / 5))
         
-        # Toilet need every 2 hours
-        if (self.time - self.last_toilet_time).seconds >= 7200 and self.actions["use_toilet"] not in self.action_chain:
+        # Toilet need every 2 hours (on the clock: the elapsed time modulo a day, like timedelta.seconds)
+        if (self.now - self.last_toilet) % 86400 >= 7200 and self.actions["use_toilet"] not in self.action_chain:
             self.action_chain.append(self.actions["use_toilet"])
-            self.last_toilet_time = self.time
+            self.last_toilet = self.now
+
+    def decay_needs(self, ticks, penalties=None):
+        """
+        Apply the decay of update_needs for `ticks` skipped ticks (no toilet check), one clamped step per tick in a tight
+        loop so the needs are the same floats as with a tick-by-tick update (a closed form rounds differently and a
+        need threshold can flip). penalties holds the temperature penalty of every skipped tick when the temperature
+        changes over them (None: the current house temperature for all of them).
+        """
+        if ticks <= 0:
+            return
+        if penalties is None:
+            temp_diff = abs(int(self.house.temperature) - int(self.needs["temperature"]))
+            penalties = [int(temp_diff / 5) if temp_diff > 5 else 0] * ticks
+        needs = self.needs
+        hunger, energy, hygiene, fun = needs["hunger"], needs["energy"], needs["hygiene"], needs["fun"]
+        for penalty in penalties:
+            hunger = min(100, hunger + 0.5)
+            energy = max(0, energy - 0.3)
+            hygiene = max(0, hygiene - 0.7)
+            fun = max(0, fun - 0.4)
+            if penalty:
+                energy = max(0, energy - penalty)
+                fun = max(0, fun - penalty)
+        needs["hunger"], needs["energy"], needs["hygiene"], needs["fun"] = hunger, energy, hygiene, fun
             
     
     def is_out_of_home(self):
-        for period in self.out_of_home_periods:
-            start_dt = datetime.strptime(f"{self.time.date()} {period['start']}", "%Y-%m-%d %H:%M").replace(tzinfo=self.time.tzinfo)
-            end_dt = datetime.strptime(f"{self.time.date()} {period['end']}", "%Y-%m-%d %H:%M").replace(tzinfo=self.time.tzinfo)
-            if end_dt < start_dt:  # Crosses midnight
-                end_dt += timedelta(days=1)
-            if start_dt <= self.time <= end_dt:
-                return True, period["reason"]
-        return False, None
+        return self.schedule.lookup_second(self.clock.second_of_day(self.now))
+
+    def out_of_home_until(self):
+        """Return the end of the out-of-home period the NPC is currently in (inclusive, epoch seconds), or None if at home."""
+        second_of_day = self.clock.second_of_day(self.now)
+        end_second = self.schedule.until_second(second_of_day)
+        if end_second is None:
+            return None
+        return self.now - second_of_day + end_second
 
 
     def decide_next_action(self):
         """Decide next action based on needs and chains"""
         
         # If out of home, do nothing
-        if self.is_out_of_home()[0]:
-            reason = self.is_out_of_home()[1]
+        out_of_home, reason = self.is_out_of_home()
+        if out_of_home:
             return "out_of_home", reason
         
         
@@ -451,33 +1059,29 @@ class NPC:
         
         if self.needs["hunger"] > 85:
             # Start the cooking -> eating -> cleaning chain
-            self.action_chain = []
-            current = self.actions["cook"]
-            while current:
-                self.action_chain.append(current)
-                current = self.actions[current.next_action] if current.next_action else None
+            self.action_chain = list(self.catalog.chain("cook"))
             return self.action_chain.pop(0)
             
         if self.needs["hygiene"] < 30:
             return self.actions["shower"]
             
         if self.needs["fun"] < 30:
-            return random.choice([self.actions["watch_tv"], self.actions["play_games"]])
+            return self.rng.choice([self.actions["watch_tv"], self.actions["play_games"]])
         
         # If too much energy
         if self.needs["energy"] > 80:
-            return random.choice([self.actions["go_for_jog"], self.actions["go_to_gym"]])
+            return self.rng.choice([self.actions["go_for_jog"], self.actions["go_to_gym"]])
         
         # If too much fun
         if self.needs["fun"] > 70:
-            return random.choice([self.actions["clean_house"], self.actions["study"], self.actions["overthink"]])
+            return self.rng.choice([self.actions["clean_house"], self.actions["study"], self.actions["overthink"]])
         
 
             
         #return None
 
         #If non of the if's work: its idle, choose a random action
-        return random.choice([self.actions["call_friend"], self.actions["read_book"], self.actions["go_shopping"]])
+        return self.rng.choice([self.actions["call_friend"], self.actions["read_book"], self.actions["go_shopping"]])
 
 
 
@@ -499,74 +1103,75 @@ class NPC:
         self.current_room = action.location
         self.state = "Performing Action"
         self.current_action = action
-        self.action_start_time = self.time  # Set start time
-        self.action_end_time = self.time + timedelta(seconds=action.duration)
+        self.action_start = self.now  # Set start time
+        self.action_end = self.now + action.duration
         self.activity = f"{self.name} started {action.name} in {self.current_room} (will take {(action.duration)/60} minutes ({action.duration} seconds))."
                 
         # Mark the device as in use
         if action.required_device:
-            key = f"{action.location}_{action.required_device}"
-            self.house.device_states[key]["in_use"] = True
-            self.house.device_states[key]["used_by"] = self.name
+            self.house.acquire_device(self.house.device_id(action.required_device, action.location), self.name)
         
      
 
 
+    def log_action(self, action="NAN", device_used="NAN", energy_used=0, water_used=0, duration=0):
+        """Log an action at the NPC's current time, through the buffered writer when there is one."""
+        if self.action_log is not None:
+            self.action_log.add_action(NPCtime=self.now, action=action, device_used=device_used,
+                                       energy_used=energy_used, water_used=water_used,
+                                       duration=duration, npc_name=self.name, clock=self.clock)
+        else:
+            add_action_to_json(NPCtime=self.time, action=action, device_used=device_used,
+                               energy_used=energy_used, water_used=water_used, duration=duration,
+                               npc_name=self.name, FILEPATH="results/user_data.json", print_message=False)
+
+
     def finish_action(self):
         if self.current_action and self.state == "Performing Action":
             # Update needs
-            for need, change in self.current_action.need_changes.items():
-                new_value = self.needs[need] + change
-                self.needs[need] = max(0, min(100, new_value))
+            for need, change in zip(NEED_NAMES, self.current_action.need_vector):
+                self.needs[need] = max(0, min(100, self.needs[need] + change))
             
             # Calculate resource usage
             energy_kwh = 0
             water_used_liters = 0
             
             if self.current_action.required_device:
-                device_info = self.house.get_device_by_name(self.current_action.required_device)
-                if device_info:
-                    device_type = device_info["type"]
-                    device = device_info["device"]
-                    
-                    if device_type == "electricity":
-                        power_watts = device.get("power_watts", 0)
+                house = self.house
+                usage_id = house.device_id_by_name(self.current_action.required_device)
+                if usage_id is not None:
+                    if not house.device_is_water[usage_id]:
+                        power_watts = float(house.device_power_watts[usage_id])
                         energy_kwh = (power_watts * (self.current_action.duration / 3600)) / 1000
-                        self.house.total_electricity_used_kwh += energy_kwh
-                        device_key = f"{self.current_room}_{self.current_action.required_device}"
-                        if device_key in self.house.device_electricity_usage:
-                            self.house.device_electricity_usage[device_key] += energy_kwh
+                        house.total_electricity_used_kwh += energy_kwh
+                        device_key = house.device_keys[house.device_id(self.current_action.required_device, self.current_room)]
+                        if device_key in house.device_electricity_usage:
+                            house.device_electricity_usage[device_key] += energy_kwh
                             
-                    elif device_type == "water":
-                        flow_rate_lpm = device.get("flow_rate_liters_per_minute", 0)
+                    else:
+                        flow_rate_lpm = float(house.device_flow_lpm[usage_id])
                         water_used_liters = flow_rate_lpm * (self.current_action.duration / 60)
-                        self.house.total_water_used_liters += water_used_liters
-                        if device["device"] in ["shower", "sink"] and self.house.water_heating["method"] == "electricity":
+                        house.total_water_used_liters += water_used_liters
+                        if house.device_heats_water[usage_id]:
                             heating_energy = water_used_liters * ENERGY_PER_LITER_HOT_WATER
                             energy_kwh = heating_energy
-                            self.house.total_electricity_used_kwh += heating_energy
+                            house.total_electricity_used_kwh += heating_energy
                     
                     # Release device
-                    key = f"{self.current_room}_{self.current_action.required_device}"
-                    self.house.device_states[key]["in_use"] = False
-                    self.house.device_states[key]["used_by"] = None
+                    house.release_device(house.device_id(self.current_action.required_device, self.current_room))
             
             # Log action with full timestamp
-            add_action_to_json(
-                NPCtime=self.time,  # Pass datetime object
+            self.log_action(
                 action=self.current_action.name,
                 device_used=self.current_action.required_device or "NAN",
                 energy_used=energy_kwh,
                 water_used=water_used_liters,
-                duration=self.current_action.duration,
-                npc_name=self.name,
-                FILEPATH="results/user_data.json",
-                print_message=False
+                duration=self.current_action.duration
             )
             
             # Reset state and immediately decide next action
             self.current_action = None
-            self.action_end_time = None
+            self.action_end = None
             self.state = "Idle"
             self.activity = f"{self.name} finished the action in {self.current_room}."
             next_action = self.decide_next_action()
@@ -582,7 +1187,7 @@ class NPC:
         self.update_needs()
         
         if self.state == "Performing Action":
-            if self.time >= self.action_end_time:
+            if self.now >= self.action_end:
                 self.finish_action()
             else:
                 self.activity = f"{self.name} is still performing {self.current_action.name}."
@@ -591,16 +1196,12 @@ class NPC:
             if next_action:
                 if isinstance(next_action, tuple) and next_action[0] == "out_of_home":
                     self.activity = f"{self.name} is out of home because of {next_action[1]}."
-                    add_action_to_json(
-                        NPCtime=self.time,  # Pass datetime object
+                    self.log_action(
                         action=next_action[1],
                         device_used="NAN",
                         energy_used=0,
                         water_used=0,
-                        duration=0,
-                        npc_name=self.name,
-                        FILEPATH="results/user_data.json",
-                        print_message=False
+                        duration=0
                     )
                 else:
                     self.perform_action(next_action)
@@ -626,7 +1227,335 @@ class NPC:
 
 #################################################################### NPC CONFIG ####################################################################
 
-def run_simulation(config_data, output_path="results/user_data.json", update_interval=300, actions_in_minutes_flag=True, start_date=None, end_date=None):
+class EventScheduler:
+    """
+    Discrete-event engine behind run_simulation.
+
+    Instead of calling decide_and_act for every NPC every 5 minutes, each NPC is only visited at its next
+    interesting tick: the end of its current action, the end of an out-of-home stretch or its next toilet
+    deadline (idle NPCs at home are still visited every tick, they decide something new each time).
+    The ticks of an out-of-home stretch only log the out-of-home marker of the NPC (Work, School...), in the same
+    order as the polling loop, so the action log is the same. Needs decay over the skipped ticks is applied in a
+    tight loop (decay_needs), and the consumption of an action is
+    spread over the 5-minute intervals it covers as soon as it starts. Each interval adds up its
+    contributions in NPC order, so the per-interval series are the same as with the fixed polling loop.
+    Ticks, NPC times and action bounds are epoch seconds (sim_clock); timestamps are only formatted
+    when the results are built. With a climate series on the house, the temperature and humidity of every tick are
+    gathered once for the horizon; the house takes them at every visit, and the decay of the skipped ticks takes
+    their temperature penalties.
+    """
+
+    def __init__(self, house, npcs, start_time, end_time, step=timedelta(minutes=5)):
+        self.house = house
+        self.npcs = npcs
+        self.start_time = start_time
+        self.end_time = end_time
+        self.step = step
+        self.step_seconds = step.total_seconds()
+        self.num_ticks = max(0, math.ceil((end_time - start_time).total_seconds() / self.step_seconds))
+        # Internally every instant is epoch seconds; datetimes and ISO strings are only built for the results
+        self.clock = local_time(start_time.tzinfo)
+        self.start_epoch = to_epoch(start_time)
+        self.step_epoch = int(self.step_seconds) if self.step_seconds.is_integer() else self.step_seconds
+
+        # tick -> [(npc index, is water, device key, kWh or liters, water heating kWh or None)], only ticks with device usage
+        self.contributions = {}
+
+        self.last_needs_tick = [-1] * len(npcs)
+        # Events at or after the horizon wait in `parked`, so a resumed run can extend the horizon
+        self.queue = []
+        self.parked = [(0, index) for index in range(len(npcs))]
+        self._unpark()
+        self.visits = 0
+        self.tick = 0  # every event before this tick has been processed
+        # NPC index -> (tick of its next visit, reason) while it is out of home: its events until then only log the marker
+        self.away = {}
+
+        self.climate = house.climate
+        if self.climate is not None:
+            self.tick_temperature, self.tick_humidity = self.climate.gather(self.start_epoch + np.arange(self.num_ticks) * self.step_epoch)
+            self._tick_penalties = {}
+
+    def time_at(self, tick):
+        return self.start_time + tick * self.step
+
+    def epoch_at(self, tick):
+        return self.start_epoch + tick * self.step_epoch
+
+    def tick_at_or_after(self, moment):
+        """First tick whose time is >= moment (epoch seconds)."""
+        return max(0, int(-((self.start_epoch - moment) // self.step_epoch)))
+
+    def tick_after(self, moment):
+        """First tick whose time is > moment (epoch seconds)."""
+        return max(0, int((moment - self.start_epoch) // self.step_epoch) + 1)
+
+    def _penalties(self, npc, first_tick, end_tick):
+        """Temperature penalties of update_needs for `npc` at the ticks [first_tick, end_tick)."""
+        preferred = int(npc.needs["temperature"])
+        penalties = self._tick_penalties.get(preferred)
+        if penalties is None:
+            # int() of update_needs truncates toward zero, like astype
+            temp_diff = np.abs(self.tick_temperature.astype(np.int64) - preferred)
+            penalties = self._tick_penalties[preferred] = np.where(temp_diff > 5, temp_diff // 5, 0).tolist()
+        return penalties[first_tick:end_tick]
+
+    def _decay(self, index, tick):
+        """Decay the needs of NPC `index` over the ticks after its last update and before `tick`."""
+        npc = self.npcs[index]
+        skipped = tick - self.last_needs_tick[index] - 1
+        if self.climate is None:
+            npc.decay_needs(skipped)
+        elif skipped > 0:
+            npc.decay_needs(skipped, self._penalties(npc, tick - skipped, tick))
+
+    def _unpark(self):
+        parked = self.parked
+        self.parked = [event for event in parked if event[0] >= self.num_ticks]
+        for event in parked:
+            if event[0] < self.num_ticks:
+                heapq.heappush(self.queue, event)
+
+    def run(self):
+        """Process every event until the end of the horizon."""
+        self.run_until(self.num_ticks)
+        self.finish()
+
+    def run_until(self, tick):
+        """Process the events before `tick` (a checkpoint boundary)."""
+        tick = min(tick, self.num_ticks)
+        while self.queue and self.queue[0][0] < tick:
+            event_tick, index = heapq.heappop(self.queue)
+            self._visit(event_tick, index)
+        self.tick = max(self.tick, tick)
+
+    def finish(self):
+        """Bring all needs up to the last tick, as the polling loop would have."""
+        for index in range(len(self.npcs)):
+            self._decay(index, self.num_ticks)
+            self.last_needs_tick[index] = self.num_ticks - 1
+
+    def _visit(self, tick, index):
+        npc = self.npcs[index]
+        moment = self.start_epoch + tick * self.step_epoch
+
+        away = self.away.get(index)
+        if away is not None:
+            next_tick, reason = away
+            if tick < next_tick:
+                # Out of home: the marker the polling loop logs every tick, nothing else happens
+                npc.now = moment
+                npc.log_action(action=reason)
+                self._push(tick + 1, index)
+                return
+            del self.away[index]
+        self.visits += 1
+
+        # Skipped ticks through decay_needs, the current one through decide_and_act (update_needs)
+        if self.climate is None:
+            npc.decay_needs(tick - self.last_needs_tick[index] - 1)
+        else:
+            self._decay(index, tick)
+            self.house.temperature, self.house.humidity = float(self.tick_temperature[tick]), float(self.tick_humidity[tick])
+        self.last_needs_tick[index] = tick
+
+        was_idle = npc.state == "Idle"
+        npc.now = moment
+        npc.decide_and_act()
+
+        if npc.state == "Performing Action" and npc.action_start == moment:
+            self._spread_action(npc, index, tick)
+
+        next_tick = self._next_event_tick(npc, tick, was_idle)
+        if next_tick > tick + 1 and npc.state == "Idle":
+            # Out of home until next_tick: marker events in between
+            self.away[index] = (next_tick, npc.is_out_of_home()[1])
+            next_tick = tick + 1
+        self._push(next_tick, index)
+
+    def _push(self, tick, index):
+        if tick < self.num_ticks:
+            heapq.heappush(self.queue, (tick, index))
+        else:
+            self.parked.append((tick, index))
+
+    def _next_event_tick(self, npc, tick, was_idle):
+        if npc.state == "Performing Action":
+            candidate = self.tick_at_or_after(npc.action_end)
+        elif was_idle and (out_until := npc.out_of_home_until()) is not None:
+            # Out of home and already logged: only markers until the stretch is over
+            candidate = self.tick_after(out_until)
+        else:
+            return tick + 1
+
+        # Toilet deadline, unless use_toilet is already waiting in the chain
+        if npc.actions["use_toilet"] not in npc.action_chain:
+            elapsed = (self.epoch_at(tick + 1) - npc.last_toilet) % 86400
+            toilet_tick = tick + 1 + (0 if elapsed >= 7200 else math.ceil((7200 - elapsed) / self.step_epoch))
+            candidate = min(candidate, toilet_tick)
+
+        return max(tick + 1, candidate)
+
+    def _spread_action(self, npc, index, tick):
+        """Add the resource usage of the action that just started to every interval it covers."""
+        action = npc.current_action
+        if not action.required_device:
+            return
+        house = self.house
+        usage_id = house.device_id_by_name(action.required_device)
+        if usage_id is None:
+            return
+        is_water = house.device_is_water[usage_id]
+        power_watts = float(house.device_power_watts[usage_id])
+        flow_rate_lpm = float(house.device_flow_lpm[usage_id])
+        heats_water = house.device_heats_water[usage_id]
+        device_key = house.device_keys[house.device_id(action.required_device, npc.current_room)]
+
+        action_start, action_end, step = npc.action_start, npc.action_end, self.step_epoch
+        while tick < self.num_ticks:
+            interval_start = self.start_epoch + tick * step
+            if interval_start >= action_end:
+                break
+            start_time = action_start if action_start > interval_start else interval_start
+            action_end_in_interval = action_end if action_end < interval_start + step else interval_start + step
+            active_time_seconds = action_end_in_interval - start_time if action_end_in_interval > start_time else 0
+
+            if active_time_seconds > 0:
+                if not is_water:
+                    energy_kwh = (power_watts * active_time_seconds / 3600) / 1000
+                    self.contributions.setdefault(tick, []).append((index, False, device_key, energy_kwh, None))
+                    house.total_electricity_used_kwh += energy_kwh
+
+                else:
+                    water_used_liters = flow_rate_lpm * (active_time_seconds / 60)
+                    heating_energy = water_used_liters * ENERGY_PER_LITER_HOT_WATER if heats_water else None
+                    self.contributions.setdefault(tick, []).append((index, True, device_key, water_used_liters, heating_energy))
+                    house.total_water_used_liters += water_used_liters
+                    if heats_water:
+                        house.total_electricity_used_kwh += heating_energy
+            tick += 1
+
+    def interval(self, tick):
+        """(electricity kWh, water liters, {"electricity": {...}, "water": {...}}) of one interval, summed in NPC order."""
+        interval_electricity = 0
+        interval_water = 0
+        interval_devices = {"electricity": {}, "water": {}}
+        for _, is_water, device_key, value, heating_energy in sorted(self.contributions.get(tick, ()), key=lambda entry: entry[0]):
+            if not is_water:
+                interval_electricity += value
+                interval_devices["electricity"][device_key] = interval_devices["electricity"].get(device_key, 0) + value
+            else:
+                interval_water += value
+                interval_devices["water"][device_key] = interval_devices["water"].get(device_key, 0) + value
+                if heating_energy is not None:
+                    interval_electricity += heating_energy
+        return interval_electricity, interval_water, interval_devices
+
+    def results(self):
+        """Return (electricity_consumption, water_consumption, device_usage) keyed by ISO timestamp."""
+        electricity_consumption = {}
+        water_consumption = {}
+        device_usage = {}
+        for tick in range(self.num_ticks):
+            timestamp = self.clock.isoformat(self.epoch_at(tick))
+            electricity_consumption[timestamp], water_consumption[timestamp], device_usage[timestamp] = self.interval(tick)
+        return electricity_consumption, water_consumption, device_usage
+
+    def iter_intervals(self):
+        """
+        Run the horizon one interval at a time, yielding (tick, electricity, water, devices) as soon as the interval is
+        final (every action starting before its end has been spread). Yielded intervals are dropped from memory, so
+        results() / columnar_results() cannot be used afterwards.
+        """
+        for tick in range(self.tick, self.num_ticks):
+            self.run_until(tick + 1)
+            yield (tick,) + self.interval(tick)
+            self.contributions.pop(tick, None)
+        self.finish()
+
+    def columnar_results(self):
+        """Same data as results() as a ColumnarResults (epoch time index, arrays, time x device matrix)."""
+        return ColumnarResults.from_intervals(self.start_time, self.step_seconds, (self.interval(tick) for tick in range(self.num_ticks)),
+                                              self.house.device_keys, self.house.device_is_water)
+
+    def checkpoint_state(self):
+        """
+        State of the run at the current tick boundary as plain data: house, NPCs (actions by ID, random streams),
+        event queue and the contributions of the intervals, both finished and already spread ahead.
+        """
+        return {
+            "tick": self.tick,
+            "num_ticks": self.num_ticks,
+            "queue": list(self.queue),
+            "parked": list(self.parked),
+            "away": [[index, next_tick, reason] for index, (next_tick, reason) in self.away.items()],
+            "last_needs_tick": list(self.last_needs_tick),
+            "visits": self.visits,
+            "contributions": {tick: list(entries) for tick, entries in self.contributions.items()},
+            "house": self.house.checkpoint_state(),
+            "npcs": [npc.checkpoint_state() for npc in self.npcs]
+        }
+
+    def restore_state(self, state):
+        """
+        Continue from checkpoint_state(). The horizon of this scheduler may be later than the one of the
+        checkpointed run (long horizons split in chunks): parked events are queued again and the actions cut by
+        the old horizon are spread over the new intervals.
+        """
+        if len(state["npcs"]) != len(self.npcs):
+            raise ValueError(f"Checkpoint has {len(state['npcs'])} NPCs, the config has {len(self.npcs)}.")
+        if state["tick"] > self.num_ticks:
+            raise ValueError(f"Checkpoint is at tick {state['tick']}, after the end of the simulation ({self.num_ticks} ticks).")
+        self.tick = state["tick"]
+        self.last_needs_tick = list(state["last_needs_tick"])
+        self.visits = state["visits"]
+        self.contributions = {tick: list(entries) for tick, entries in state["contributions"].items()}
+        self.house.restore_state(state["house"])
+        for npc, npc_state in zip(self.npcs, state["npcs"]):
+            npc.restore_state(npc_state)
+
+        self.queue = list(state["queue"])
+        heapq.heapify(self.queue)
+        self.parked = list(state["parked"])
+        self.away = {index: (next_tick, reason) for index, next_tick, reason in state.get("away", [])}
+        self._unpark()
+
+        old_num_ticks = state["num_ticks"]
+        if self.num_ticks > old_num_ticks:
+            horizon = self.epoch_at(old_num_ticks)
+            for index, npc in enumerate(self.npcs):
+                if npc.state == "Performing Action" and npc.action_end > horizon:
+                    self._spread_action(npc, index, old_num_ticks)
+
+def create_npcs(config_data, house, simulation_time, catalog, action_log, seed=None):
+    """NPCs of the config for a fast-forward run starting at simulation_time, each with its own random stream."""
+    streams = spawn_streams(seed, len(config_data['basic_parameters']['npc']))
+    npcs = [NPC(name=npc["name"], out_of_home_periods=npc.get("out_of_home_periods", []), house=house, age_group=npc["age_group"], rng=stream, catalog=catalog)
+            for npc, stream in zip(config_data['basic_parameters']['npc'], streams)]
+    for npc in npcs:
+        npc.time = simulation_time
+        npc.last_toilet_time = simulation_time
+        npc.action_log = action_log
+    return npcs
+
+
+def run_simulation(config_data, output_path="results/user_data.json", update_interval=300, actions_in_minutes_flag=True, start_date=None, end_date=None, engine="event", seed=None, columnar=False, checkpoint_path=None, checkpoint_every_days=7, resume_from=None):
+    """
+    Fast-forward simulation of the house described by config_data.
+
+    engine selects how the NPCs are stepped: "event" (EventScheduler over NPC objects, default) or "population"
+    (npc_population.NPCPopulation, NumPy arrays for all the NPCs, meant for hundreds or thousands of occupants).
+    seed (int or numpy SeedSequence) gives every NPC its own reproducible random stream; both engines consume the
+    streams the same way and give the same series and action log (benchmark.py --check-engines). The same config +
+    seed always gives the same results. None draws fresh entropy.
+    The NPCs share one ActionCatalog: the config's top-level "actions" list if present (DEFAULT_ACTIONS format),
+    otherwise the default catalog.
+    With checkpoint_path (event engine) the full state of the run is saved every checkpoint_every_days simulated
+    days and at the end. resume_from continues such a checkpoint exactly, also with a later end date (long horizons
+    split in chunks); the seed is ignored then, the random streams come from the checkpoint.
+    Returns (electricity_consumption, water_consumption, device_usage) keyed by ISO timestamp, or a
+    columnar_results.ColumnarResults with the same data as arrays when columnar is True.
+    """
     global update_each_seconds, actions_in_minutes
     update_each_seconds = update_interval
     actions_in_minutes = actions_in_minutes_flag
@@ -639,20 +1568,39 @@ def run_simulation(config_data, output_path="results/user_data.json", update_int
     sim_start_date = start_date if start_date else config_start_date
     sim_end_date = end_date if end_date else config_end_date
 
-    # Initialize house
-    temp, humidi = getTempHomemade.get_temp_hum()
+    # Initialize house, with the climate of the TMY series at the start of the run
+    simulation_time = datetime.strptime(sim_start_date + " 00:00:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone(timedelta(hours=1)))
+    end_time = datetime.strptime(sim_end_date + " 00:00:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone(timedelta(hours=1)))
+    climate = getTempHomemade.get_tmy_series()
+    temp, humidi = climate.at(simulation_time)
     now = datetime.now()
-    house = House(config_data, temperature=temp, humidity=humidi, month=now.month, year=now.year)
-
-    create_json_reg(house_name=config_data["basic_parameters"]["name"], FILEPATH=output_path, typeOfSimulation=type_of_simulation,
-                    start_date=sim_start_date if type_of_simulation == "fast_forward" else None,
-                    end_date=sim_end_date if type_of_simulation == "fast_forward" else None)
+    house = House(config_data, temperature=temp, humidity=humidi, month=now.month, year=now.year, climate=climate)
+
+    snapshot = None
+    if resume_from:
+        if engine != "event":
+            raise ValueError("Checkpoints are only supported by the event engine.")
+        snapshot = load_checkpoint(resume_from)
+        if snapshot["house_name"] != house.name or snapshot["start_date"] != sim_start_date:
+            raise ValueError(f"Checkpoint {resume_from} is for '{snapshot['house_name']}' from {snapshot['start_date']}, "
+                             f"not '{house.name}' from {sim_start_date}.")
+        # Continue the action log where the checkpoint left it
+        action_log = ActionLogWriter.from_checkpoint(snapshot["action_log"], FILEPATH=output_path)
+        action_log.header["end_date"] = sim_end_date
+    else:
+        action_log = ActionLogWriter(house_name=config_data["basic_parameters"]["name"], FILEPATH=output_path, typeOfSimulation=type_of_simulation,
+                                     start_date=sim_start_date if type_of_simulation == "fast_forward" else None,
+                                     end_date=sim_end_date if type_of_simulation == "fast_forward" else None)
+    if checkpoint_path and engine != "event":
+        raise ValueError("Checkpoints are only supported by the event engine.")
+    last_checkpoint = resume_from
 
 
 
-    # Initialize NPCs
-    npcs = [NPC(name=npc["name"], out_of_home_periods=npc.get("out_of_home_periods", []), house=house, age_group=npc["age_group"], simulation_type="fast_forward") 
-        for npc in config_data['basic_parameters']['npc']]
+    # NPC definitions (the NPCs themselves are created with their random streams below)
+    npcs = config_data['basic_parameters']['npc']
+    # Actions shared by all the NPCs (the config's "actions" list, if any)
+    catalog = ActionCatalog.from_config(config_data)
 
 
     # Initial output (unchanged)
@@ -664,85 +1612,48 @@ def run_simulation(config_data, output_path="results/user_data.json", update_int
     print(f"Actions in minutes: {actions_in_minutes_flag}")
     print("-" * 50)
     for npc in npcs:
-        print(f"\033[94mName of NPC: {npc.name}\033[0m")
-        print(f"\033[94mAge group: {npc.age_group}\033[0m")
+        print(f"\033[94mName of NPC: {npc['name']}\033[0m")
+        print(f"\033[94mAge group: {npc['age_group']}\033[0m")
     print("-" * 50)
 
     # Simulation loop
     try:
         
-        simulation_time = datetime.strptime(sim_start_date + " 00:00:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone(timedelta(hours=1)))
-        end_time = datetime.strptime(sim_end_date + " 00:00:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone(timedelta(hours=1)))
         print(f"Simulating from {simulation_time.isoformat()} to {end_time.isoformat()}")
 
-        electricity_consumption = {}
-        water_consumption = {}
-        device_usage = {}
-
-        npcs = [NPC(name=npc["name"], out_of_home_periods=npc.get("out_of_home_periods", []), house=house, age_group=npc["age_group"]) 
-                for npc in config_data['basic_parameters']['npc']]
-        for npc in npcs:
-            npc.time = simulation_time
-            npc.last_toilet_time = simulation_time
-
-        iteration_count = 0
-        while simulation_time < end_time:
-            interval_start = simulation_time
-            timestamp = simulation_time.isoformat()
-            #print(f"Iteration {iteration_count}: Simulating at {timestamp}")
-            
-            interval_electricity = 0
-            interval_water = 0
-            interval_devices = {"electricity": {}, "water": {}}
-            try:
-                for npc in npcs:
-                    npc.time = interval_start
-                    npc.decide_and_act()
-                    #print(f"[{npc.time.isoformat()}] {npc.name} state: {npc.state}, action: {npc.current_action.name if npc.current_action else 'None'}")
-                    if npc.state == "Performing Action":
-                        start_time = max(npc.action_start_time, interval_start)
-                        action_end_in_interval = min(simulation_time + timedelta(minutes=5), npc.action_end_time)
-                        active_time_seconds = (action_end_in_interval - start_time).total_seconds() if action_end_in_interval > start_time else 0
-                        #print(f"  Action {npc.current_action.name}: {start_time.isoformat()} to {action_end_in_interval.isoformat()}, active for {active_time_seconds}s")
-
-                        if active_time_seconds > 0 and npc.current_action.required_device:
-                            device_info = house.get_device_by_name(npc.current_action.required_device)
-                            if device_info:
-                                device_type = device_info["type"]
-                                device = device_info["device"]
-                                device_key = f"{npc.current_room}_{npc.current_action.required_device}"
-
-                                if device_type == "electricity":
-                                    power_watts = device.get("power_watts", 0)
-                                    energy_kwh = (power_watts * active_time_seconds / 3600) / 1000
-                                    interval_electricity += energy_kwh
-                                    interval_devices["electricity"][device_key] = interval_devices["electricity"].get(device_key, 0) + energy_kwh
-                                    house.total_electricity_used_kwh += energy_kwh
-                                    #print(f"  Electricity: {energy_kwh} kWh")
-
-                                elif device_type == "water":
-                                    flow_rate_lpm = device.get("flow_rate_liters_per_minute", 0)
-                                    water_used_liters = flow_rate_lpm * (active_time_seconds / 60)
-                                    interval_water += water_used_liters
-                                    interval_devices["water"][device_key] = interval_devices["water"].get(device_key, 0) + water_used_liters
-                                    house.total_water_used_liters += water_used_liters
-                                    #print(f"  Water: {water_used_liters} L")
-                                    if device["device"] in ["shower", "sink"] and house.water_heating["method"] == "electricity":
-                                        heating_energy = water_used_liters * ENERGY_PER_LITER_HOT_WATER
-                                        interval_electricity += heating_energy
-                                        house.total_electricity_used_kwh += heating_energy
-                                        #print(f"  Heating: {heating_energy} kWh")
-
-                electricity_consumption[timestamp] = interval_electricity
-                water_consumption[timestamp] = interval_water
-                device_usage[timestamp] = interval_devices
-            except Exception as e:
-                print(f"Error in iteration {iteration_count}: {e}")
-                raise
-            
-            simulation_time += timedelta(minutes=5)
-            #print(f"Next simulation_time: {simulation_time.isoformat()} < {end_time.isoformat()} = {simulation_time < end_time}")
-            iteration_count += 1
+        if engine == "population":
+            # Imported here, npc_population builds on this module
+            from npc_population import NPCPopulation
+            population = NPCPopulation.from_config(config_data, house, simulation_time, seed=seed, action_log=action_log, catalog=catalog)
+            results = population.run(end_time, columnar=columnar)
+        else:
+            npcs = create_npcs(config_data, house, simulation_time, catalog, action_log, seed=seed)
+
+            # Jump between NPC events instead of polling everyone every 5 minutes
+            scheduler = EventScheduler(house, npcs, simulation_time, end_time, step=timedelta(minutes=5))
+            if snapshot:
+                scheduler.restore_state(snapshot["scheduler"])
+                print(f"Resumed from {resume_from} at {scheduler.time_at(scheduler.tick).isoformat()}")
+
+            if checkpoint_path:
+                ticks_per_checkpoint = max(1, round(checkpoint_every_days * 86400 / scheduler.step_seconds))
+                while True:
+                    scheduler.run_until(scheduler.tick + ticks_per_checkpoint)
+                    last_checkpoint = save_checkpoint(checkpoint_path, {
+                        "house_name": house.name,
+                        "start_date": sim_start_date,
+                        "end_date": sim_end_date,
+                        "scheduler": scheduler.checkpoint_state(),
+                        "action_log": action_log.checkpoint_state()
+                    })
+                    print(f"Checkpoint saved at {scheduler.time_at(scheduler.tick).isoformat()}: {checkpoint_path}")
+                    if scheduler.tick >= scheduler.num_ticks:
+                        break
+            else:
+                scheduler.run_until(scheduler.num_ticks)
+            scheduler.finish()
+            results = scheduler.columnar_results() if columnar else scheduler.results()
+        action_log.close()
 
         print("-" * 50)
         print("Simulation completed.")
@@ -759,14 +1670,71 @@ def run_simulation(config_data, output_path="results/user_data.json", update_int
         """
         
 
-        return electricity_consumption, water_consumption, device_usage
+        return results
 
     except KeyboardInterrupt:
+        action_log.close()
         print("Simulation stopped by user.")
+        if last_checkpoint:
+            print(f"Resume with resume_from=\"{last_checkpoint}\".")
         print(f"Total electricity used: {house.total_electricity_used_kwh:.2f} kWh")
         print(f"Total water used: {house.total_water_used_liters:.2f} liters")
 
 
+def run_simulation_iter(config_data, output_path="results/user_data.json", update_interval=300, actions_in_minutes_flag=True, start_date=None, end_date=None, engine="event", seed=None):
+    """
+    Streaming version of run_simulation: a generator yielding one record per 5-minute interval as soon as it is final,
+    {"timestamp": ISO string, "electricity": kWh, "water": liters, "devices": {"electricity": {...}, "water": {...}}},
+    with the same values as run_simulation for the same config, engine and seed. Nothing is kept per interval, so
+    memory stays flat whatever the horizon. The action log is closed when the generator is exhausted or closed.
+    """
+    global update_each_seconds, actions_in_minutes
+    update_each_seconds = update_interval
+    actions_in_minutes = actions_in_minutes_flag
+
+    type_of_simulation = config_data['basic_parameters']['type_of_simulation']["type"]
+    sim_start_date = start_date if start_date else config_data['basic_parameters']['type_of_simulation'].get("start_date")
+    sim_end_date = end_date if end_date else config_data['basic_parameters']['type_of_simulation'].get("end_date")
+    simulation_time = datetime.strptime(sim_start_date + " 00:00:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone(timedelta(hours=1)))
+    end_time = datetime.strptime(sim_end_date + " 00:00:00", "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone(timedelta(hours=1)))
+
+    climate = getTempHomemade.get_tmy_series()
+    temp, humidi = climate.at(simulation_time)
+    now = datetime.now()
+    house = House(config_data, temperature=temp, humidity=humidi, month=now.month, year=now.year, climate=climate)
+    catalog = ActionCatalog.from_config(config_data)
+    action_log = ActionLogWriter(house_name=config_data["basic_parameters"]["name"], FILEPATH=output_path, typeOfSimulation=type_of_simulation,
+                                 start_date=sim_start_date, end_date=sim_end_date)
+    print(f"Streaming simulation of {house.name} from {simulation_time.isoformat()} to {end_time.isoformat()}")
+
+    try:
+        if engine == "population":
+            # Imported here, npc_population builds on this module
+            from npc_population import NPCPopulation
+            population = NPCPopulation.from_config(config_data, house, simulation_time, seed=seed, action_log=action_log, catalog=catalog)
+            intervals = population.iter_intervals(end_time)
+            time_at = lambda tick: population.time_at(tick * population.step_seconds)
+        else:
+            npcs = create_npcs(config_data, house, simulation_time, catalog, action_log, seed=seed)
+            scheduler = EventScheduler(house, npcs, simulation_time, end_time, step=timedelta(minutes=5))
+            intervals = scheduler.iter_intervals()
+            time_at = scheduler.time_at
+
+        for tick, interval_electricity, interval_water, interval_devices in intervals:
+            yield {
+                "timestamp": time_at(tick).isoformat(),
+                "electricity": interval_electricity,
+                "water": interval_water,
+                "devices": interval_devices
+            }
+
+        print("Simulation completed.")
+        print(f"Total electricity used: {house.total_electricity_used_kwh:.2f} kWh")
+        print(f"Total water used: {house.total_water_used_liters:.2f} liters")
+    finally:
+        action_log.close()
+
+
 def run_simulation_realtime(config_data, output_path="results/user_data.json"):
     # Initialize house with current temperature, humidity, and time
     temp, humidi = getTempHomemade.get_temp_hum()
@@ -780,12 +1748,14 @@ def run_simulation_realtime(config_data, output_path="results/user_data.json"):
                     start_date=None, 
                     end_date=None)
     
-    # Initialize NPCs
+    # Initialize NPCs, all sharing one action catalog
+    catalog = ActionCatalog.from_config(config_data)
     npcs = [NPC(name=npc["name"], 
                 out_of_home_periods=npc.get("out_of_home_periods", []), 
                 house=house, 
                 age_group=npc["age_group"], 
-                simulation_type="realtime") 
+                simulation_type="realtime",
+                catalog=catalog) 
             for npc in config_data['basic_parameters']['npc']]
 
     # Define baseline electricity consumption per 5-minute interval
@@ -827,6 +1797,146 @@ def run_simulation_realtime(config_data, output_path="results/user_data.json"):
     print(f"Total water used: {house.total_water_used_liters:.2f} liters")
     return house.total_electricity_used_kwh, house.total_water_used_liters, device_usage
 
+
+class RealtimeEngine:
+    """
+    Long-lived real-time simulation.
+
+    run_simulation_realtime builds the house and the NPCs again on every call, so needs are re-randomized and the
+    actions in progress are forgotten. The engine builds them once and every tick() only moves them to the current
+    time: the resource usage of the actions in progress is accounted for the part of the elapsed interval they cover
+    (like the fast-forward engines do), the needs decay for the ticks that were skipped and every NPC decides and acts
+    once. Climate and air quality are read again only every climate_refresh_seconds and the action log is appended to on every
+    tick and compacted into output_path every compact_every_ticks ticks (and on close()).
+
+    Args:
+        config_data (dict): House configuration.
+        output_path (str): Action log of the house (default: "results/user_data.json").
+        seed (int or numpy SeedSequence): Seed of the NPC random streams.
+        step_seconds (int): Nominal time between ticks, used for the baseline consumption and skipped ticks (default: 300).
+        climate_refresh_seconds (float): Minimum time between two readings of the TMY series and the air quality (default: 3600).
+        compact_every_ticks (int): Ticks between two rewrites of output_path (default: 12, one hour).
+    """
+
+    def __init__(self, config_data, output_path="results/user_data.json", seed=None, step_seconds=300, climate_refresh_seconds=3600, compact_every_ticks=12):
+        self.step_seconds = step_seconds
+        self.climate_refresh_seconds = climate_refresh_seconds
+        self.compact_every_ticks = compact_every_ticks
+
+        climate = getTempHomemade.get_tmy_series()
+        temp, humidi = climate.at(time.time())
+        self.air_quality, self.air_quality_description = getTempHomemade.get_aq()
+        now = datetime.now()
+        self.climate_time = time.monotonic()
+        self.house = House(config_data, temperature=temp, humidity=humidi, month=now.month, year=now.year, climate=climate)
+        self.catalog = ActionCatalog.from_config(config_data)
+        self.action_log = ActionLogWriter(house_name=config_data["basic_parameters"]["name"], FILEPATH=output_path, typeOfSimulation="realtime")
+
+        streams = spawn_streams(seed, len(config_data['basic_parameters']['npc']))
+        self.npcs = [NPC(name=npc["name"],
+                         out_of_home_periods=npc.get("out_of_home_periods", []),
+                         house=self.house,
+                         age_group=npc["age_group"],
+                         simulation_type="realtime",
+                         rng=stream,
+                         catalog=self.catalog)
+                     for npc, stream in zip(config_data['basic_parameters']['npc'], streams)]
+        for npc in self.npcs:
+            npc.action_log = self.action_log
+
+        self.last_tick_time = None
+        self.ticks = 0
+        self.total_electricity_used_kwh = 0.0
+        self.total_water_used_liters = 0.0
+
+    def refresh_climate(self, now=None, force=False):
+        """
+        Temperature and humidity of the hour of `now` (a lookup in the TMY series of the house); the series and the air
+        quality are read again if the last reading is older than climate_refresh_seconds.
+        """
+        if force or time.monotonic() - self.climate_time >= self.climate_refresh_seconds:
+            self.house.climate = getTempHomemade.get_tmy_series()
+            self.air_quality, self.air_quality_description = getTempHomemade.get_aq()
+            self.climate_time = time.monotonic()
+        if now is not None:
+            self.house.temperature, self.house.humidity = self.house.climate.at(now)
+
+    def _account_actions(self, interval_start, interval_end, device_usage):
+        """Add the usage of the actions in progress during [interval_start, interval_end] (epoch seconds) to device_usage, in NPC order."""
+        house = self.house
+        interval_electricity = 0
+        interval_water = 0
+        for npc in self.npcs:
+            action = npc.current_action
+            if npc.state != "Performing Action" or action is None or not action.required_device:
+                continue
+            usage_id = house.device_id_by_name(action.required_device)
+            if usage_id is None:
+                continue
+            active_time_seconds = min(npc.action_end, interval_end) - max(npc.action_start, interval_start)
+            if active_time_seconds <= 0:
+                continue
+
+            device_key = house.device_keys[house.device_id(action.required_device, npc.current_room)]
+            if not house.device_is_water[usage_id]:
+                energy_kwh = (float(house.device_power_watts[usage_id]) * active_time_seconds / 3600) / 1000
+                interval_electricity += energy_kwh
+                device_usage["electricity"][device_key] = device_usage["electricity"].get(device_key, 0) + energy_kwh
+            else:
+                water_used_liters = float(house.device_flow_lpm[usage_id]) * (active_time_seconds / 60)
+                interval_water += water_used_liters
+                device_usage["water"][device_key] = device_usage["water"].get(device_key, 0) + water_used_liters
+                if house.device_heats_water[usage_id]:
+                    interval_electricity += water_used_liters * ENERGY_PER_LITER_HOT_WATER
+        return interval_electricity, interval_water
+
+    def tick(self, now=None):
+        """
+        Advance the simulation to `now` (aware datetime, default: the current local time).
+
+        Returns:
+            tuple: (electricity kWh, water liters, {"electricity": {...}, "water": {...}}) used since the previous tick,
+            baseline included, in the format of run_simulation_realtime. The first tick only has the baseline.
+        """
+        if now is None:
+            now = datetime.now().astimezone()
+        previous = self.last_tick_time
+        if previous is not None and now <= previous:
+            raise ValueError(f"Tick at {now.isoformat()} is not after the previous tick ({previous.isoformat()}).")
+        elapsed_seconds = self.step_seconds if previous is None else (now - previous).total_seconds()
+        self.refresh_climate(now)
+
+        # Consumption of the interval since the previous tick: baseline plus the actions in progress
+        baseline_kwh = BASELINE_ELECTRICITY_KWH_PER_5MIN * elapsed_seconds / 300
+        device_usage = {"electricity": {"always_on": baseline_kwh}, "water": {}}
+        electricity, water = baseline_kwh, 0.0
+        if previous is not None:
+            actions_electricity, water = self._account_actions(to_epoch(previous), to_epoch(now), device_usage)
+            electricity += actions_electricity
+
+        # Move the NPCs to now: decay for the skipped ticks, then one regular tick
+        skipped_ticks = max(1, round(elapsed_seconds / self.step_seconds)) - 1
+        for npc in self.npcs:
+            if previous is None:
+                npc.last_toilet_time = now
+            npc.decay_needs(skipped_ticks)
+            npc.time = now
+            npc.decide_and_act()
+
+        self.last_tick_time = now
+        self.ticks += 1
+        self.total_electricity_used_kwh += electricity
+        self.total_water_used_liters += water
+
+        self.action_log.flush()
+        if self.compact_every_ticks and self.ticks % self.compact_every_ticks == 0:
+            self.action_log.compact()
+        return electricity, water, device_usage
+
+    def close(self):
+        """Write the compacted action log. Returns its path."""
+        return self.action_log.close()
+
         
 
 if __name__ == "__main__":
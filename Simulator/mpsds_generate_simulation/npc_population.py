@@ -0,0 +1,344 @@
+"""
+#########################################################################################################################################################
+
+Struct-of-arrays NPC engine for large households (apartment blocks, neighbourhoods...).
+
+The NPC class keeps its needs in a dict and is updated one object at a time. NPCPopulation keeps hunger, energy, hygiene,
+fun, state, current action ID and action start/end for every occupant in NumPy arrays, so the need decay, the temperature
+penalty and the threshold branches of NPC.decide_next_action run as vectorized masks once per 5-minute tick. Only the
+NPCs that actually change something in a tick (finish an action or try to start one) go through a short loop in NPC
+order, which keeps the device contention identical to the NPC class. With the same config and seed, run_simulation
+gives the same series and the same action log (finished actions, and the out-of-home marker of every NPC at every tick
+of its stretches) with engine="population" as with the default event engine; benchmark.py --check-engines compares
+them over several weeks.
+
+#########################################################################################################################################################
+"""
+
+from datetime import timedelta
+
+import numpy as np
+
+from npc import NEED_NAMES, OutOfHomeSchedule, ENERGY_PER_LITER_HOT_WATER, default_catalog
+from random_streams import BlockStreams
+from columnar_results import ColumnarResults
+from sim_clock import to_epoch
+
+
+IDLE = 0
+PERFORMING = 1
+
+NEEDS = list(NEED_NAMES)
+HUNGER, ENERGY, HYGIENE, FUN = range(4)
+
+
+class NPCPopulation:
+    """
+    All the NPCs of a house as arrays. Behaves like a list of NPC objects driven by the polling loop of run_simulation.
+
+    Args:
+        house (House): House shared by all the occupants (devices, temperature, totals).
+        names (list): Name of every NPC.
+        age_groups (list): Age group of every NPC.
+        out_of_home_periods (list): out_of_home_periods of every NPC (same format as the config).
+        start_time (datetime): Time of tick 0.
+        seed (int or np.random.SeedSequence): Run seed, spawned into one random stream per NPC exactly like run_simulation
+            does for the NPC class, so both engines make the same draws for the same seed.
+        initial_needs (np.ndarray): Optional (N, 4) array of hunger, energy, hygiene, fun. Drawn from the streams if None.
+        action_log (ActionLogWriter): Optional writer for the finished / out-of-home actions.
+        catalog (ActionCatalog): Actions of the NPCs (default: the shared default catalog).
+    """
+
+    def __init__(self, house, names, age_groups, out_of_home_periods, start_time, seed=None, initial_needs=None, action_log=None, step=timedelta(minutes=5), catalog=None):
+        self.house = house
+        self.names = list(names)
+        self.size = len(self.names)
+        self.start_time = start_time
+        self.step = step
+        self.step_seconds = int(step.total_seconds())
+        self.start_epoch = to_epoch(start_time)
+        self.streams = BlockStreams(seed, self.size)
+        self.action_log = action_log
+        self.catalog = catalog if catalog is not None else default_catalog()
+        self._setup_actions()
+
+        # Needs and preferred temperature
+        if initial_needs is None:
+            # Same draws as NPC.__init__: randint(0, 100) for each need, in order
+            everyone = np.arange(self.size)
+            initial_needs = np.column_stack([(self.streams.draw(everyone) * 101).astype(np.int64) for _ in NEEDS])
+        self.needs = np.asarray(initial_needs, dtype=float).reshape(self.size, len(NEEDS)).copy()
+        self.preferred_temperature = np.full(self.size, 22)
+
+        # Action state, times in seconds since start_time
+        self.state = np.full(self.size, IDLE, dtype=np.int8)
+        self.action_id = np.full(self.size, -1, dtype=np.int16)
+        self.action_start = np.zeros(self.size, dtype=np.int64)
+        self.action_end = np.zeros(self.size, dtype=np.int64)
+        self.last_toilet = np.zeros(self.size, dtype=np.int64)
+        self.chains = [[] for _ in range(self.size)]
+        self.chain_len = np.zeros(self.size, dtype=np.int64)
+        self.toilet_in_chain = np.zeros(self.size, dtype=bool)
+
+        # Age groups and compiled out-of-home schedules
+        groups = sorted(set(age_groups))
+        self.age_index = np.array([groups.index(group) for group in age_groups], dtype=np.int64)
+        self.allowed = np.array([[group in action.allowed_age_groups for action in self.action_list] for group in groups], dtype=bool).reshape(len(groups), len(self.action_list))
+        schedules = [OutOfHomeSchedule(periods) for periods in out_of_home_periods]
+        self.reasons = [schedule.reasons for schedule in schedules]
+        self.out_of_home_table = np.array([schedule.second0_period for schedule in schedules], dtype=np.int16).reshape(self.size, OutOfHomeSchedule.MINUTES_PER_DAY)
+        self.start_second_of_day = start_time.hour * 3600 + start_time.minute * 60 + start_time.second
+
+    @classmethod
+    def from_config(cls, config_data, house, start_time, seed=None, action_log=None, copies=1, catalog=None):
+        """Build the population of a config file, optionally repeating its NPC list `copies` times."""
+        npcs = config_data["basic_parameters"]["npc"] * copies
+        names = [npc["name"] if copies == 1 else f"{npc['name']} {index // len(config_data['basic_parameters']['npc'])}"
+                 for index, npc in enumerate(npcs)]
+        return cls(house=house,
+                   names=names,
+                   age_groups=[npc["age_group"] for npc in npcs],
+                   out_of_home_periods=[npc.get("out_of_home_periods", []) for npc in npcs],
+                   start_time=start_time,
+                   seed=seed,
+                   action_log=action_log,
+                   catalog=catalog)
+
+    def _setup_actions(self):
+        """Turn the action catalog into per-action arrays indexed by action ID."""
+        self.action_list = list(self.catalog)
+        self.action_ids = {action.name: action.action_id for action in self.action_list}
+        house = self.house
+
+        self.action_duration = np.array([action.duration for action in self.action_list], dtype=np.int64)
+        self.action_need_changes = self.catalog.need_matrix
+        self.action_requires_device = np.array([bool(action.required_device) for action in self.action_list], dtype=bool)
+
+        # Device in the action's room (the one that gets locked) and device used for the consumption (first one with that name)
+        self.action_room_device = np.array([house.device_id(action.required_device, action.location) if action.required_device and house.device_id(action.required_device, action.location) is not None else -1
+                                            for action in self.action_list], dtype=np.int64)
+        self.action_usage_device = np.array([house.device_id_by_name(action.required_device) if action.required_device and house.device_id_by_name(action.required_device) is not None else -1
+                                             for action in self.action_list], dtype=np.int64)
+
+        ids = self.action_ids
+        self.cook_chain = [action.action_id for action in self.catalog.chain("cook")]
+
+        self.TOILET = ids["use_toilet"]
+        self.NAP = ids["nap_sleep"]
+        self.SHOWER = ids["shower"]
+        self.low_fun_options = np.array([ids["watch_tv"], ids["play_games"]])
+        self.high_energy_options = np.array([ids["go_for_jog"], ids["go_to_gym"]])
+        self.high_fun_options = np.array([ids["clean_house"], ids["study"], ids["overthink"]])
+        self.idle_options = np.array([ids["call_friend"], ids["read_book"], ids["go_shopping"]])
+
+    def time_at(self, seconds):
+        return self.start_time + timedelta(seconds=int(seconds))
+
+    def update_needs(self, now):
+        """Vectorized NPC.update_needs for every NPC at `now` (seconds since start)."""
+        needs = self.needs
+        needs[:, HUNGER] = np.minimum(100, needs[:, HUNGER] + 0.5)
+        needs[:, ENERGY] = np.maximum(0, needs[:, ENERGY] - 0.3)
+        needs[:, HYGIENE] = np.maximum(0, needs[:, HYGIENE] - 0.7)
+        needs[:, FUN] = np.maximum(0, needs[:, FUN] - 0.4)
+
+        # Adjust needs based on house temperature
+        temp_diff = np.abs(int(self.house.temperature) - self.preferred_temperature)
+        penalty = np.where(temp_diff > 5, temp_diff // 5, 0)
+        if penalty.any():
+            needs[:, ENERGY] = np.maximum(0, needs[:, ENERGY] - penalty)
+            needs[:, FUN] = np.maximum(0, needs[:, FUN] - penalty)
+
+        # Toilet need every 2 hours
+        toilet = ((now - self.last_toilet) % 86400 >= 7200) & ~self.toilet_in_chain
+        for index in np.flatnonzero(toilet):
+            self.chains[index].append(self.TOILET)
+        self.chain_len[toilet] += 1
+        self.toilet_in_chain[toilet] = True
+        self.last_toilet[toilet] = now
+
+    def decide(self, deciding):
+        """
+        Vectorized NPC.decide_next_action for the NPCs in `deciding` (sorted indexes, none of them out of home).
+        Returns the chosen action ID per NPC.
+        """
+        needs = self.needs[deciding]
+        has_chain = self.chain_len[deciding] > 0
+        hunger, energy, hygiene, fun = needs[:, HUNGER], needs[:, ENERGY], needs[:, HYGIENE], needs[:, FUN]
+
+        # Branch per NPC, in the order of the if's of NPC.decide_next_action
+        conditions = [has_chain, energy < 20, hunger > 85, hygiene < 30, fun < 30, energy > 80, fun > 70]
+        branch = np.select(conditions, range(len(conditions)), default=len(conditions))
+        fixed = [-1, self.NAP, self.cook_chain[0], self.SHOWER]
+        decision = np.array(fixed, dtype=np.int64)[np.minimum(branch, len(fixed) - 1)]
+
+        # Only the random branches consume a draw of the NPC's stream, like random choice() in the NPC class
+        random_options = [self.low_fun_options, self.high_energy_options, self.high_fun_options, self.idle_options]
+        for offset, options in enumerate(random_options):
+            positions = np.flatnonzero(branch == len(fixed) + offset)
+            if len(positions):
+                draws = self.streams.draw(deciding[positions])
+                decision[positions] = options[(draws * len(options)).astype(np.int64)]
+
+        # Chains live in small per-NPC lists
+        for position in np.flatnonzero(has_chain):
+            index = deciding[position]
+            decision[position] = self.chains[index].pop(0)
+            self._chain_changed(index)
+        for position in np.flatnonzero(~has_chain & (decision == self.cook_chain[0])):
+            index = deciding[position]
+            self.chains[index] = list(self.cook_chain[1:])
+            self._chain_changed(index)
+        return decision
+
+    def _chain_changed(self, index):
+        self.chain_len[index] = len(self.chains[index])
+        self.toilet_in_chain[index] = self.TOILET in self.chains[index]
+
+    def perform(self, index, action_id, now):
+        """NPC.perform_action: start the action unless the age group or the device does not allow it."""
+        if not self.allowed[self.age_index[index], action_id]:
+            return False
+        device_id = self.action_room_device[action_id]
+        if self.action_requires_device[action_id]:
+            if device_id < 0 or self.house.device_in_use[device_id]:
+                return False
+            self.house.acquire_device(device_id, self.names[index])
+        self.state[index] = PERFORMING
+        self.action_id[index] = action_id
+        self.action_start[index] = now
+        self.action_end[index] = now + self.action_duration[action_id]
+        return True
+
+    def finish(self, index, now):
+        """Resource accounting, device release and logging of NPC.finish_action (needs are updated vectorized)."""
+        house = self.house
+        action_id = self.action_id[index]
+        action = self.action_list[action_id]
+        energy_kwh = 0
+        water_used_liters = 0
+
+        usage_id = self.action_usage_device[action_id]
+        if usage_id >= 0:
+            if not house.device_is_water[usage_id]:
+                energy_kwh = (float(house.device_power_watts[usage_id]) * (action.duration / 3600)) / 1000
+                house.total_electricity_used_kwh += energy_kwh
+                device_key = house.device_keys[self.action_room_device[action_id]]
+                if device_key in house.device_electricity_usage:
+                    house.device_electricity_usage[device_key] += energy_kwh
+            else:
+                water_used_liters = float(house.device_flow_lpm[usage_id]) * (action.duration / 60)
+                house.total_water_used_liters += water_used_liters
+                if house.device_heats_water[usage_id]:
+                    energy_kwh = water_used_liters * ENERGY_PER_LITER_HOT_WATER
+                    house.total_electricity_used_kwh += energy_kwh
+            house.release_device(self.action_room_device[action_id])
+
+        if self.action_log is not None:
+            self.action_log.add_action(NPCtime=self.time_at(now), action=action.name, device_used=action.required_device or "NAN",
+                                       energy_used=energy_kwh, water_used=water_used_liters, duration=action.duration, npc_name=self.names[index])
+
+        self.state[index] = IDLE
+        self.action_id[index] = -1
+
+    def step_tick(self, tick):
+        """
+        Advance every NPC through tick `tick` and return the consumption of the interval that starts there:
+        (electricity_kwh, water_liters, {"electricity": {...}, "water": {...}}).
+        """
+        now = tick * self.step_seconds
+        if self.house.climate is not None:
+            # Temperature and humidity of the hour of the tick
+            self.house.temperature, self.house.humidity = self.house.climate.at(self.start_epoch + now)
+        self.update_needs(now)
+
+        # Actions that are over: need changes in one vector add
+        finished = (self.state == PERFORMING) & (now >= self.action_end)
+        if finished.any():
+            changes = self.action_need_changes[self.action_id[finished]]
+            self.needs[finished] = np.clip(self.needs[finished] + changes, 0, 100)
+
+        # Everyone idle or just done decides, out-of-home NPCs only log (and only if they were already idle)
+        deciding = np.flatnonzero((self.state == IDLE) | finished)
+        if len(deciding):
+            minute = ((self.start_second_of_day + now) // 60) % OutOfHomeSchedule.MINUTES_PER_DAY
+            out_period = self.out_of_home_table[deciding, minute]
+            at_home = out_period < 0
+            decision = np.full(len(deciding), -1, dtype=np.int64)
+            if at_home.any():
+                decision[at_home] = self.decide(deciding[at_home])
+
+            # Devices are taken and released in NPC order, like the polling loop does
+            for position, index in enumerate(deciding):
+                if finished[index]:
+                    self.finish(index, now)
+                if at_home[position]:
+                    self.perform(index, decision[position], now)
+                elif not finished[index] and self.action_log is not None:
+                    self.action_log.add_action(NPCtime=self.time_at(now), action=self.reasons[index][out_period[position]], npc_name=self.names[index])
+
+        return self._interval_consumption(now)
+
+    def _interval_consumption(self, now):
+        house = self.house
+        performing = np.flatnonzero(self.state == PERFORMING)
+        action_ids = self.action_id[performing]
+        usage = self.action_usage_device[action_ids]
+
+        start = np.maximum(self.action_start[performing], now)
+        end = np.minimum(now + self.step_seconds, self.action_end[performing])
+        active_time_seconds = np.where(end > start, end - start, 0).astype(float)
+
+        # Only NPCs using a device during this interval count, in NPC order
+        keep = (usage >= 0) & (active_time_seconds > 0)
+        action_ids, usage, active_time_seconds = action_ids[keep], usage[keep], active_time_seconds[keep]
+        room_devices = self.action_room_device[action_ids]
+        is_water = house.device_is_water[usage]
+        heats_water = house.device_heats_water[usage]
+
+        energy_kwh = (house.device_power_watts[usage] * active_time_seconds / 3600) / 1000
+        water_used_liters = house.device_flow_lpm[usage] * (active_time_seconds / 60)
+        heating_energy = water_used_liters * ENERGY_PER_LITER_HOT_WATER
+
+        # cumsum adds left to right like the polling loop, so the sums are bit-for-bit the same
+        electricity_values = np.where(is_water, heating_energy, energy_kwh)[~is_water | heats_water]
+        water_values = water_used_liters[is_water]
+        interval_electricity = float(np.cumsum(electricity_values)[-1]) if len(electricity_values) else 0
+        interval_water = float(np.cumsum(water_values)[-1]) if len(water_values) else 0
+        house.total_electricity_used_kwh += interval_electricity
+        house.total_water_used_liters += interval_water
+
+        interval_devices = {"electricity": {}, "water": {}}
+        for category, devices, values in (("electricity", room_devices[~is_water], energy_kwh[~is_water]),
+                                          ("water", room_devices[is_water], water_used_liters[is_water])):
+            if len(devices):
+                # Keys in order of first use, totals accumulated in NPC order
+                unique_devices, first_use = np.unique(devices, return_index=True)
+                totals = np.bincount(devices, weights=values)
+                for device_id in unique_devices[np.argsort(first_use)]:
+                    interval_devices[category][house.device_keys[device_id]] = float(totals[device_id])
+        return interval_electricity, interval_water, interval_devices
+
+    def run(self, end_time, columnar=False):
+        """
+        Simulate every tick from start_time to end_time. Returns the same three dicts as run_simulation, or a
+        ColumnarResults when columnar is True.
+        """
+        if columnar:
+            intervals = [interval[1:] for interval in self.iter_intervals(end_time)]
+            return ColumnarResults.from_intervals(self.start_time, self.step_seconds, intervals, self.house.device_keys, self.house.device_is_water)
+
+        electricity_consumption = {}
+        water_consumption = {}
+        device_usage = {}
+        for tick, interval_electricity, interval_water, interval_devices in self.iter_intervals(end_time):
+            timestamp = self.time_at(tick * self.step_seconds).isoformat()
+            electricity_consumption[timestamp], water_consumption[timestamp], device_usage[timestamp] = interval_electricity, interval_water, interval_devices
+        return electricity_consumption, water_consumption, device_usage
+
+    def iter_intervals(self, end_time):
+        """Yield (tick, electricity, water, devices) for every tick from start_time to end_time, one tick at a time."""
+        tick = 0
+        while self.time_at(tick * self.step_seconds) < end_time:
+            yield (tick,) + tuple(self.step_tick(tick))
+            tick += 1
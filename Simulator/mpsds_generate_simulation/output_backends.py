@@ -0,0 +1,569 @@
+"""
+#########################################################################################################################################################
+
+File formats of the <house>_output files: one backend per format, each with a writer (one record at a time) and a
+reader that loads a time range without decoding the whole file.
+
+    json        indented JSON array, the historical <house>_output.json (what the Electron app reads)
+    ndjson      one JSON record per line
+    ndjson.gz   gzip-compressed NDJSON
+    ndjson.zst  zstd-compressed NDJSON (needs the zstandard package)
+    parquet     columnar, one row group per day, zstd-compressed (needs pyarrow)
+    arrow       columnar Arrow IPC file, memory-mapped when read (needs pyarrow)
+    npz         columnar NumPy archive (np.savez_compressed), the fallback without pyarrow
+    columnar    parquet when pyarrow is installed, npz otherwise
+
+Row formats are read line by line: only the "timestamp" of a record is looked at until it is inside the range, and
+reading stops at the first record after it (records are in time order). Columnar formats flatten every record into
+one column per sensor ("energy_management_sensors.battery.charge_level", one column per device for the device
+consumptions...) plus "timestamp_epoch", and select the rows of the range on that column: Parquet skips the row groups
+outside it, Arrow slices the memory-mapped table and npz slices the arrays. The key paths, column kinds and which
+columns are sparse (devices) are stored with the columns, so read_records gives back the nested records; lists (the
+anomalies) are kept as JSON text.
+
+Row formats can be read while they are written: after flush() a json file is a complete array, and the NDJSON readers
+stop at the last complete line (compressed streams without their end marker included). Columnar formats are written
+whole when the file is closed.
+
+Time range bounds are inclusive, given as epoch seconds, datetimes or ISO strings; strings without a UTC offset are
+in +01:00 like the simulation.
+
+#########################################################################################################################################################
+"""
+
+import gzip
+import io
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # Only the npz columnar backend
+    pa = pq = None
+
+try:
+    import zstandard
+except ImportError:  # No ndjson.zst
+    zstandard = None
+
+
+SIMULATION_TZ = timezone(timedelta(hours=1))
+ROWS_PER_GROUP = 288  # One day of 5-minute records per Parquet row group / Arrow batch
+EPOCH_COLUMN = "timestamp_epoch"
+_TIMESTAMP_KEY = '"timestamp": "'
+_JSON_RECORD_START = "    {\n"
+_JSON_TIMESTAMP_LINE = '        "timestamp": "'
+
+
+def timestamp_epoch(timestamp: str) -> float:
+    """Epoch seconds of an output timestamp ("2021-01-01 00:05:00+0100" or any ISO spelling)."""
+    moment = datetime.fromisoformat(timestamp.replace(" ", "T"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=SIMULATION_TZ)
+    return moment.timestamp()
+
+
+def time_bound(value):
+    """Epoch seconds of a time range bound (None, epoch seconds, datetime or ISO string)."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return (value if value.tzinfo is not None else value.replace(tzinfo=SIMULATION_TZ)).timestamp()
+    return timestamp_epoch(value)
+
+
+def _in_range(epoch, start, end):
+    return (start is None or epoch >= start) and (end is None or epoch <= end)
+
+
+##################################################################### Row formats #####################################################################
+
+class JsonArrayFile:
+    """Indented JSON array written one record at a time (same text as json.dump(records, f, indent=4))."""
+
+    extension = "json"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self._file = open(path, "w")
+
+    @property
+    def size(self):
+        return self._file.tell()
+
+    def write(self, record: dict):
+        # Every entry indented one level
+        self._file.write(("[\n    " if self.records == 0 else ",\n    ") + json.dumps(record, indent=4).replace("\n", "\n    "))
+        self.records += 1
+
+    def flush(self):
+        """
+        Make the file a complete JSON array on disk: the closing bracket is written and flushed, and the next record
+        overwrites it.
+        """
+        position = self._file.tell()
+        self._file.write("\n]" if self.records else "[]")
+        self._file.flush()
+        self._file.seek(position)
+
+    def close(self) -> int:
+        """Close the array and the file. Returns the size of the file."""
+        self._file.write("\n]" if self.records else "[]")
+        size = self._file.tell()
+        self._file.close()
+        return size
+
+    @staticmethod
+    def read(path: str, start=None, end=None) -> list:
+        """
+        Records of the range. Files in the layout written above are scanned line by line and only the records in the
+        range are decoded; any other JSON array is loaded whole.
+        """
+        start, end = time_bound(start), time_bound(end)
+        records = []
+        with open(path) as f:
+            if f.readline() != "[\n":
+                f.seek(0)
+                return [record for record in json.load(f) if _in_range(timestamp_epoch(record["timestamp"]), start, end)]
+            lines = None
+            for line in f:
+                if line == _JSON_RECORD_START:
+                    lines = [line]
+                    continue
+                if lines is None:
+                    # Between records, or in a record outside the range
+                    continue
+                if line.startswith(_JSON_TIMESTAMP_LINE):
+                    epoch = timestamp_epoch(line.split('"')[3])
+                    if end is not None and epoch > end:
+                        break
+                    if start is not None and epoch < start:
+                        lines = None
+                        continue
+                lines.append(line)
+                if line.startswith("    }"):
+                    records.append(json.loads("".join(lines).rstrip().rstrip(",")))
+                    lines = None
+        return records
+
+
+def _line_epoch(line):
+    """Epoch of the "timestamp" of an NDJSON line, without decoding the rest of the record."""
+    position = line.find(_TIMESTAMP_KEY)
+    if position < 0:
+        return timestamp_epoch(json.loads(line)["timestamp"])
+    position += len(_TIMESTAMP_KEY)
+    return timestamp_epoch(line[position:line.index('"', position)])
+
+
+def _complete_lines(lines):
+    """
+    Lines of a file that may still be written (real time loop): a last line without its newline is a record not
+    written yet, and a gzip stream without its end marker ends after the last flushed line.
+    """
+    try:
+        for line in lines:
+            if line.endswith("\n"):
+                yield line
+    except EOFError:
+        return
+
+
+def _chunk_lines(chunks):
+    """Text lines of an iterable of byte chunks (the last one without its newline if the file does not end with one)."""
+    pending = b""
+    for chunk in chunks:
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8") + "\n"
+    if pending:
+        yield pending.decode("utf-8", errors="replace")
+
+
+def _read_ndjson_lines(lines, start, end):
+    start, end = time_bound(start), time_bound(end)
+    records = []
+    for line in _complete_lines(lines):
+        if not line.strip():
+            continue
+        if start is not None or end is not None:
+            epoch = _line_epoch(line)
+            if end is not None and epoch > end:
+                break
+            if start is not None and epoch < start:
+                continue
+        records.append(json.loads(line))
+    return records
+
+
+class NdjsonFile:
+    """One JSON record per line."""
+
+    extension = "ndjson"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self._raw = open(path, "wb")
+        self._file = self._open_stream(self._raw)
+
+    @staticmethod
+    def _open_stream(raw):
+        return raw
+
+    @staticmethod
+    def _open_reader(raw):
+        return raw
+
+    @property
+    def size(self):
+        """Bytes written so far (compressed bytes already flushed by the compressor for the compressed formats)."""
+        return self._raw.tell()
+
+    def write(self, record: dict):
+        self._file.write((json.dumps(record) + "\n").encode())
+        self.records += 1
+
+    def flush(self):
+        """Write the records so far to disk (a sync flush of the compressor for the compressed formats)."""
+        if self._file is not self._raw:
+            self._file.flush()
+        self._raw.flush()
+
+    def close(self) -> int:
+        if self._file is not self._raw:
+            self._file.close()
+        self._raw.close()
+        return os.path.getsize(self.path)
+
+    @classmethod
+    def read(cls, path: str, start=None, end=None) -> list:
+        """Records of the range, decoding only the lines inside it and stopping after it."""
+        with open(path, "rb") as raw:
+            return _read_ndjson_lines(io.TextIOWrapper(cls._open_reader(raw), encoding="utf-8"), start, end)
+
+
+class GzipNdjsonFile(NdjsonFile):
+    """gzip-compressed NDJSON."""
+
+    extension = "ndjson.gz"
+
+    @staticmethod
+    def _open_stream(raw):
+        return gzip.GzipFile(fileobj=raw, mode="wb")
+
+    @staticmethod
+    def _open_reader(raw):
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+
+
+class ZstdNdjsonFile(NdjsonFile):
+    """zstd-compressed NDJSON (zstandard package)."""
+
+    extension = "ndjson.zst"
+
+    @staticmethod
+    def _open_stream(raw):
+        return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+
+    @staticmethod
+    def _open_reader(raw):
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+
+    @classmethod
+    def read(cls, path: str, start=None, end=None) -> list:
+        """Records of the range, decoding only the lines inside it and stopping after it."""
+        # stream_reader drops the output it still holds at the end of a frame not closed yet (a file the real time
+        # loop is writing), read_to_iter gives all of it
+        with open(path, "rb") as raw:
+            return _read_ndjson_lines(_chunk_lines(zstandard.ZstdDecompressor().read_to_iter(raw)), start, end)
+
+
+################################################################### Columnar formats ##################################################################
+
+class ColumnBuffer:
+    """
+    Records flattened into columns: one column per leaf of the nested dicts, named by its dotted key path. Columns
+    that first appear after the first record, or are missing from a record (the devices), are sparse: None where the
+    key was missing.
+    """
+
+    def __init__(self):
+        self.columns = {}
+        self.paths = {}
+        self.dicts = {}
+        self.order = {}
+        self.sparse = set()
+        self.rows = 0
+        self.cells = 0
+
+    def _flatten(self, record, keys, flat):
+        for key, value in record.items():
+            path = keys + [key]
+            name = ".".join(path)
+            if name not in self.order:
+                self.order[name] = None
+                self.paths[name] = path
+            if isinstance(value, dict):
+                self.dicts[name] = None
+                self._flatten(value, path, flat)
+            else:
+                flat[name] = value
+
+    def add(self, record: dict):
+        flat = {}
+        self._flatten(record, [], flat)
+        flat[EPOCH_COLUMN] = timestamp_epoch(record["timestamp"])
+        for name, column in self.columns.items():
+            if name not in flat:
+                column.append(None)
+                self.sparse.add(name)
+        for name, value in flat.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = [None] * self.rows
+                if self.rows:
+                    self.sparse.add(name)
+            column.append(value)
+        self.rows += 1
+        self.cells += len(flat)
+
+    @staticmethod
+    def _typed(values):
+        """(array, kind) of a column: bool, int, float (None as NaN), str, or json (anything else, as JSON text)."""
+        present = [value for value in values if value is not None]
+        complete = len(present) == len(values)
+        if present and complete and all(isinstance(value, (bool, np.bool_)) for value in present):
+            return np.array(values, dtype=bool), "bool"
+        if all(isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_)) for value in present):
+            if present and complete and all(isinstance(value, (int, np.integer)) for value in present):
+                return np.array(values, dtype=np.int64), "int"
+            return np.array([np.nan if value is None else value for value in values], dtype=float), "float"
+        if complete and all(isinstance(value, str) for value in present):
+            return np.array(values, dtype=str), "str"
+        return np.array([json.dumps(value) for value in values], dtype=str), "json"
+
+    def arrays(self):
+        """({name: array}, metadata) of the buffered columns; the metadata is what records() needs to rebuild them."""
+        arrays, kinds = {}, {}
+        for name, values in self.columns.items():
+            arrays[name], kinds[name] = self._typed(values)
+        arrays[EPOCH_COLUMN] = arrays[EPOCH_COLUMN].astype(np.int64)
+        metadata = {"order": list(self.order), "paths": self.paths, "dicts": list(self.dicts), "kinds": kinds, "sparse": sorted(self.sparse)}
+        return arrays, metadata
+
+
+def records_from_columns(columns: dict, metadata: dict) -> list:
+    """Nested records of flattened columns (the inverse of ColumnBuffer, NaN/None of sparse columns dropped)."""
+    kinds, paths, sparse, dicts = metadata["kinds"], metadata["paths"], set(metadata["sparse"]), set(metadata["dicts"])
+    values = {name: list(column) if isinstance(column, list) else column.tolist() for name, column in columns.items()}
+    rows = len(values[EPOCH_COLUMN]) if EPOCH_COLUMN in values else 0
+    order = [name for name in metadata["order"] if name in dicts or name in values]
+    records = []
+    for row in range(rows):
+        record = {}
+        for name in order:
+            keys = paths[name]
+            parent = record
+            for key in keys[:-1]:
+                parent = parent[key]
+            if name in dicts:
+                parent[keys[-1]] = {}
+                continue
+            value = values[name][row]
+            kind = kinds[name]
+            if kind == "json":
+                value = json.loads(value)
+            elif kind == "float" and value != value:
+                value = None
+            if value is None and name in sparse:
+                continue
+            parent[keys[-1]] = value
+        records.append(record)
+    return records
+
+
+class _ColumnarFile:
+    """Buffers the records of one file as columns and writes them on close()."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self.buffer = ColumnBuffer()
+
+    @property
+    def size(self):
+        """Uncompressed estimate (8 bytes per cell), the real size is only known once written."""
+        return self.buffer.cells * 8
+
+    def write(self, record: dict):
+        self.buffer.add(record)
+        self.records += 1
+
+    def flush(self):
+        """Nothing to do: the columns are only written by close()."""
+
+    def close(self) -> int:
+        if not self.records:
+            self.buffer.columns[EPOCH_COLUMN] = []
+        arrays, metadata = self.buffer.arrays()
+        self._write(arrays, metadata)
+        return os.path.getsize(self.path)
+
+    @classmethod
+    def read(cls, path: str, start=None, end=None) -> list:
+        """Records of the range."""
+        columns, metadata = cls.read_columns_with_metadata(path, start, end)
+        return records_from_columns(columns, metadata)
+
+    @classmethod
+    def read_columns(cls, path: str, start=None, end=None) -> dict:
+        """{column: array} of the rows of the range."""
+        return cls.read_columns_with_metadata(path, start, end)[0]
+
+
+def _require_pyarrow(output_format):
+    if pa is None:
+        raise ImportError(f"The '{output_format}' output format needs pyarrow (pip install pyarrow); use 'npz' or 'columnar' without it.")
+
+
+def _arrow_table(arrays, metadata):
+    table = pa.table({name: pa.array(array.tolist() if array.dtype.kind == "U" else array) for name, array in arrays.items()})
+    return table.replace_schema_metadata({"mpsds_output": json.dumps(metadata)})
+
+
+def _columns_of_table(table):
+    return {name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}
+
+
+class ParquetFile(_ColumnarFile):
+    """Parquet file (pyarrow), one row group per day so range reads skip the other days."""
+
+    extension = "parquet"
+
+    def __init__(self, path: str):
+        _require_pyarrow("parquet")
+        super().__init__(path)
+
+    def _write(self, arrays, metadata):
+        pq.write_table(_arrow_table(arrays, metadata), self.path, row_group_size=ROWS_PER_GROUP, compression="zstd")
+
+    @staticmethod
+    def read_columns_with_metadata(path, start=None, end=None):
+        _require_pyarrow("parquet")
+        start, end = time_bound(start), time_bound(end)
+        # The epoch column is int64: pyarrow refuses float bounds in the filter, same range in whole seconds
+        filters = [(EPOCH_COLUMN, ">=", math.ceil(start))] if start is not None else []
+        filters += [(EPOCH_COLUMN, "<=", math.floor(end))] if end is not None else []
+        table = pq.read_table(path, filters=filters or None)
+        metadata = json.loads(pq.read_schema(path).metadata[b"mpsds_output"])
+        return _columns_of_table(table), metadata
+
+
+class ArrowFile(_ColumnarFile):
+    """Arrow IPC file (pyarrow), memory-mapped when read."""
+
+    extension = "arrow"
+
+    def __init__(self, path: str):
+        _require_pyarrow("arrow")
+        super().__init__(path)
+
+    def _write(self, arrays, metadata):
+        table = _arrow_table(arrays, metadata)
+        with pa.OSFile(self.path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=ROWS_PER_GROUP)
+
+    @staticmethod
+    def read_columns_with_metadata(path, start=None, end=None):
+        _require_pyarrow("arrow")
+        start, end = time_bound(start), time_bound(end)
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+            epochs = table.column(EPOCH_COLUMN).to_numpy()
+            first = int(np.searchsorted(epochs, start, "left")) if start is not None else 0
+            last = int(np.searchsorted(epochs, end, "right")) if end is not None else len(epochs)
+            columns = _columns_of_table(table.slice(first, max(0, last - first)))
+            metadata = json.loads(table.schema.metadata[b"mpsds_output"])
+        return columns, metadata
+
+
+class NpzFile(_ColumnarFile):
+    """Compressed NumPy archive (no pyarrow needed): one array per column, names and metadata stored alongside."""
+
+    extension = "npz"
+
+    def _write(self, arrays, metadata):
+        metadata = dict(metadata, columns=list(arrays))
+        with open(self.path, "wb") as f:
+            np.savez_compressed(f, __metadata__=np.array(json.dumps(metadata)),
+                                **{f"c{number}": array for number, array in enumerate(arrays.values())})
+
+    @staticmethod
+    def read_columns_with_metadata(path, start=None, end=None):
+        start, end = time_bound(start), time_bound(end)
+        with np.load(path) as archive:
+            metadata = json.loads(archive["__metadata__"].item())
+            keys = {name: f"c{number}" for number, name in enumerate(metadata["columns"])}
+            # Arrays are loaded one column at a time, the epochs first to find the rows
+            epochs = archive[keys[EPOCH_COLUMN]]
+            first = int(np.searchsorted(epochs, start, "left")) if start is not None else 0
+            last = int(np.searchsorted(epochs, end, "right")) if end is not None else len(epochs)
+            columns = {name: archive[key][first:last] for name, key in keys.items()}
+        return columns, metadata
+
+
+######################################################################## Registry #####################################################################
+
+BACKENDS = {backend.extension: backend for backend in (JsonArrayFile, NdjsonFile, GzipNdjsonFile, ZstdNdjsonFile, ParquetFile, ArrowFile, NpzFile)}
+OUTPUT_FORMATS = tuple(BACKENDS) + ("columnar",)
+COLUMNAR_FORMATS = tuple(extension for extension, backend in BACKENDS.items() if issubclass(backend, _ColumnarFile))
+
+
+def resolve_format(output_format: str) -> str:
+    """Concrete format of an output format name ("columnar" is parquet or npz), checking its optional dependency."""
+    if output_format == "columnar":
+        return "parquet" if pa is not None else "npz"
+    if output_format not in BACKENDS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {', '.join(OUTPUT_FORMATS)}.")
+    if output_format in ("parquet", "arrow"):
+        _require_pyarrow(output_format)
+    if output_format == "ndjson.zst" and zstandard is None:
+        raise ImportError("The 'ndjson.zst' output format needs zstandard (pip install zstandard); use 'ndjson.gz' without it.")
+    return output_format
+
+
+def backend_of_path(path: str):
+    """Backend of an output file, from its extension."""
+    for extension in sorted(BACKENDS, key=len, reverse=True):
+        if path.endswith("." + extension):
+            return BACKENDS[extension]
+    raise ValueError(f"Unknown output file type: {path}")
+
+
+def read_records(path: str, start=None, end=None) -> list:
+    """Output records of one file in the time range [start, end] (all of them without bounds)."""
+    return backend_of_path(path).read(path, start, end)
+
+
+def read_columns(path: str, start=None, end=None) -> dict:
+    """
+    {column: array} of one file in the time range [start, end], flattened like the columnar formats (row formats are
+    read with read_records and flattened).
+    """
+    backend = backend_of_path(path)
+    if issubclass(backend, _ColumnarFile):
+        return backend.read_columns(path, start, end)
+    buffer = ColumnBuffer()
+    for record in backend.read(path, start, end):
+        buffer.add(record)
+    if not buffer.rows:
+        return {}
+    return buffer.arrays()[0]
@@ -0,0 +1,223 @@
+"""
+#########################################################################################################################################################
+
+Streaming writer of the <house>_output files of puppeteer.py.
+
+The output used to be built as one list of nested dicts and dumped with json.dump(indent=4) at the end. OutputWriter
+hands every record to the backend of the output format (output_backends) as soon as it is given: "json" (one JSON
+array written incrementally, the same text json.dump(records, f, indent=4) gives, the default), "ndjson", gzip/zstd
+NDJSON or a columnar file (Parquet, Arrow IPC or npz; these buffer the columns of one file until it is closed).
+
+The output can also be rotated into several files, by size (a new file once the current one reaches rotate_bytes, so
+every file holds whole records) and/or by day (one file per local date of the timestamps):
+
+    <house>_output.json                         no rotation
+    <house>_output_2021-01-01.ndjson            rotate_daily
+    <house>_output_0001.parquet                 rotate_bytes
+    <house>_output_2021-01-01_0001.ndjson.gz    both
+
+Closing the writer writes <house>_output_manifest.json: format, rotation settings, totals and, for every file, its
+name, number of records, size and first/last timestamp. read_output(manifest or file, start, end) loads a time range,
+only opening the files that overlap it.
+
+#########################################################################################################################################################
+"""
+
+import json
+import os
+
+import numpy as np
+
+import instrumentation
+from output_backends import BACKENDS, EPOCH_COLUMN, OUTPUT_FORMATS, read_columns, read_records, resolve_format, time_bound, timestamp_epoch
+
+
+def output_file_path(output_dir: str, house_id: str, output_format: str = "json", day: str = None, part: int = None) -> str:
+    """Path of one output file (day and part only for rotated outputs)."""
+    name = f"{house_id}_output"
+    if day is not None:
+        name += f"_{day}"
+    if part is not None:
+        name += f"_{part:04d}"
+    return os.path.join(output_dir, f"{name}.{output_format}")
+
+
+def manifest_path(output_dir: str, house_id: str) -> str:
+    """Path of the manifest of the output of a house."""
+    return os.path.join(output_dir, f"{house_id}_output_manifest.json")
+
+
+class OutputWriter:
+    """
+    Write output records one at a time, with optional rotation, and a manifest on close().
+
+    Args:
+        house_id (str): House ID, prefix of the file names.
+        output_dir (str): Folder for the output files and the manifest.
+        output_format (str): One of OUTPUT_FORMATS: "json" (indented JSON array), "ndjson" (one record per line),
+            "ndjson.gz", "ndjson.zst", "parquet", "arrow", "npz" or "columnar" (parquet, or npz without pyarrow).
+        rotate_bytes (int): Start a new file once the current one has at least this many bytes (None: no size limit);
+            an estimate for the compressed and columnar formats.
+        rotate_daily (bool): One file per local date of the record timestamps.
+    """
+
+    def __init__(self, house_id: str, output_dir: str = "sim_result", output_format: str = "json", rotate_bytes: int = None, rotate_daily: bool = False):
+        output_format = resolve_format(output_format)
+        if rotate_bytes is not None and rotate_bytes <= 0:
+            raise ValueError("rotate_bytes must be a positive number of bytes.")
+        self.house_id = house_id
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.files = []
+        self.records_written = 0
+        self.bytes_written = 0
+        self.manifest_file = manifest_path(output_dir, house_id)
+        self._file = None
+        self._entry = None
+        self._part = 0
+        self._closed = False
+        os.makedirs(output_dir, exist_ok=True)
+
+    @property
+    def rotated(self):
+        return self.rotate_bytes is not None or self.rotate_daily
+
+    @property
+    def output_file(self):
+        """The output file, or the manifest when the output is rotated into several files."""
+        return self.manifest_file if self.rotated else output_file_path(self.output_dir, self.house_id, self.output_format)
+
+    @property
+    def current_file(self):
+        """Path of the file the last record went to."""
+        return self._entry["path"] if self._entry is not None else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _open(self, day):
+        if self.rotate_bytes is not None:
+            self._part += 1
+        path = output_file_path(self.output_dir, self.house_id, self.output_format,
+                                day=day if self.rotate_daily else None,
+                                part=self._part if self.rotate_bytes is not None else None)
+        self._file = BACKENDS[self.output_format](path)
+        self._entry = {"path": path, "day": day, "records": 0, "bytes": 0, "first_timestamp": None, "last_timestamp": None}
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        self._entry["bytes"] = self._file.close()
+        self._file = None
+        self.bytes_written += self._entry["bytes"]
+        instrumentation.count("bytes_written", self._entry["bytes"])
+        self.files.append(self._entry)
+        if self.rotated:
+            print(f"Wrote {self._entry['path']} ({self._entry['records']} records, {self._entry['bytes'] / (1024 * 1024):.2f} MB)")
+
+    def write(self, record: dict):
+        """Write one output record (a dict with a "timestamp", in the standardized "YYYY-MM-DD HH:MM:SS+HHMM" form)."""
+        timestamp = record["timestamp"]
+        day = timestamp[:10]
+        if self._file is not None and self.rotate_daily and day != self._entry["day"]:
+            self._close_file()
+        if self._file is None:
+            self._open(day)
+
+        self._file.write(record)
+        self._entry["records"] += 1
+        self._entry["first_timestamp"] = self._entry["first_timestamp"] or timestamp
+        self._entry["last_timestamp"] = timestamp
+        self.records_written += 1
+        if self.rotate_bytes is not None and self._file.size >= self.rotate_bytes:
+            self._close_file()
+
+    def flush(self):
+        """Write the records so far to disk (for readers of a file that is still open, e.g. in the real time loop)."""
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        """Close the current file and write the manifest. Returns the path of the manifest."""
+        if self._closed:
+            return self.manifest_file
+        self._closed = True
+        if self._file is None and not self.files and not self.rotate_daily:
+            # No records: still an (empty) output file
+            self._open(None)
+        self._close_file()
+
+        manifest = {
+            "house_id": self.house_id,
+            "format": self.output_format,
+            "rotation": {"max_bytes": self.rotate_bytes, "daily": self.rotate_daily},
+            "records": self.records_written,
+            "bytes": self.bytes_written,
+            "first_timestamp": self.files[0]["first_timestamp"] if self.files else None,
+            "last_timestamp": self.files[-1]["last_timestamp"] if self.files else None,
+            "files": [{"file": os.path.basename(entry["path"]), "records": entry["records"], "bytes": entry["bytes"],
+                       "first_timestamp": entry["first_timestamp"], "last_timestamp": entry["last_timestamp"]}
+                      for entry in self.files]
+        }
+        with open(self.manifest_file, "w") as f:
+            json.dump(manifest, f, indent=4)
+
+        if self.rotated:
+            print(f"Generated {len(self.files)} output files ({self.records_written} records, {self.bytes_written / (1024 * 1024):.2f} MB). "
+                  f"Manifest: {self.manifest_file}")
+        else:
+            print(f"Generated output file: {self.output_file} ({self.records_written} records)")
+        return self.manifest_file
+
+
+def read_output(path: str, start=None, end=None, columns: bool = False):
+    """
+    Load the output records of a time range.
+
+    Args:
+        path (str): A manifest (all the files of a rotated output) or one output file, of any format.
+        start, end: Inclusive bounds (epoch seconds, datetime or ISO string), None for no bound.
+        columns (bool): Return {column: array} of the flattened records instead of the nested records.
+
+    Returns:
+        list or dict: The records in time order, or their columns.
+    """
+    if not path.endswith("_manifest.json"):
+        return read_columns(path, start, end) if columns else read_records(path, start, end)
+
+    with open(path) as f:
+        manifest = json.load(f)
+    start_epoch, end_epoch = time_bound(start), time_bound(end)
+    parts = []
+    for entry in manifest["files"]:
+        if not entry["records"]:
+            continue
+        # Files that do not overlap the range are not opened
+        if start_epoch is not None and timestamp_epoch(entry["last_timestamp"]) < start_epoch:
+            continue
+        if end_epoch is not None and timestamp_epoch(entry["first_timestamp"]) > end_epoch:
+            continue
+        file_path = os.path.join(os.path.dirname(path), entry["file"])
+        parts.append(read_columns(file_path, start, end) if columns else read_records(file_path, start, end))
+
+    if not columns:
+        return [record for part in parts for record in part]
+    # Columns missing from a file (a device never used in it) are NaN / None there
+    merged = {}
+    for name in dict.fromkeys(name for part in parts for name in part):
+        pieces = []
+        for part in parts:
+            if name in part:
+                pieces.append(part[name])
+            else:
+                rows = len(part[EPOCH_COLUMN])
+                numeric = next(other[name] for other in parts if name in other).dtype.kind in "biuf"
+                pieces.append(np.full(rows, np.nan) if numeric else np.full(rows, None, dtype=object))
+        merged[name] = np.concatenate(pieces)
+    return merged
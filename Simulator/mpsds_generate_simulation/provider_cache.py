@@ -0,0 +1,149 @@
+"""
+#########################################################################################################################################################
+
+Cache of the readings of the external data providers (PVGIS, OpenWeatherMap).
+
+Every provider has one ProviderCache with its own time to live. get(key, fetch) returns, in this order:
+
+    1. the reading kept in memory, if it is younger than the TTL;
+    2. the reading stored on disk (<cache dir>/<provider>/<key>.json), if it is younger than the TTL, so other runs and
+       the worker processes of a fleet or an ensemble reuse it;
+    3. a new reading: fetch() is called once, callers asking for the same key in the meantime wait for its result
+       instead of sending their own request. The reading is stored in memory and on disk.
+
+When fetch() fails, the last stored reading is returned even if it expired (with a warning) and kept in memory for one
+more TTL, so a run without network still works once the cache has been filled; without one the error is raised.
+
+The cache folder is MPSDS_CACHE_DIR, or .cache next to this module.
+
+#########################################################################################################################################################
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import instrumentation
+
+
+CACHE_DIR = os.environ.get("MPSDS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+class ProviderCache:
+    """
+    TTL cache of the readings of one provider, in memory and on disk.
+
+    Args:
+        provider (str): Provider name, also the folder of its readings in the cache folder.
+        ttl_seconds (float): Age after which a reading is requested again.
+        cache_dir (str): Cache folder (default: CACHE_DIR). None keeps the readings in memory only.
+    """
+
+    def __init__(self, provider: str, ttl_seconds: float, cache_dir: str = CACHE_DIR):
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = os.path.join(cache_dir, provider) if cache_dir else None
+        self._memory = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        # Keys may hold characters that are not valid in file names (coordinates, URLs)
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest()[:16] + ".json")
+
+    def _load(self, key):
+        """(stored_at, value) of the reading on disk, None if there is none."""
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("key") != key:
+            return None
+        return entry["stored_at"], entry["value"]
+
+    def _store(self, key, stored_at, value):
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key)
+            # Written next to the final file and renamed, readers in other processes never see half a file
+            temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary_path, "w") as f:
+                json.dump({"provider": self.provider, "key": key, "stored_at": stored_at, "value": value}, f)
+            os.replace(temporary_path, path)
+        except (OSError, TypeError, ValueError) as error:
+            print(f"\033[93mWarning: could not store the {self.provider} reading in the cache: {error}\033[0m")
+
+    def _fresh(self, stored_at):
+        return time.time() - stored_at < self.ttl_seconds
+
+    def get(self, key: str, fetch):
+        """
+        Reading of `key`, from the cache or from fetch().
+
+        Args:
+            key (str): Reading key (e.g. the coordinates of the request).
+            fetch (callable): Called without arguments to get a new reading. Its result must be JSON-serializable
+                (tuples come back as lists from the disk cache).
+
+        Returns:
+            The reading.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._fresh(entry[0]):
+                instrumentation.count(f"{self.provider}_cache_hits")
+                return entry[1]
+            waiting = key in self._in_flight
+            if not waiting:
+                self._in_flight[key] = {"done": threading.Event(), "value": None, "error": None}
+            request = self._in_flight[key]
+
+        if waiting:
+            # Same key requested by another thread: its result
+            request["done"].wait()
+            instrumentation.count(f"{self.provider}_cache_hits")
+            if request["error"] is not None:
+                raise request["error"]
+            return request["value"]
+
+        try:
+            stored = self._load(key)
+            if stored is not None and self._fresh(stored[0]):
+                instrumentation.count(f"{self.provider}_cache_hits")
+                request["value"] = stored[1]
+            else:
+                instrumentation.count(f"{self.provider}_requests")
+                try:
+                    request["value"] = fetch()
+                    stored = (time.time(), request["value"])
+                    self._store(key, *stored)
+                except Exception as error:
+                    if stored is None:
+                        raise
+                    age_hours = (time.time() - stored[0]) / 3600
+                    print(f"\033[93mWarning: {self.provider} request failed ({error}), using the reading stored {age_hours:.1f} hours ago\033[0m")
+                    request["value"] = stored[1]
+                    # Not requested again before the TTL, a run without network does not wait for every timeout
+                    stored = (time.time(), stored[1])
+            with self._lock:
+                self._memory[key] = (stored[0], request["value"])
+            return request["value"]
+        except Exception as error:
+            request["error"] = error
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            request["done"].set()
+
+    def clear(self):
+        """Forget the readings kept in memory (the disk cache is kept)."""
+        with self._lock:
+            self._memory.clear()
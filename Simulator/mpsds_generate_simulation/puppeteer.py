@@ -15,21 +15,34 @@ Fix the timestamp, is the last thing to do but it needs to be done.
 
 # Importing the necessary libraries
 import json
-from datetime import datetime
+import math
+from datetime import datetime, timedelta
+from functools import partial
 import numpy as np
 import os
-import time
+import sys
 
 
 #Import custom modules
 import solar_module.solar_irradiance as solar_module #Import the solar_production module from the solar_block folder
 from climateEnviroment import temperature_humidty_airquality as getTempHomemade #Import the homemade sensor module
 from npc import run_simulation #Import the run_simulation function from the npc module
+from npc import run_simulation_iter #Streaming version, one record per interval
 from battery_module.battery_sim import battery_status #Import the battery_status function from the battery_sim module
+from battery_module.battery_sim import BatteryModel #In-memory battery for the real time loop
 
 #Import custom solar modules for real time. Batery and climateEnviroment are the same
-from solar_module.solar_irradiance import get_real_time_solar_irradiance
+from solar_module.solar_irradiance import ClearSkyIrradiance #Clear-sky irradiance of the real time loop, one pvlib run per day
 from npc import run_simulation_realtime
+from npc import RealtimeEngine #Long-lived real time simulation
+
+import instrumentation #Per-stage timings and counters
+from instrumentation import Instrumentation
+from time_index import TimeIndex #Canonical time index, the stages join on its positions
+from output_writer import OutputWriter, output_file_path, manifest_path #Streaming writer of the output files (rotation, manifest)
+from output_backends import OUTPUT_FORMATS, COLUMNAR_FORMATS, resolve_format, timestamp_epoch #Output file formats (JSON array, NDJSON, gzip/zstd NDJSON, Parquet/Arrow/npz)
+from stage_graph import StageGraph #Dependency graph of the fast-forward stages, run concurrently
+from tick_scheduler import TickScheduler, TickLatency #Wall-clock aligned ticks of the real time loop and their latency
 
 
 
@@ -56,17 +69,76 @@ def get_solar_production(solar_irr_data_json: dict, pannel_eff: float, num_panne
         dict: Dictionary containing the solar production data. With timestamp as key (like in the solar_irr dict) and the production in kW as value.
     """
     
+    # Thin adapter over the array version, same values
+    production = get_solar_production_array(ghi=list(solar_irr_data_json.values()),
+                                            pannel_eff=pannel_eff,
+                                            num_pannels=num_pannels,
+                                            panel_area_m2=panel_area_m2)
+    return dict(zip(solar_irr_data_json.keys(), production.tolist()))
+
+
+def get_solar_production_array(ghi, pannel_eff: float, num_pannels: int, panel_area_m2: float):
+    """
+    Array version of get_solar_production: the production of the panels for a whole GHI series at once.
     
-    production_data = {
-        timestamp: (irradiance * panel_area_m2 * pannel_eff * num_pannels) / 1000
-        for timestamp, irradiance in solar_irr_data_json.items()
-    }
+    Args:
+        ghi (np.ndarray): Global horizontal irradiance in W/m² (e.g. solar_irradiance.get_solar_irradiance_array), NaN where missing.
+        pannel_eff (float): The efficiency of the solar panels.
+        num_pannels (int): The number of solar panels.
+        panel_area_m2 (float): The area of the solar panels in m².
+        
+    Returns:
+        np.ndarray: Solar production in kW for every GHI value (NaN stays NaN).
+    """
+    return np.asarray(ghi, dtype=float) * panel_area_m2 * pannel_eff * num_pannels / 1000
+
+
+def get_solar_grid_balance(solar_kw, consumption_kw, step_seconds: int = 300):
+    """
+    Grid balance of a whole horizon on arrays: what is imported from and exported to the grid at every interval, plus
+    the energy totals. Intervals where either series is NaN (no data) are left out of the totals.
     
-    return production_data
+    Args:
+        solar_kw (np.ndarray): Solar production in kW at every interval.
+        consumption_kw (np.ndarray): Electricity consumption in kW at every interval.
+        step_seconds (int): Length of an interval, the power is held over it (default: 300).
+        
+    Returns:
+        dict: "grid_kw" (consumption - solar, negative with excess solar), "import_kw", "export_kw" and
+        "self_consumption_kw" arrays, "available" (both series known) and the totals over the available intervals:
+        "solar_kwh", "consumption_kwh", "import_kwh", "export_kwh", "self_consumption_kwh", "self_consumption_ratio"
+        (share of the solar used in the house) and "self_sufficiency_ratio" (share of the consumption covered by solar).
+    """
+    solar_kw = np.asarray(solar_kw, dtype=float)
+    consumption_kw = np.asarray(consumption_kw, dtype=float)
+    grid_kw = consumption_kw - solar_kw
+    available = ~np.isnan(grid_kw)
+    import_kw = np.maximum(grid_kw, 0.0)
+    export_kw = np.maximum(-grid_kw, 0.0)
+    self_consumption_kw = np.minimum(solar_kw, consumption_kw)
     
+    step_hours = step_seconds / 3600.0
+    solar_kwh = float(solar_kw[available].sum() * step_hours)
+    consumption_kwh = float(consumption_kw[available].sum() * step_hours)
+    self_consumption_kwh = float(self_consumption_kw[available].sum() * step_hours)
+    return {
+        "grid_kw": grid_kw,
+        "import_kw": import_kw,
+        "export_kw": export_kw,
+        "self_consumption_kw": self_consumption_kw,
+        "available": available,
+        "solar_kwh": solar_kwh,
+        "consumption_kwh": consumption_kwh,
+        "import_kwh": float(import_kw[available].sum() * step_hours),
+        "export_kwh": float(export_kw[available].sum() * step_hours),
+        "self_consumption_kwh": self_consumption_kwh,
+        "self_consumption_ratio": self_consumption_kwh / solar_kwh if solar_kwh > 0 else None,
+        "self_sufficiency_ratio": self_consumption_kwh / consumption_kwh if consumption_kwh > 0 else None
+    }
 
 
-def get_total_consumption(config_file_data: dict, output_file: str = "results/user_data.json", interval: int = 300, minutes: bool = True, start_date: datetime = None, end_date: datetime = None):
+
+def get_total_consumption(config_file_data: dict, output_file: str = "results/user_data.json", interval: int = 300, minutes: bool = True, start_date: datetime = None, end_date: datetime = None, seed=None, columnar: bool = False, checkpoint_path: str = None, checkpoint_every_days: float = 7, resume_from: str = None):
     """
     Run the house simulation with custom parameters.
 
@@ -75,10 +147,15 @@ def get_total_consumption(config_file_data: dict, output_file: str = "results/us
         output_file (str): Path to save the simulation output (default: "my_results.json").
         interval (int): Update interval in seconds (default: 300).
         minutes (bool): Whether actions are in minutes (default: True).
+        seed (int or numpy SeedSequence): Seed of the NPC random streams (fast-forward only). None is not reproducible.
+        columnar (bool): Return a ColumnarResults instead of the tuple of dicts (fast-forward only).
+        checkpoint_path (str): Save the state of the run there every checkpoint_every_days simulated days (fast-forward only).
+        resume_from (str): Continue the run saved in this checkpoint (fast-forward only).
 
     Returns:
          tuple: (total_electricity_used_kwh, total_water_used_liters, device_electricity_usage) for fast-forward mode,
            where device_electricity_usage is a dictionary with device keys (e.g., "Kitchen_stove") and their electricity usage in kWh.
+           A ColumnarResults with the same data when columnar is True.
            Returns None for real-time mode.
     """
     
@@ -92,8 +169,16 @@ def get_total_consumption(config_file_data: dict, output_file: str = "results/us
                                 update_interval=interval,
                                 actions_in_minutes_flag=minutes,
                                 start_date=start_date,
-                                end_date=end_date)
+                                end_date=end_date,
+                                seed=seed,
+                                columnar=columnar,
+                                checkpoint_path=checkpoint_path,
+                                checkpoint_every_days=checkpoint_every_days,
+                                resume_from=resume_from)
         
+        if columnar and result is not None:
+            print("\033[92mFast foward simulation completed correctly\033[0m")
+            return result
         if result:
             electricity_used, water_used, device_conumption_dict = result
             print("\033[92mFast foward simulation completed correctly\033[0m")
@@ -138,7 +223,7 @@ from datetime import datetime
 
 from datetime import datetime
 
-def get_battery_data(battery_capacity_ah: float, voltage: float, solar_prod, total_consumpt, charge_eff: float, discharge_eff: float, energy_loss_convrt: float, degrading_ratio: float, initial_state_charge: float = 100.0, type_of_simulation: str = "fast_forward"):
+def get_battery_data(battery_capacity_ah: float, voltage: float, solar_prod, total_consumpt, charge_eff: float, discharge_eff: float, energy_loss_convrt: float, degrading_ratio: float, initial_state_charge: float = 100.0, type_of_simulation: str = "fast_forward", history_file: str = "battery_history.json", time_index: TimeIndex = None):
     """
     Compute battery status based on solar production and total consumption data.
 
@@ -153,6 +238,9 @@ def get_battery_data(battery_capacity_ah: float, voltage: float, solar_prod, tot
         degrading_ratio (float): Battery degradation ratio.
         initial_state_charge (float): Initial state of charge percentage (default: 100.0).
         type_of_simulation (str): Simulation type ("real_time" or "fast_forward").
+        history_file (str): Battery history file used by battery_status (default: "battery_history.json").
+        time_index (TimeIndex): Fast-forward only. Join solar_prod and total_consumpt on the positions of this index
+            (timestamps matched by instant) instead of standardizing and sorting every key.
 
     Returns:
         dict: Battery status with timestamps as keys.
@@ -183,7 +271,8 @@ def get_battery_data(battery_capacity_ah: float, voltage: float, solar_prod, tot
             energy_loss_convrt=energy_loss_convrt,
             degrading_ratio=degrading_ratio,
             initial_state_charge=initial_state_charge,
-            current_time=curr_ts_dt
+            current_time=curr_ts_dt,
+            history_file=history_file
         )
         # Return a dict with the timestamp as key for consistency
         return {timestamp: status}
@@ -195,6 +284,34 @@ def get_battery_data(battery_capacity_ah: float, voltage: float, solar_prod, tot
         if not isinstance(total_consumpt, dict):
             raise TypeError("In fast-forward mode, total_consumpt should be a dict.")
 
+        if time_index is not None:
+            # Join on the positions of the time index, the keys are never re-formatted
+            solar_prod_standardized = time_index.positions(solar_prod)
+            total_consumpt_standardized = time_index.positions(total_consumpt)
+            common_positions = sorted(solar_prod_standardized.keys() & total_consumpt_standardized.keys())
+            if not common_positions:
+                raise ValueError("No common timestamps found between solar production and total consumption data.")
+            print(f"Number of common timestamps in get_battery_data: {len(common_positions)}")
+            
+            standardized = time_index.standardized()
+            epochs = time_index.epochs[common_positions]
+            timestamps_dt = [datetime.fromtimestamp(epoch, time_index.tz) for epoch in epochs.tolist()]
+            for gap in np.flatnonzero(np.diff(epochs) != 300):
+                print(f"Warning: Timestamp gap between {timestamps_dt[gap]} and {timestamps_dt[gap + 1]} is {(epochs[gap + 1] - epochs[gap]) / 60} minutes, expected 5 minutes.")
+            
+            delta_t_hours = (np.diff(epochs) / 3600.0).tolist()
+            solar_energy_kwh = [solar_prod_standardized[common_positions[i - 1]] * delta_t_hours[i - 1] for i in range(1, len(common_positions))]
+            consumpt_energy_kwh = [total_consumpt_standardized[common_positions[i - 1]] * delta_t_hours[i - 1] for i in range(1, len(common_positions))]
+            return _battery_series([standardized[position] for position in common_positions], timestamps_dt, solar_energy_kwh, consumpt_energy_kwh,
+                                   battery_capacity_ah=battery_capacity_ah,
+                                   voltage=voltage,
+                                   charge_eff=charge_eff,
+                                   discharge_eff=discharge_eff,
+                                   energy_loss_convrt=energy_loss_convrt,
+                                   degrading_ratio=degrading_ratio,
+                                   initial_state_charge=initial_state_charge,
+                                   history_file=history_file)
+
         # Standardize timestamps for both dictionaries
         solar_prod_standardized = {standardize_timestamp_format(ts): value for ts, value in solar_prod.items()}
         total_consumpt_standardized = {standardize_timestamp_format(ts): value for ts, value in total_consumpt.items()}
@@ -216,59 +333,93 @@ def get_battery_data(battery_capacity_ah: float, voltage: float, solar_prod, tot
             if delta_t_minutes != 5:
                 print(f"Warning: Timestamp gap between {timestamps_dt[i-1]} and {timestamps_dt[i]} is {delta_t_minutes} minutes, expected 5 minutes.")
 
-        # Initialize result dictionary
-        result = {}
+        # Energy (kWh) of every interval [prev_ts, curr_ts] using the power at prev_ts
+        delta_t_hours = [(timestamps_dt[i] - timestamps_dt[i - 1]).total_seconds() / 3600.0 for i in range(1, len(timestamps_dt))]
+        solar_energy_kwh = [solar_prod_standardized[common_timestamps[i - 1]] * delta_t_hours[i - 1] for i in range(1, len(timestamps_dt))]
+        consumpt_energy_kwh = [total_consumpt_standardized[common_timestamps[i - 1]] * delta_t_hours[i - 1] for i in range(1, len(timestamps_dt))]
+
+        return _battery_series(common_timestamps, timestamps_dt, solar_energy_kwh, consumpt_energy_kwh,
+                               battery_capacity_ah=battery_capacity_ah,
+                               voltage=voltage,
+                               charge_eff=charge_eff,
+                               discharge_eff=discharge_eff,
+                               energy_loss_convrt=energy_loss_convrt,
+                               degrading_ratio=degrading_ratio,
+                               initial_state_charge=initial_state_charge,
+                               history_file=history_file)
 
-        # Initialize battery status at the first common timestamp
-        first_ts_dt = timestamps_dt[0]
-        first_ts_str = common_timestamps[0]
-        initial_status = battery_status(
-            battery_capacity_ah=battery_capacity_ah,
-            voltage=voltage,
-            solar_prod=0.0,  # No energy transfer for initialization
-            total_consumpt=0.0,
-            charge_eff=charge_eff,
-            discharge_eff=discharge_eff,
-            energy_loss_convrt=energy_loss_convrt,
-            degrading_ratio=degrading_ratio,
-            initial_state_charge=initial_state_charge,
-            current_time=first_ts_dt
-        )
-        result[first_ts_str] = initial_status
+    else:
+        raise ValueError("Invalid type_of_simulation. Must be 'real_time' or 'fast_forward'.")
 
-        # Iterate over consecutive common timestamps
-        for i in range(1, len(timestamps_dt)):
-            prev_ts_dt = timestamps_dt[i - 1]
-            curr_ts_dt = timestamps_dt[i]
-            prev_ts_str = common_timestamps[i - 1]
-            curr_ts_str = common_timestamps[i]
-
-            # Compute time difference in hours
-            delta_t_hours = (curr_ts_dt - prev_ts_dt).total_seconds() / 3600.0
-
-            # Compute energy (kWh) for the interval [prev_ts, curr_ts] using power at prev_ts
-            solar_energy_kwh = solar_prod_standardized[prev_ts_str] * delta_t_hours
-            consumpt_energy_kwh = total_consumpt_standardized[prev_ts_str] * delta_t_hours
-
-            # Update battery status for current timestamp
-            status = battery_status(
-                battery_capacity_ah=battery_capacity_ah,
-                voltage=voltage,
-                solar_prod=solar_energy_kwh,
-                total_consumpt=consumpt_energy_kwh,
-                charge_eff=charge_eff,
-                discharge_eff=discharge_eff,
-                energy_loss_convrt=energy_loss_convrt,
-                degrading_ratio=degrading_ratio,
-                initial_state_charge=initial_state_charge,  # Ignored after first call due to history
-                current_time=curr_ts_dt
-            )
-            result[curr_ts_str] = status
 
-        return result
+def get_battery_data_columnar(battery_capacity_ah: float, voltage: float, solar_values, results, charge_eff: float, discharge_eff: float, energy_loss_convrt: float, degrading_ratio: float, initial_state_charge: float = 100.0, history_file: str = "battery_history.json"):
+    """
+    Fast-forward battery stage on arrays, without parsing any timestamp.
+
+    Args:
+        solar_values (np.ndarray): Solar production in kW at every interval of results (results.align(solar_prod)), NaN where missing.
+        results (ColumnarResults): Columnar output of run_simulation(columnar=True).
+        The other arguments are the ones of get_battery_data.
+
+    Returns:
+        dict: Battery status with the ISO timestamps of results as keys, the same readings as get_battery_data.
+    """
+    available = ~np.isnan(solar_values)
+    if not available.any():
+        raise ValueError("No common timestamps found between solar production and total consumption data.")
+    print(f"Number of common timestamps in get_battery_data_columnar: {int(available.sum())}")
+
+    time_index = results.time_index[available]
+    solar_kw = solar_values[available]
+    consumption_kw = results.electricity[available]
+    delta_t_hours = np.diff(time_index) / 3600.0
+    for gap in np.flatnonzero(delta_t_hours * 60 != 5):
+        print(f"Warning: Timestamp gap at position {gap} is {delta_t_hours[gap] * 60} minutes, expected 5 minutes.")
+
+    timestamps_dt = [moment for moment, ok in zip(results.datetimes(), available) if ok]
+    return _battery_series([moment.isoformat() for moment in timestamps_dt], timestamps_dt,
+                           (solar_kw[:-1] * delta_t_hours).tolist(),
+                           (consumption_kw[:-1] * delta_t_hours).tolist(),
+                           battery_capacity_ah=battery_capacity_ah,
+                           voltage=voltage,
+                           charge_eff=charge_eff,
+                           discharge_eff=discharge_eff,
+                           energy_loss_convrt=energy_loss_convrt,
+                           degrading_ratio=degrading_ratio,
+                           initial_state_charge=initial_state_charge,
+                           history_file=history_file)
+
+
+def _battery_series(timestamps, timestamps_dt, solar_energy_kwh, consumpt_energy_kwh, battery_capacity_ah, voltage, charge_eff, discharge_eff, energy_loss_convrt, degrading_ratio, initial_state_charge, history_file):
+    """
+    Run the battery model over consecutive timestamps. solar_energy_kwh[i - 1] and consumpt_energy_kwh[i - 1] are the
+    energies of the interval ending at timestamps[i]; the first timestamp only initializes the battery. The history is
+    kept in memory and written once at the end (same file as calling battery_status for every timestamp); with
+    history_file=None nothing is read or written.
+    """
+    # Initialize result dictionary
+    result = {}
+    battery = BatteryModel(battery_capacity_ah=battery_capacity_ah,
+                           voltage=voltage,
+                           charge_eff=charge_eff,
+                           discharge_eff=discharge_eff,
+                           energy_loss_convrt=energy_loss_convrt,
+                           degrading_ratio=degrading_ratio,
+                           initial_state_charge=initial_state_charge,
+                           history_file=history_file)
+
+    # Initialize battery status at the first common timestamp (no energy transfer)
+    result[timestamps[0]] = battery.update(solar_prod=0.0, total_consumpt=0.0, current_time=timestamps_dt[0])
+
+    # Iterate over consecutive common timestamps
+    for i in range(1, len(timestamps_dt)):
+        result[timestamps[i]] = battery.update(solar_prod=solar_energy_kwh[i - 1],
+                                               total_consumpt=consumpt_energy_kwh[i - 1],
+                                               current_time=timestamps_dt[i])
+
+    battery.save()
+    return result
 
-    else:
-        raise ValueError("Invalid type_of_simulation. Must be 'real_time' or 'fast_forward'.")
     
 
 def standardize_timestamp_format(timestamp):
@@ -276,7 +427,7 @@ def standardize_timestamp_format(timestamp):
     dt = datetime.fromisoformat(timestamp.replace("T", " "))
     return dt.strftime("%Y-%m-%d %H:%M:%S%z")
 
-def get_solar_grid_consumption(solar_production, total_electr_consumption):
+def get_solar_grid_consumption(solar_production, total_electr_consumption, time_index: TimeIndex = None):
     """
     Calculate the electrical grid consumption based on the solar production and total electricity consumption.
     
@@ -286,6 +437,8 @@ def get_solar_grid_consumption(solar_production, total_electr_consumption):
     Args:
         solar_production (dict): Solar production data in kW. With timestamp as key and production in kW as value.
         total_electr_consumption (dict): Total electricity consumption in kW. With timestamp as key and consumption in kW as value.
+        time_index (TimeIndex): Join the two dicts on the positions of this index (timestamps matched by instant) instead
+            of standardizing every key.
         
     Returns:
         dict: Dictionary containing the electrical grid consumption data. With timestamp as key and consumption in kW as value.
@@ -307,6 +460,17 @@ def get_solar_grid_consumption(solar_production, total_electr_consumption):
     
     
     
+    if time_index is not None:
+        # Thin adapter over get_solar_grid_balance on the positions of the time index
+        balance = get_solar_grid_balance(solar_kw=time_index.align(solar_production),
+                                         consumption_kw=time_index.align(total_electr_consumption))
+        common_positions = np.flatnonzero(balance["available"])
+        if not len(common_positions):
+            raise ValueError("No common timestamps found between solar production and total electricity consumption data in solar_grid_consumption.")
+        print(f"Number of common timestamps: {len(common_positions)} found in get_solar_grid_consumption.")
+        standardized = time_index.standardized()
+        return dict(zip([standardized[position] for position in common_positions.tolist()], balance["grid_kw"][common_positions].tolist()))
+    
     # Standardize timestamps in both dictionaries
     standardized_solar_production = {standardize_timestamp_format(ts): value for ts, value in solar_production.items()}
     standardized_total_electr_consumption = {standardize_timestamp_format(ts): value for ts, value in total_electr_consumption.items()}
@@ -336,6 +500,215 @@ def get_solar_grid_consumption(solar_production, total_electr_consumption):
     return grid_consumption
 
 
+def _category_stats(category_dict):
+    """Compute statistical measures and anomalies for a dictionary of device consumptions."""
+    values = list(category_dict.values())
+    n = len(values)
+    
+    # Handle case with no devices
+    if n == 0:
+        return {
+            "number_of_devices": 0,
+            "total_consumption": 0,
+            "mean_consumption": None,
+            "std_deviation": None,
+            "median_consumption": None,
+            "min_consumption": None,
+            "max_consumption": None,
+            "first_quartile": None,
+            "third_quartile": None,
+            "iqr": None,
+            "gini_coefficient": None,
+            "num_low_anomalies": 0,
+            "num_high_anomalies": 0,
+            "low_anomalies": [],
+            "high_anomalies": []
+        }
+    
+    # Basic statistics
+    total = sum(values)
+    mean = total / n
+    std = np.std(values, ddof=1) if n > 1 else 0  # Sample std dev; 0 if n=1
+    median = np.median(values)
+    min_val = min(values)
+    max_val = max(values)
+    q1 = np.percentile(values, 25)
+    q3 = np.percentile(values, 75)
+    iqr = q3 - q1
+    
+    # Gini coefficient
+    sorted_values = sorted(values)
+    sum_i_x = sum((i + 1) * x for i, x in enumerate(sorted_values))
+    gini = (2 * sum_i_x) / (n * total) - (n + 1) / n if total > 0 else 0
+    
+    # Anomaly detection using IQR method
+    lower_bound = q1 - 1.5 * iqr
+    upper_bound = q3 + 1.5 * iqr
+    low_anomalies = [device for device, consumption in category_dict.items() 
+                     if consumption < lower_bound]
+    high_anomalies = [device for device, consumption in category_dict.items() 
+                      if consumption > upper_bound]
+    num_low_anomalies = len(low_anomalies)
+    num_high_anomalies = len(high_anomalies)
+    
+    return {
+        "number_of_devices": n,
+        "total_consumption": total,
+        "mean_consumption": mean,
+        "std_deviation": std,
+        "median_consumption": median,
+        "min_consumption": min_val,
+        "max_consumption": max_val,
+        "first_quartile": q1,
+        "third_quartile": q3,
+        "iqr": iqr,
+        "gini_coefficient": gini,
+        "num_low_anomalies": num_low_anomalies,
+        "num_high_anomalies": num_high_anomalies,
+        "low_anomalies": sorted(low_anomalies),
+        "high_anomalies": sorted(high_anomalies)
+    }
+
+
+def _single_device_stats(value):
+    """_category_stats of one device with a finite float consumption, without numpy calls."""
+    total = 0 + value  # sum([value])
+    point = np.float64(value)
+    return {
+        "number_of_devices": 1,
+        "total_consumption": total,
+        "mean_consumption": total / 1,
+        "std_deviation": 0,
+        "median_consumption": np.float64(total),  # np.median averages the middle values: 0.0 for -0.0
+        "min_consumption": value,
+        "max_consumption": value,
+        "first_quartile": point,
+        "third_quartile": point,
+        "iqr": point - point,
+        "gini_coefficient": (2 * total) / total - 2.0 if total > 0 else 0,
+        # The IQR bounds are the value itself
+        "num_low_anomalies": 0,
+        "num_high_anomalies": 0,
+        "low_anomalies": [],
+        "high_anomalies": []
+    }
+
+
+def _row_sums(matrix):
+    """
+    Row sums of a float matrix in the exact order and rounding of the builtin sum() over each row (left to right,
+    with the Neumaier compensation sum() uses for floats since Python 3.12), so they match _category_stats bit for bit.
+    """
+    totals = np.zeros(matrix.shape[0])
+    if sys.version_info < (3, 12):
+        for column in matrix.T:
+            totals = totals + column
+        return totals
+    compensation = np.zeros(matrix.shape[0])
+    for column in matrix.T:
+        added = totals + column
+        compensation += np.where(np.abs(totals) >= np.abs(column), (totals - added) + column, (column - added) + totals)
+        totals = added
+    return np.where((compensation != 0) & np.isfinite(compensation), totals + compensation, totals)
+
+
+def _category_stats_block(devices, matrix):
+    """
+    _category_stats of many categories with the same number of devices at once.
+
+    Args:
+        devices (list): Device names of every row, in the order of the columns.
+        matrix (np.ndarray): Consumptions (rows × devices), finite floats, at least two devices.
+
+    Returns:
+        list: The stats dict of every row.
+    """
+    n = matrix.shape[1]
+    # Python float arithmetic in _category_stats: no warnings, and the Gini of rows with a total <= 0 is dropped below
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        totals = _row_sums(matrix)
+        means = totals / n
+        sum_i_x = _row_sums(np.sort(matrix, axis=1) * np.arange(1, n + 1))
+        ginis = (2 * sum_i_x) / (n * totals) - (n + 1) / n
+    stds = np.std(matrix, ddof=1, axis=1)
+    medians = np.median(matrix, axis=1)
+    q1s, q3s = np.percentile(matrix, [25, 75], axis=1)
+    iqrs = q3s - q1s
+    low = matrix < (q1s - 1.5 * iqrs)[:, None]
+    high = matrix > (q3s + 1.5 * iqrs)[:, None]
+    has_low, has_high = low.any(axis=1), high.any(axis=1)
+
+    totals, means, ginis = totals.tolist(), means.tolist(), ginis.tolist()
+    # First minimum / maximum of every row, like min() and max() (which matters for -0.0 and 0.0)
+    rows = np.arange(len(matrix))
+    mins, maxs = matrix[rows, matrix.argmin(axis=1)].tolist(), matrix[rows, matrix.argmax(axis=1)].tolist()
+    stats = []
+    for row, names in enumerate(devices):
+        low_anomalies = sorted(name for name, flag in zip(names, low[row]) if flag) if has_low[row] else []
+        high_anomalies = sorted(name for name, flag in zip(names, high[row]) if flag) if has_high[row] else []
+        stats.append({
+            "number_of_devices": n,
+            "total_consumption": totals[row],
+            "mean_consumption": means[row],
+            "std_deviation": stds[row],
+            "median_consumption": medians[row],
+            "min_consumption": mins[row],
+            "max_consumption": maxs[row],
+            "first_quartile": q1s[row],
+            "third_quartile": q3s[row],
+            "iqr": iqrs[row],
+            "gini_coefficient": ginis[row] if totals[row] > 0 else 0,
+            "num_low_anomalies": len(low_anomalies),
+            "num_high_anomalies": len(high_anomalies),
+            "low_anomalies": low_anomalies,
+            "high_anomalies": high_anomalies
+        })
+    return stats
+
+
+def _category_stats_batch(category_dicts):
+    """
+    _category_stats of a list of {device: consumption} dicts, the same results computed in batches.
+
+    Intervals with no device or one device (most of them) take a shortcut without numpy. The others are grouped by
+    number of devices into dense (intervals × devices) matrices, so every statistic is one numpy reduction per group
+    instead of several calls per interval. Anything else (ints, non-finite values) goes through _category_stats.
+    """
+    stats = [None] * len(category_dicts)
+    blocks = {}
+    for position, category_dict in enumerate(category_dicts):
+        n = len(category_dict)
+        if n == 1:
+            (value,) = category_dict.values()
+            if type(value) is float and math.isfinite(value):
+                stats[position] = _single_device_stats(value)
+                continue
+        elif n > 1:
+            values = list(category_dict.values())
+            if all(type(value) is float for value in values):
+                block = blocks.setdefault(n, ([], [], []))
+                block[0].append(position)
+                block[1].append(list(category_dict))
+                block[2].append(values)
+                continue
+        stats[position] = _category_stats(category_dict)
+
+    for positions, devices, rows in blocks.values():
+        matrix = np.array(rows)
+        finite = np.isfinite(matrix).all(axis=1)
+        if not finite.all():
+            for position, is_finite in zip(positions, finite):
+                if not is_finite:
+                    stats[position] = _category_stats(category_dicts[position])
+            positions = [position for position, is_finite in zip(positions, finite) if is_finite]
+            devices = [names for names, is_finite in zip(devices, finite) if is_finite]
+            matrix = matrix[finite]
+        if positions:
+            for position, row_stats in zip(positions, _category_stats_block(devices, matrix)):
+                stats[position] = row_stats
+    return stats
+
+
 def get_device_satistical_data(dev_dict: dict) -> dict:
     """
     Calculate statistical measures and anomalies from a dictionary of device energy consumption.
@@ -349,85 +722,13 @@ def get_device_satistical_data(dev_dict: dict) -> dict:
         dict: Dictionary containing statistical measures and anomaly information. Use timestamp as key 
               and the statistical data as value.
     """
-    
-    def _compute_category_stats(category_dict):
-        """Compute statistical measures and anomalies for a dictionary of device consumptions."""
-        values = list(category_dict.values())
-        n = len(values)
-        
-        # Handle case with no devices
-        if n == 0:
-            return {
-                "number_of_devices": 0,
-                "total_consumption": 0,
-                "mean_consumption": None,
-                "std_deviation": None,
-                "median_consumption": None,
-                "min_consumption": None,
-                "max_consumption": None,
-                "first_quartile": None,
-                "third_quartile": None,
-                "iqr": None,
-                "gini_coefficient": None,
-                "num_low_anomalies": 0,
-                "num_high_anomalies": 0,
-                "low_anomalies": [],
-                "high_anomalies": []
-            }
-        
-        # Basic statistics
-        total = sum(values)
-        mean = total / n
-        std = np.std(values, ddof=1) if n > 1 else 0  # Sample std dev; 0 if n=1
-        median = np.median(values)
-        min_val = min(values)
-        max_val = max(values)
-        q1 = np.percentile(values, 25)
-        q3 = np.percentile(values, 75)
-        iqr = q3 - q1
-        
-        # Gini coefficient
-        sorted_values = sorted(values)
-        sum_i_x = sum((i + 1) * x for i, x in enumerate(sorted_values))
-        gini = (2 * sum_i_x) / (n * total) - (n + 1) / n if total > 0 else 0
-        
-        # Anomaly detection using IQR method
-        lower_bound = q1 - 1.5 * iqr
-        upper_bound = q3 + 1.5 * iqr
-        low_anomalies = [device for device, consumption in category_dict.items() 
-                         if consumption < lower_bound]
-        high_anomalies = [device for device, consumption in category_dict.items() 
-                          if consumption > upper_bound]
-        num_low_anomalies = len(low_anomalies)
-        num_high_anomalies = len(high_anomalies)
-        
-        return {
-            "number_of_devices": n,
-            "total_consumption": total,
-            "mean_consumption": mean,
-            "std_deviation": std,
-            "median_consumption": median,
-            "min_consumption": min_val,
-            "max_consumption": max_val,
-            "first_quartile": q1,
-            "third_quartile": q3,
-            "iqr": iqr,
-            "gini_coefficient": gini,
-            "num_low_anomalies": num_low_anomalies,
-            "num_high_anomalies": num_high_anomalies,
-            "low_anomalies": sorted(low_anomalies),
-            "high_anomalies": sorted(high_anomalies)
-        }
-    
-    # Process each timestamp in the input dictionary
-    result = {}
-    for timestamp, data in dev_dict.items():
-        stats = {}
-        for category in ["electricity", "water"]:
-            # Use empty dict if category is missing
-            category_dict = data.get(category, {})
-            stats[category] = _compute_category_stats(category_dict)
-        result[timestamp] = stats
+    # Process every category of all the timestamps at once
+    result = {timestamp: {} for timestamp in dev_dict}
+    for category in ["electricity", "water"]:
+        # Use empty dict if category is missing
+        category_stats = _category_stats_batch([data.get(category, {}) for data in dev_dict.values()])
+        for timestamp, stats in zip(dev_dict, category_stats):
+            result[timestamp][category] = stats
     
     return result
 
@@ -441,9 +742,45 @@ def health_status_description(percentage):
     else:
         return "poor"
 
-def generate_output(houseID, solar_production, electricity_consumption, water_consumption, device_consumption, solar_grid_consumption, battery_data, device_statistical_data, temperature, humidity, air_quality, air_quality_description):
+def _output_record(houseID, ts, solar_production, grid_consumption, battery, device_consumption, statistics, water_consumption, temperature, humidity, air_quality, air_quality_description):
+    """Output entry of one timestamp (shared by generate_output and stream_output)."""
+    return {
+        "house_id": houseID,
+        "timestamp": ts,
+        "energy_management_sensors": {
+            "solar_power": {
+                "production": solar_production,
+                "grid_consumption": grid_consumption
+            },
+            "battery": {
+                "charge_level": battery["charge_level_kwh"],
+                "discharging_rate": battery["discharging_rate"],
+                "health_status": health_status_description(battery["health_status"])
+            },
+            "energy_efficiency": {
+                "device_consumption": device_consumption.get("electricity", {}),
+                "load_balancing": statistics["electricity"].get("gini_coefficient", 0.0),  # Default to 0.0
+                "statistics": statistics.get("electricity", {})
+            }
+        },
+        "water_management_sensors": {
+            "usage_tracking": water_consumption,
+            "device_consumption": device_consumption.get("water", {}),
+            "statistics": statistics.get("water", {})
+        },
+        "climate_and_environment_sensors": {
+            "temperature": temperature,
+            "humidity": humidity,
+            "air_quality": air_quality,
+            "air_quality_description": air_quality_description
+        }
+    }
+
+
+def generate_output(houseID, solar_production, electricity_consumption, water_consumption, device_consumption, solar_grid_consumption, battery_data, device_statistical_data, temperature, humidity, air_quality, air_quality_description, output_dir="sim_result", time_index: TimeIndex = None, output_format: str = "json", rotate_bytes: int = None, rotate_daily: bool = False, climate=None):
     """
-    Generate a single JSON file with sensor data for all timestamps, including all device statistics.
+    Generate the output file with sensor data for all timestamps, including all device statistics. Records are
+    written one at a time by an OutputWriter, which also writes <houseID>_output_manifest.json.
 
     Args:
         houseID (str): House ID.
@@ -454,10 +791,22 @@ def generate_output(houseID, solar_production, electricity_consumption, water_co
         solar_grid_consumption (dict): Grid consumption in kW, with timestamps as keys.
         battery_data (dict): Battery data, with timestamps as keys and nested battery stats.
         device_statistical_data (dict): Statistical data for devices, with timestamps as keys.
-        temperature (float): Temperature in Celsius (constant for now).
-        humidity (float): Humidity in percentage (constant for now).
+        temperature (float): Temperature in Celsius, the same in every record (without climate).
+        humidity (float): Humidity in percentage, the same in every record (without climate).
         air_quality (int): Air quality index (constant for now).
         air_quality_description (str): Air quality description (constant for now).
+        output_dir (str): Folder for the output file (default: "sim_result").
+        time_index (TimeIndex): Align every dict on this index (timestamps matched by instant) instead of standardizing,
+            intersecting and sorting the keys of every dict.
+        output_format (str): Output backend, one of output_backends.OUTPUT_FORMATS: "json" (one indented JSON array, the
+            default), "ndjson", "ndjson.gz", "ndjson.zst", "parquet", "arrow", "npz" or "columnar".
+        rotate_bytes (int): Start a new output file once the current one reaches this size (None: no size rotation).
+        rotate_daily (bool): One output file per day.
+        climate (TMYSeries): Temperature and humidity of every record from the hour of its timestamp, gathered for all
+            the records at once, instead of temperature and humidity.
+
+    Returns:
+        str: Path of the generated file, or of the manifest when the output is rotated into several files.
     """
     
     
@@ -466,11 +815,13 @@ def generate_output(houseID, solar_production, electricity_consumption, water_co
     # Standardize all input dictionaries' timestamps
     def safe_standardize_timestamps(data):
         """Standardize timestamps, skipping invalid keys."""
-        return {
+        standardized = {
             standardize_timestamp_format(ts): value
             for ts, value in data.items()
             if isinstance(ts, str) and is_valid_isoformat(ts)
         }
+        instrumentation.count("timestamps_standardized", len(standardized))
+        return standardized
 
     def is_valid_isoformat(timestamp):
         """Check if a string is a valid ISO 8601 timestamp."""
@@ -480,14 +831,21 @@ def generate_output(houseID, solar_production, electricity_consumption, water_co
         except ValueError:
             return False
 
+    def aligned_timestamps(data):
+        """Keys replaced by the standardized timestamps of the time index, in index order, keys outside it dropped."""
+        standardized = time_index.standardized()
+        return {standardized[position]: value for position, value in sorted(time_index.positions(data).items())}
+
+    standardize = safe_standardize_timestamps if time_index is None else aligned_timestamps
+
     # Standardize all input dictionaries' timestamps
-    solar_production_std = safe_standardize_timestamps(solar_production)
-    electricity_consumption_std = safe_standardize_timestamps(electricity_consumption)
-    water_consumption_std = safe_standardize_timestamps(water_consumption)
-    device_consumption_std = safe_standardize_timestamps(device_consumption)
-    solar_grid_consumption_std = safe_standardize_timestamps(solar_grid_consumption)
-    battery_data_std = safe_standardize_timestamps(battery_data)
-    device_statistical_data_std = safe_standardize_timestamps(device_statistical_data)
+    solar_production_std = standardize(solar_production)
+    electricity_consumption_std = standardize(electricity_consumption)
+    water_consumption_std = standardize(water_consumption)
+    device_consumption_std = standardize(device_consumption)
+    solar_grid_consumption_std = standardize(solar_grid_consumption)
+    battery_data_std = standardize(battery_data)
+    device_statistical_data_std = standardize(device_statistical_data)
 
     if not solar_production_std:
         print("Warning: Solar production data is empty. Filling with None.")
@@ -526,15 +884,6 @@ def generate_output(houseID, solar_production, electricity_consumption, water_co
 
 
 
-    # Debugging: Print the keys of each dictionary
-    print(f"Solar Production Keys: {list(solar_production_std.keys())}")
-    print(f"Electricity Consumption Keys: {list(electricity_consumption_std.keys())}")
-    print(f"Water Consumption Keys: {list(water_consumption_std.keys())}")
-    print(f"Device Consumption Keys: {list(device_consumption_std.keys())}")
-    print(f"Solar Grid Consumption Keys: {list(solar_grid_consumption_std.keys())}")
-    print(f"Battery Data Keys: {list(battery_data_std.keys())}")
-    print(f"Device Statistical Data Keys: {list(device_statistical_data_std.keys())}")
-
     # Check for empty dictionaries
     if not solar_production_std or not electricity_consumption_std or not water_consumption_std or not device_consumption_std or not solar_grid_consumption_std or not battery_data_std or not device_statistical_data_std:
         raise ValueError("One or more input datasets are empty. Cannot generate output.")
@@ -543,72 +892,225 @@ def generate_output(houseID, solar_production, electricity_consumption, water_co
     all_keys = [solar_production_std.keys(), electricity_consumption_std.keys(), water_consumption_std.keys(),
                 device_consumption_std.keys(), solar_grid_consumption_std.keys(), battery_data_std.keys(),
                 device_statistical_data_std.keys()]
-    common_timestamps = sorted(set.intersection(*map(set, all_keys)), key=lambda x: datetime.fromisoformat(x))
+    if time_index is None:
+        common_timestamps = sorted(set.intersection(*map(set, all_keys)), key=lambda x: datetime.fromisoformat(x))
+    else:
+        # Already in index order, no need to parse them again
+        common_keys = set.intersection(*map(set, all_keys))
+        common_timestamps = [ts for ts in time_index.standardized() if ts in common_keys]
 
     if not common_timestamps:
         raise ValueError("No common timestamps found across all input datasets.")
 
-    print(f"Generating output with {len(common_timestamps)} common timestamps.")
-
-    # List to hold data for all timestamps
-    output_data = []
-
-    for ts in common_timestamps:
-        # Build the output dictionary for this timestamp
-        ts_data = {
-            "house_id": houseID,
-            "timestamp": ts,
-            "energy_management_sensors": {
-                "solar_power": {
-                    "production": solar_production_std[ts],
-                    "grid_consumption": solar_grid_consumption_std[ts]
-                },
-                "battery": {
-                    "charge_level": battery_data_std[ts]["battery"]["charge_level_kwh"],
-                    "discharging_rate": battery_data_std[ts]["battery"]["discharging_rate"],
-                    "health_status": health_status_description(battery_data_std[ts]["battery"]["health_status"])
-                },
-                "energy_efficiency": {
-                    "device_consumption": device_consumption_std[ts].get("electricity", {}),
-                    "load_balancing": device_statistical_data_std[ts]["electricity"].get("gini_coefficient", 0.0),  # Default to 0.0
-                    "statistics": device_statistical_data_std[ts].get("electricity", {})
-                }
-            },
-            "water_management_sensors": {
-                "usage_tracking": water_consumption_std[ts],
-                "device_consumption": device_consumption_std[ts].get("water", {}),
-                "statistics": device_statistical_data_std[ts].get("water", {})
-            },
-            "climate_and_environment_sensors": {
-                "temperature": temperature,
-                "humidity": humidity,
-                "air_quality": air_quality,
-                "air_quality_description": air_quality_description
-            }
-        }
-        output_data.append(ts_data)
+    print(f"Generating output with {len(common_timestamps)} common timestamps "
+          f"({common_timestamps[0]} to {common_timestamps[-1]}).")
+
+    # Temperature and humidity of every record: one gather in the climate series, or the same values for all
+    if climate is not None:
+        temperatures, humidities = climate.gather([timestamp_epoch(ts) for ts in common_timestamps])
+        temperatures, humidities = temperatures.tolist(), humidities.tolist()
+    else:
+        temperatures, humidities = [temperature] * len(common_timestamps), [humidity] * len(common_timestamps)
 
-    # Generate new folder to save the outputs file
-    if not os.path.exists("sim_result"):
-        os.makedirs("sim_result")
+    # Every record is written as soon as it is built
+    with OutputWriter(houseID, output_dir, output_format=output_format, rotate_bytes=rotate_bytes, rotate_daily=rotate_daily) as writer:
+        for ts, record_temperature, record_humidity in zip(common_timestamps, temperatures, humidities):
+            # Build the output dictionary for this timestamp
+            writer.write(_output_record(houseID, ts,
+                                        solar_production=solar_production_std[ts],
+                                        grid_consumption=solar_grid_consumption_std[ts],
+                                        battery=battery_data_std[ts]["battery"],
+                                        device_consumption=device_consumption_std[ts],
+                                        statistics=device_statistical_data_std[ts],
+                                        water_consumption=water_consumption_std[ts],
+                                        temperature=record_temperature,
+                                        humidity=record_humidity,
+                                        air_quality=air_quality,
+                                        air_quality_description=air_quality_description))
 
-    # Save the output to a single file
-    output_file = f"./sim_result/{houseID}_output.json"
-    with open(output_file, "w") as f:
-        json.dump(output_data, f, indent=4)
+    return writer.output_file
 
-    print(f"Generated output file: {output_file}")
 
 
 
 
 
+########################################################## Streaming stages ##########################################################
+# Counterparts of the stages above for the records of npc.run_simulation_iter. Each one takes an iterator of records
+# and yields them with its own field added, so one interval goes through the whole chain before the next one is
+# simulated and nothing grows with the horizon.
 
-def complete_simulation_generate(name_of_config_file: str = "mpsds_generate_simulation/config_default.json"):
+def stream_solar_production(records, pannel_eff: float, num_pannels: int, panel_area_m2: float, lat: float, lon: float, tz: str):
+    """
+    Streaming counterpart of get_solar_production + the timestamp join: adds "solar_production" (kW) to every record.
+    Irradiance is computed one simulated day at a time, over the same horizon as the solar stage of the fast-forward
+    graph (until 01:00 local time of the next day), and timestamps are matched by instant, so the same records get a
+    solar production as in the array stages.
+    """
+    current_day, production = None, {}
+    for record in records:
+        moment = datetime.fromisoformat(record["timestamp"])
+        if moment.date() != current_day:
+            current_day = moment.date()
+            # Until 01:00 of the next day, so the whole simulated day is covered in summer time too
+            irradiance = solar_module.get_solar_irradiance(lat, lon, tz, current_day.isoformat(), f"{current_day + timedelta(days=1)} 01:00")
+            production = {int(datetime.fromisoformat(ts).timestamp()): value
+                          for ts, value in get_solar_production(irradiance, pannel_eff, num_pannels, panel_area_m2).items()}
+        solar_production = production.get(int(moment.timestamp()))
+        if solar_production is not None:
+            yield dict(record, solar_production=solar_production)
+
+
+def stream_grid_consumption(records):
+    """Streaming counterpart of get_solar_grid_consumption: adds "grid_consumption" (kW, negative with excess solar)."""
+    for record in records:
+        yield dict(record, grid_consumption=record["electricity"] - record["solar_production"])
+
+
+def stream_battery_data(records, battery_capacity_ah: float, voltage: float, charge_eff: float, discharge_eff: float, energy_loss_convrt: float, degrading_ratio: float, initial_state_charge: float = 100.0, history_file: str = "battery_history.json"):
+    """
+    Streaming counterpart of the fast-forward get_battery_data: adds "battery" (the status dict of battery_status).
+    Like get_battery_data, the first record only initializes the battery and every next one uses the energy of the
+    previous interval, so only the previous record is kept. The battery history is written when the records run out.
+    """
+    battery = BatteryModel(battery_capacity_ah=battery_capacity_ah,
+                           voltage=voltage,
+                           charge_eff=charge_eff,
+                           discharge_eff=discharge_eff,
+                           energy_loss_convrt=energy_loss_convrt,
+                           degrading_ratio=degrading_ratio,
+                           initial_state_charge=initial_state_charge,
+                           history_file=history_file)
+    previous, previous_moment = None, None
+    for record in records:
+        moment = datetime.fromisoformat(record["timestamp"])
+        if previous is None:
+            solar_energy_kwh, consumpt_energy_kwh = 0.0, 0.0
+        else:
+            delta_t_hours = (moment - previous_moment).total_seconds() / 3600.0
+            if delta_t_hours * 60 != 5:
+                print(f"Warning: Timestamp gap between {previous_moment} and {moment} is {delta_t_hours * 60} minutes, expected 5 minutes.")
+            solar_energy_kwh = previous["solar_production"] * delta_t_hours
+            consumpt_energy_kwh = previous["electricity"] * delta_t_hours
+
+        status = battery.update(solar_prod=solar_energy_kwh, total_consumpt=consumpt_energy_kwh, current_time=moment)
+        previous, previous_moment = record, moment
+        yield dict(record, battery=status["battery"])
+    battery.save()
+
+
+def stream_device_statistics(records):
+    """Streaming counterpart of get_device_satistical_data: adds "statistics" ({"electricity": {...}, "water": {...}})."""
+    for record in records:
+        timestamp = record["timestamp"]
+        yield dict(record, statistics=get_device_satistical_data({timestamp: record["devices"]})[timestamp])
+
+
+def stream_output(records, houseID, temperature, humidity, air_quality, air_quality_description, output_dir="sim_result", output_format: str = "json", rotate_bytes: int = None, rotate_daily: bool = False, climate=None):
+    """
+    Streaming counterpart of generate_output: writes the same output files (same layout, rotation and manifest) one
+    record at a time, and yields every record once it is written, with the file it went to as "output_file". With a
+    climate series (TMYSeries) the temperature and humidity of every record are looked up for its timestamp.
+    """
+    with OutputWriter(houseID, output_dir, output_format=output_format, rotate_bytes=rotate_bytes, rotate_daily=rotate_daily) as writer:
+        for record in records:
+            if climate is not None:
+                temperature, humidity = climate.at(timestamp_epoch(record["timestamp"]))
+            writer.write(_output_record(houseID, standardize_timestamp_format(record["timestamp"]),
+                                        solar_production=record["solar_production"],
+                                        grid_consumption=record["grid_consumption"],
+                                        battery=record["battery"],
+                                        device_consumption=record["devices"],
+                                        statistics=record["statistics"],
+                                        water_consumption=record["water"],
+                                        temperature=temperature,
+                                        humidity=humidity,
+                                        air_quality=air_quality,
+                                        air_quality_description=air_quality_description))
+            instrumentation.count("timestamps_standardized")
+            yield dict(record, output_file=writer.current_file)
+
+
+
+
+def complete_simulation_generate(name_of_config_file: str = "mpsds_generate_simulation/config_default.json", results_dir: str = "results", sim_result_dir: str = "sim_result", battery_history_file: str = "battery_history.json", seed=None, columnar: bool = False, checkpoint_path: str = None, checkpoint_every_days: float = 7, resume_from: str = None, streaming: bool = False, profile: bool = False, output_format: str = None, rotate_bytes: int = None, rotate_daily: bool = None, concurrent_stages: bool = True):
+    """
+    Run every stage of the simulation for one house config.
+
+    Args:
+        name_of_config_file (str): Path to the configuration JSON file.
+        results_dir (str): Folder for the NPC action log (user_data.json).
+        sim_result_dir (str): Folder for the final <house>_output.json.
+        battery_history_file (str): Battery history file used by the battery stage.
+        seed (int or numpy SeedSequence): Seed of the NPC random streams. With fresh output paths, the same config and
+            seed give byte-identical outputs.
+        columnar (bool): Keep the consumption, grid and battery stages on NumPy arrays (ColumnarResults) and only build
+            the timestamp dicts for the statistics and the output file.
+        checkpoint_path (str): Checkpoint file of the NPC simulation, saved every checkpoint_every_days simulated days.
+        resume_from (str): Checkpoint to continue the NPC simulation from (e.g. after Ctrl+C or a crash).
+        streaming (bool): Chain run_simulation_iter and the stream_* stages, so every interval is written to the output
+            as soon as it is simulated and memory does not grow with the horizon.
+        profile (bool): Also run cProfile and tracemalloc and write <house>_profile.pstats and
+            <house>_profile.tracemalloc next to the output.
+        output_format (str): Output backend (see generate_output). None takes "format" of the "output" section of the
+            config ({"format": "parquet", "rotate_mb": 64, "rotate_daily": false}), "json" without it.
+        rotate_bytes (int): Split the fast-forward output into files of about this size. None takes "rotate_mb" of the
+            config (no size rotation without it).
+        rotate_daily (bool): One fast-forward output file per simulated day. None takes "rotate_daily" of the config.
+            Always on in real time mode for the columnar formats, which are written when their file is closed.
+        concurrent_stages (bool): Run the independent fast-forward stages concurrently (solar irradiance in a worker
+            process, the climate requests in threads, the NPC simulation in the calling thread so Ctrl+C stops it at
+            once). False runs them one after the other, as profile=True does so cProfile sees every stage.
+
+    Returns:
+        dict: Summary of a fast-forward run (house id, output file (the manifest when the output is rotated), manifest file, totals,
+        critical path of the stages, and "instrumentation": wall/CPU time and peak memory per stage, the counters and the
+        stage timeline, also written to <sim_result_dir>/<house>_instrumentation.json).
+        Real-time runs keep one RealtimeEngine ticking on the 5-minute grid of the wall clock until interrupted (Ctrl+C),
+        appending one record per tick to the output, and then return the house id, output files, totals and the
+        latency of the ticks ("tick_latency", see tick_scheduler.TickLatency).
+    """
+    with Instrumentation(profile=profile) as run_instrumentation:
+        summary = _run_stages(name_of_config_file, results_dir, sim_result_dir, battery_history_file, seed, columnar,
+                              checkpoint_path, checkpoint_every_days, resume_from, streaming, output_format, rotate_bytes, rotate_daily,
+                              concurrent_stages and not profile)
+    if summary is None:
+        return None
+    
+    if battery_history_file and os.path.exists(battery_history_file):
+        run_instrumentation.count("bytes_written", os.path.getsize(battery_history_file))
+    report_path = os.path.join(sim_result_dir, summary["house_id"])
+    summary["instrumentation"] = run_instrumentation.summary()
+    summary["instrumentation_file"] = run_instrumentation.write(report_path + "_instrumentation.json")
+    if profile:
+        summary["profile_files"] = run_instrumentation.dump(report_path + "_profile")
+    
+    print(f"\033[92mRun took {run_instrumentation.wall_time_s:.2f} s ({run_instrumentation.cpu_time_s:.2f} s CPU). "
+          f"Instrumentation: {summary['instrumentation_file']}\033[0m")
+    return summary
+
+
+def _solar_irradiance_stage(lat, lon, tz, start_date, end_date):
+    """Solar stage of the fast-forward graph (run in a worker process): irradiance arrays of the whole horizon."""
+    # Until 01:00 of the end date (local time of tz), like stream_solar_production: the last simulated intervals are
+    # +01:00 and reach 00:55 of the end date in summer time
+    return solar_module.get_solar_irradiance_array(lat, lon, tz, start_date, f"{end_date} 01:00")
+
+
+def _run_stages(name_of_config_file, results_dir, sim_result_dir, battery_history_file, seed, columnar, checkpoint_path, checkpoint_every_days, resume_from, streaming, output_format, rotate_bytes, rotate_daily, concurrent_stages):
+    """Body of complete_simulation_generate (same arguments), with the stages reported to the instrumentation."""
     
     #Import the configuration file
     with open(name_of_config_file) as f:
         config = json.load(f)
+    
+    # Output backend: the arguments first, then the "output" section of the config
+    output_config = config.get("output", {})
+    output_format = resolve_format(output_format or output_config.get("format", "json"))
+    if rotate_bytes is None and output_config.get("rotate_mb"):
+        rotate_bytes = int(output_config["rotate_mb"] * 1024 * 1024)
+    if rotate_daily is None:
+        rotate_daily = output_config.get("rotate_daily", False)
         
     
     type_of_simulation = config["basic_parameters"]["type_of_simulation"]["type"] #Just fast_foward for now
@@ -625,98 +1127,247 @@ def complete_simulation_generate(name_of_config_file: str = "mpsds_generate_simu
         start_date = config["basic_parameters"]["type_of_simulation"]["start_date"] #Start date of the simulation
         end_date = config["basic_parameters"]["type_of_simulation"]["end_date"] #End date of the simulation
         
+        if streaming:
+            if columnar or checkpoint_path or resume_from:
+                raise ValueError("streaming cannot be combined with columnar or checkpoints.")
+            
+            # Climate first, the output is written while the simulation runs
+            instrumentation.begin_stage("climate")
+            print("Getting climate and environment sensors data...")
+            climate = getTempHomemade.get_tmy_series()
+            air_quality, air_quality_description = getTempHomemade.get_aq()
+            instrumentation.end_stage()
+            
+            # Every interval goes through all the stages, each one is timed without the stages it pulls from
+            house_id = config["basic_parameters"]["name"].lower().replace(" ", "_")
+            records = run_simulation_iter(config_data=config,
+                                          output_path=os.path.join(results_dir, "user_data.json"),
+                                          update_interval=300,
+                                          actions_in_minutes_flag=True,
+                                          start_date=start_date,
+                                          end_date=end_date,
+                                          seed=seed)
+            records = instrumentation.track("consumption", records)
+            records = stream_solar_production(records,
+                                              pannel_eff=config["solar_panels"]["panel_eff"],
+                                              num_pannels=config["solar_panels"]["number_of_panels"],
+                                              panel_area_m2=config["solar_panels"]["size_of_panels_m2"],
+                                              lat=latitud_barcelona, lon=longitud_barcelona, tz=tz)
+            records = instrumentation.track("solar", records)
+            records = instrumentation.track("grid", stream_grid_consumption(records))
+            records = stream_battery_data(records,
+                                          battery_capacity_ah=config["battery"]["capacity_ah"],
+                                          voltage=config["battery"]["voltage"],
+                                          charge_eff=config["battery"]["charging_efficiency"],
+                                          discharge_eff=config["battery"]["discharging_efficiency"],
+                                          energy_loss_convrt=config["battery"]["energy_loss_conversion"],
+                                          degrading_ratio=config["battery"]["degrading_ratio"],
+                                          initial_state_charge=config["battery"]["initial_state_of_charge_percent"],
+                                          history_file=battery_history_file)
+            records = instrumentation.track("battery", records)
+            records = instrumentation.track("statistics", stream_device_statistics(records))
+            records = stream_output(records, house_id, None, None, air_quality, air_quality_description, output_dir=sim_result_dir,
+                                    output_format=output_format, rotate_bytes=rotate_bytes, rotate_daily=rotate_daily, climate=climate)
+            records = instrumentation.track("output", records)
+            
+            output_file = manifest_path(sim_result_dir, house_id) if rotate_bytes is not None or rotate_daily else output_file_path(sim_result_dir, house_id, output_format)
+            summary = {"house_id": house_id, "output_file": output_file, "manifest_file": manifest_path(sim_result_dir, house_id), "start_date": start_date,
+                       "end_date": end_date, "number_of_intervals": 0, "total_electricity_kwh": 0, "total_water_liters": 0, "total_grid_consumption": 0}
+            for record in records:
+                summary["number_of_intervals"] += 1
+                summary["total_electricity_kwh"] += record["electricity"]
+                summary["total_water_liters"] += record["water"]
+                summary["total_grid_consumption"] += record["grid_consumption"]
+            instrumentation.count("ticks", summary["number_of_intervals"])
+            
+            print("\033[92mSimulation completed successfully!\033[0m")
+            return summary
+        
+        
+        # One time index for the whole run, the stages join their dicts on its positions
+        time_index = TimeIndex.from_horizon(start_date, end_date)
+        house_id = config["basic_parameters"]["name"].lower().replace(" ", "_")
         
+        # The stages form a small graph: solar, consumption and the climate fetches are independent and start
+        # together, every other stage starts as soon as its inputs are ready
         
         ################################## 1. Get solar production simulation ##################################
-        print("Getting solar production data...") 
-        solar_prod = get_solar_production(solar_irr_data_json=solar_module.get_solar_irradiance(latitud_barcelona, longitud_barcelona, tz, start_date, end_date),
-                                        pannel_eff=config["solar_panels"]["panel_eff"],
-                                        num_pannels=config["solar_panels"]["number_of_panels"],
-                                        panel_area_m2=config["solar_panels"]["size_of_panels_m2"])
-        print("\033[92mSolar production data obtained correctly\033[0m")
+        # pvlib clear-sky irradiance of the whole horizon (CPU-bound, small arrays out): a process stage.
+        # Aligned on the time index and turned into production by the grid stage.
+        solar_stage = partial(_solar_irradiance_stage, latitud_barcelona, longitud_barcelona, tz, start_date, end_date)
         
         ####################################### 2. Get grid consumption ######################################## 
         
-        print("Getting total consumption data...")
-        #run the simulation to get total consuption
-        total_consumption = get_total_consumption(config_file_data=config,
-                                                output_file="results/user_data.json",
-                                                interval=300,
-                                                minutes=True,
-                                                start_date=start_date,
-                                                end_date=end_date)
-        print("\033[92mTotal consumption data obtained correctly\033[0m")
+        def consumption_stage():
+            print("Getting total consumption data...")
+            #run the simulation to get total consuption
+            total_consumption = get_total_consumption(config_file_data=config,
+                                                    output_file=os.path.join(results_dir, "user_data.json"),
+                                                    interval=300,
+                                                    minutes=True,
+                                                    start_date=start_date,
+                                                    end_date=end_date,
+                                                    seed=seed,
+                                                    columnar=columnar,
+                                                    checkpoint_path=checkpoint_path,
+                                                    checkpoint_every_days=checkpoint_every_days,
+                                                    resume_from=resume_from)
+            print("\033[92mTotal consumption data obtained correctly\033[0m")
+            return total_consumption
         
         #total_consumption[0] is the total electricity consumption (a dict with timestamps as keys and consumption in kW as values)
         #total_consumption[1] is the total water consumption in liters (a dict with timestamps as keys and consumption in liters as values)
         #total_consumption[2] is the device consumption (a dict with device names as keys and consumption in kW as values)
+        #With columnar=True it is a ColumnarResults until the statistics stage
         
-        print(f"Getting solar grid consumption data...")
-        grid_consumption = get_solar_grid_consumption(solar_production=solar_prod,
-                                                    total_electr_consumption=total_consumption[0])
-        print("\033[92mSolar grid consumption data obtained correctly\033[0m")
-        
+        def grid_stage(irradiance, total_consumption):
+            print("Getting solar production data...")
+            # Whole horizon as arrays, aligned once on the time index
+            irradiance_epochs, ghi = irradiance
+            solar_values = get_solar_production_array(ghi=time_index.align_epochs(irradiance_epochs, ghi),
+                                                      pannel_eff=config["solar_panels"]["panel_eff"],
+                                                      num_pannels=config["solar_panels"]["number_of_panels"],
+                                                      panel_area_m2=config["solar_panels"]["size_of_panels_m2"])
+            print("\033[92mSolar production data obtained correctly\033[0m")
+            
+            print(f"Getting solar grid consumption data...")
+            consumption_values = total_consumption.electricity if columnar else time_index.align(total_consumption[0])
+            balance = get_solar_grid_balance(solar_kw=solar_values, consumption_kw=consumption_values)
+            if not balance["available"].any():
+                raise ValueError("No common timestamps found between solar production and total electricity consumption data in solar_grid_consumption.")
+            print(f"Number of common timestamps: {int(balance['available'].sum())} found in get_solar_grid_consumption.")
+            
+            # Dicts for the battery, statistics and output stages
+            timestamps = time_index.isoformat()
+            solar_prod = {ts: value for ts, value, ok in zip(timestamps, solar_values.tolist(), ~np.isnan(solar_values)) if ok}
+            grid_consumption = {ts: value for ts, value, ok in zip(timestamps, balance["grid_kw"].tolist(), balance["available"]) if ok}
+            print("\033[92mSolar grid consumption data obtained correctly\033[0m")
+            return {"solar_values": solar_values, "solar_prod": solar_prod, "grid_consumption": grid_consumption, "balance": balance}
         
         
         ######################################## 3. Get battery data ###########################################
         
-        #Get the battery data
-        print("Getting battery data...")
-        battery_data = get_battery_data(battery_capacity_ah=config["battery"]["capacity_ah"],
-                                        voltage=config["battery"]["voltage"],
-                                        solar_prod=solar_prod,
-                                        total_consumpt=total_consumption[0],
-                                        charge_eff=config["battery"]["charging_efficiency"],
-                                        discharge_eff=config["battery"]["discharging_efficiency"],
-                                        energy_loss_convrt=config["battery"]["energy_loss_conversion"],
-                                        degrading_ratio=config["battery"]["degrading_ratio"],
-                                        initial_state_charge=config["battery"]["initial_state_of_charge_percent"],
-                                        type_of_simulation=type_of_simulation)
-        print("\033[92mBattery data obtained correctly\033[0m")
+        def battery_stage(grid, total_consumption):
+            print("Getting battery data...")
+            if columnar:
+                battery_data = get_battery_data_columnar(battery_capacity_ah=config["battery"]["capacity_ah"],
+                                                         voltage=config["battery"]["voltage"],
+                                                         solar_values=grid["solar_values"],
+                                                         results=total_consumption,
+                                                         charge_eff=config["battery"]["charging_efficiency"],
+                                                         discharge_eff=config["battery"]["discharging_efficiency"],
+                                                         energy_loss_convrt=config["battery"]["energy_loss_conversion"],
+                                                         degrading_ratio=config["battery"]["degrading_ratio"],
+                                                         initial_state_charge=config["battery"]["initial_state_of_charge_percent"],
+                                                         history_file=battery_history_file)
+            else:
+                battery_data = get_battery_data(battery_capacity_ah=config["battery"]["capacity_ah"],
+                                                voltage=config["battery"]["voltage"],
+                                                solar_prod=grid["solar_prod"],
+                                                total_consumpt=total_consumption[0],
+                                                charge_eff=config["battery"]["charging_efficiency"],
+                                                discharge_eff=config["battery"]["discharging_efficiency"],
+                                                energy_loss_convrt=config["battery"]["energy_loss_conversion"],
+                                                degrading_ratio=config["battery"]["degrading_ratio"],
+                                                initial_state_charge=config["battery"]["initial_state_of_charge_percent"],
+                                                type_of_simulation=type_of_simulation,
+                                                history_file=battery_history_file,
+                                                time_index=time_index)
+            print("\033[92mBattery data obtained correctly\033[0m")
+            return battery_data
         
         
         ###################################### 4. Get device consumption #######################################
         
-        device_consumption = total_consumption[2]
-        
-        print(f"Getting device statistical data...")
-        device_statistical_data = get_device_satistical_data(dev_dict=device_consumption)
-        print("\033[92mDevice statistical data obtained correctly\033[0m")
-        
-        
-        ###################################### 5. Get water consumption #######################################
+        def statistics_stage(total_consumption):
+            if columnar:
+                # Dicts only for the statistics and the output file
+                total_consumption = total_consumption.to_dicts()
+            
+            print(f"Getting device statistical data...")
+            device_statistical_data = get_device_satistical_data(dev_dict=total_consumption[2])
+            print("\033[92mDevice statistical data obtained correctly\033[0m")
+            return total_consumption, device_statistical_data
         
-        water_consumption = total_consumption[1]
         
         ###################################### 5. Get climate and environment sensors #########################
+        # Two network requests, each made once (and cached): thread stages. The TMY series covers every interval
+        
+        def temperature_humidity_stage():
+            print("Getting climate and environment sensors data...")
+            return getTempHomemade.get_tmy_series()
         
-        print("Getting climate and environment sensors data...")
-        temperature = getTempHomemade.get_temp_hum()[0]
-        humidity = getTempHomemade.get_temp_hum()[1]
-        air_quality = getTempHomemade.get_aq()[0]
-        air_quality_description = getTempHomemade.get_aq()[1]
-        print("\033[92mClimate and environment sensors data obtained correctly\033[0m")
+        def air_quality_stage():
+            return getTempHomemade.get_aq()
         
             
         ###################################### 6. Generate output file ########################################
-        print("Generating output file...")
-        generate_output(
-            houseID=config["basic_parameters"]["name"].lower().replace(" ", "_"),
-            solar_production=solar_prod,
-            electricity_consumption=total_consumption[0],  # Pass total electricity consumption
-            water_consumption=water_consumption,        # Pass total water consumption
-            device_consumption=device_consumption,
-            solar_grid_consumption=grid_consumption,
-            battery_data=battery_data,
-            device_statistical_data=device_statistical_data,
-            temperature=temperature,
-            humidity=humidity,
-            air_quality=air_quality,
-            air_quality_description=air_quality_description
-        )
-        print("\033[92mOutput file generated correctly\033[0m")
+        
+        def output_stage(grid, battery_data, statistics, climate, air_quality):
+            total_consumption, device_statistical_data = statistics
+            print("Generating output file...")
+            output_file = generate_output(
+                houseID=house_id,
+                solar_production=grid["solar_prod"],
+                electricity_consumption=total_consumption[0],  # Pass total electricity consumption
+                water_consumption=total_consumption[1],        # Pass total water consumption
+                device_consumption=total_consumption[2],
+                solar_grid_consumption=grid["grid_consumption"],
+                battery_data=battery_data,
+                device_statistical_data=device_statistical_data,
+                temperature=None,
+                humidity=None,
+                air_quality=air_quality[0],
+                air_quality_description=air_quality[1],
+                output_dir=sim_result_dir,
+                time_index=time_index,
+                output_format=output_format,
+                rotate_bytes=rotate_bytes,
+                rotate_daily=rotate_daily,
+                climate=climate
+            )
+            print("\033[92mOutput file generated correctly\033[0m")
+            return output_file
+        
+        graph = StageGraph()
+        graph.add("solar", solar_stage, kind="process")
+        # In the calling thread: Ctrl+C stops the NPC simulation at once, with its checkpoint and resume hint
+        graph.add("consumption", consumption_stage, kind="main")
+        graph.add("temperature_humidity", temperature_humidity_stage)
+        graph.add("air_quality", air_quality_stage)
+        graph.add("grid", grid_stage, inputs=("solar", "consumption"))
+        graph.add("battery", battery_stage, inputs=("grid", "consumption"))
+        graph.add("statistics", statistics_stage, inputs=("consumption",))
+        graph.add("output", output_stage, inputs=("grid", "battery", "statistics", "temperature_humidity", "air_quality"))
+        stage_results = graph.run(concurrent=concurrent_stages)
+        
+        for name, entry in graph.timeline.items():
+            instrumentation.record_stage(name, entry["wall_time_s"], entry["cpu_time_s"], entry["peak_memory_mb"], entry["memory_measure"])
+        instrumentation.note("stage_graph", graph.report())
+        critical_path, critical_path_s = graph.critical_path()
+        print(f"Critical path: {' -> '.join(critical_path)} ({critical_path_s:.2f} s)")
+        
+        total_consumption = stage_results["statistics"][0]
+        grid_consumption = stage_results["grid"]["grid_consumption"]
+        balance = stage_results["grid"]["balance"]
+        instrumentation.count("ticks", len(total_consumption[0]))
         
         print("\033[92mSimulation completed successfully!\033[0m")
+        
+        return {
+            "house_id": house_id,
+            "output_file": stage_results["output"],
+            "manifest_file": manifest_path(sim_result_dir, house_id),
+            "start_date": start_date,
+            "end_date": end_date,
+            "number_of_intervals": len(total_consumption[0]),
+            "total_electricity_kwh": sum(total_consumption[0].values()),
+            "total_water_liters": sum(total_consumption[1].values()),
+            "total_grid_consumption": sum(grid_consumption.values()),
+            "energy_balance": {key: balance[key] for key in ("solar_kwh", "consumption_kwh", "import_kwh", "export_kwh", "self_consumption_kwh",
+                                                              "self_consumption_ratio", "self_sufficiency_ratio")},
+            "critical_path": critical_path
+        }
     
     elif type_of_simulation == "real_time":
          
@@ -727,96 +1378,106 @@ def complete_simulation_generate(name_of_config_file: str = "mpsds_generate_simu
         #Update every 5m 
         interval = 300
         
-        while True:
-            ################################## 1. Get solar production simulation ##################################
-            print("Getting solar production data...") 
-            solar_prod = get_solar_production(solar_irr_data_json=get_real_time_solar_irradiance(latitud_barcelona, longitud_barcelona, tz),
-                                            pannel_eff=config["solar_panels"]["panel_eff"],
-                                            num_pannels=config["solar_panels"]["number_of_panels"],
-                                            panel_area_m2=config["solar_panels"]["size_of_panels_m2"])
-            print("\033[92mSolar production data obtained correctly\033[0m")
-            
-            
-            ####################################### 2. Get total consumption ########################################
-            
-            print("Getting total consumption data...")
-            total_consumption = get_total_consumption(config_file_data=config, output_file="results/user_data.json")
-            print("\033[92mTotal consumption data obtained correctly\033[0m")
-
-            # Check if total electricity consumption is empty or None
-            if not isinstance(total_consumption[0], dict) or not total_consumption[0] or all(value == 0 for value in total_consumption[0].values()):
-                print("\033[93mElectricity consumption is 0 or None. Setting grid consumption to 0.\033[0m")
-                grid_consumption = {timestamp: 0 for timestamp in solar_prod.keys()}
-            else:
-                print(f"Getting solar grid consumption data...")
-                grid_consumption = get_solar_grid_consumption(
-                    solar_production=solar_prod,
-                    total_electr_consumption=total_consumption[0]
-                )
-            print("\033[92mSolar grid consumption data obtained correctly\033[0m")
-
-            
-            
-            
-            ######################################## 3. Get battery data ###########################################
+        # House, NPCs, battery, climate readings, clear-sky irradiance and the output file live across ticks, every
+        # tick only computes its own interval
+        house_id = config["basic_parameters"]["name"].lower().replace(" ", "_")
+        engine = RealtimeEngine(config_data=config,
+                                output_path=os.path.join(results_dir, "user_data.json"),
+                                seed=seed,
+                                step_seconds=interval)
+        battery = BatteryModel(battery_capacity_ah=config["battery"]["capacity_ah"],
+                               voltage=config["battery"]["voltage"],
+                               charge_eff=config["battery"]["charging_efficiency"],
+                               discharge_eff=config["battery"]["discharging_efficiency"],
+                               energy_loss_convrt=config["battery"]["energy_loss_conversion"],
+                               degrading_ratio=config["battery"]["degrading_ratio"],
+                               initial_state_charge=config["battery"]["initial_state_of_charge_percent"],
+                               history_file=battery_history_file)
+        irradiance = ClearSkyIrradiance(latitud_barcelona, longitud_barcelona, tz)
+        if output_format in COLUMNAR_FORMATS and not rotate_daily:
+            # Columnar files are only written when closed: without rotation the loop would keep every record until Ctrl+C
+            print(f"\033[93mThe {output_format} output format is written when its file is closed: one file per day in real time mode.\033[0m")
+            rotate_daily = True
+        writer = OutputWriter(house_id, sim_result_dir, output_format=output_format, rotate_bytes=rotate_bytes, rotate_daily=rotate_daily)
         
-            #Get the battery data
-            print("Getting battery data...")
-            battery_data = get_battery_data(battery_capacity_ah=config["battery"]["capacity_ah"],
-                                            voltage=config["battery"]["voltage"],
-                                            solar_prod=solar_prod,
-                                            total_consumpt=total_consumption[0],
-                                            charge_eff=config["battery"]["charging_efficiency"],
-                                            discharge_eff=config["battery"]["discharging_efficiency"],
-                                            energy_loss_convrt=config["battery"]["energy_loss_conversion"],
-                                            degrading_ratio=config["battery"]["degrading_ratio"],
-                                            initial_state_charge=config["battery"]["initial_state_of_charge_percent"],
-                                            type_of_simulation=type_of_simulation)
-            print("\033[92mBattery data obtained correctly\033[0m")
-            
-            ###################################### 4. Get device consumption #######################################
+        # Deadlines on the 5-minute grid of the wall clock, whatever every tick takes
+        scheduler = TickScheduler(interval)
+        latency = TickLatency()
         
-            device_consumption = total_consumption[2]
-            
-            print(f"Getting device statistical data...")
-            device_statistical_data = get_device_satistical_data(dev_dict=device_consumption)
-            print("\033[92mDevice statistical data obtained correctly\033[0m")
-            
-            
-            ###################################### 5. Get water consumption #######################################
-            
-            water_consumption = total_consumption[1]
-            
-            ###################################### 5. Get climate and environment sensors #########################
-            
-            print("Getting climate and environment sensors data...")
-            temperature = getTempHomemade.get_temp_hum()[0]
-            humidity = getTempHomemade.get_temp_hum()[1]
-            air_quality = getTempHomemade.get_aq()[0]
-            air_quality_description = getTempHomemade.get_aq()[1]
-            print("\033[92mClimate and environment sensors data obtained correctly\033[0m")
-            
-            ###################################### 6. Generate output file ########################################
-            print("Generating output file...")
-            generate_output(
-                houseID=config["basic_parameters"]["name"].lower().replace(" ", "_"),
-                solar_production=solar_prod,
-                electricity_consumption={ts: total_consumption[0] for ts in solar_prod.keys()},  # Convert float to dict
-                water_consumption={ts: total_consumption[1] for ts in solar_prod.keys()},  # Convert float to dict
-                device_consumption=device_consumption,
-                solar_grid_consumption=grid_consumption,
-                battery_data=battery_data,
-                device_statistical_data=device_statistical_data,
-                temperature=temperature,
-                humidity=humidity,
-                air_quality=air_quality,
-                air_quality_description=air_quality_description
-            )
-            print("\033[92mOutput file generated correctly\033[0m")
-            
-            print("\033[92mSimulation completed successfully!\033[0m")
-            
-            time.sleep(interval)
+        try:
+            while True:
+                deadline, lag, missed = scheduler.wait()
+                latency.start_tick(lag, missed)
+                
+                ################################## 1. Get solar production simulation ##################################
+                timestamp, ghi = irradiance.at(deadline)
+                solar_kw = float(get_solar_production_array(ghi=ghi,
+                                                            pannel_eff=config["solar_panels"]["panel_eff"],
+                                                            num_pannels=config["solar_panels"]["number_of_panels"],
+                                                            panel_area_m2=config["solar_panels"]["size_of_panels_m2"]))
+                latency.lap("solar")
+                
+                ####################################### 2. Get total consumption ########################################
+                
+                # Consumption since the previous tick, NPCs moved to the (5-minute aligned) solar timestamp
+                moment = datetime.fromisoformat(timestamp)
+                electricity_used, water_used, device_usage = engine.tick(moment)
+                latency.lap("consumption")
+                
+                ######################################## 3. Get battery data ###########################################
+                
+                battery_status = battery.update(solar_prod=solar_kw, total_consumpt=electricity_used, current_time=moment)
+                if engine.ticks % engine.compact_every_ticks == 0:
+                    battery.save()
+                latency.lap("battery")
+                
+                ###################################### 4. Get device consumption #######################################
+                
+                device_statistical_data = get_device_satistical_data(dev_dict={timestamp: device_usage})[timestamp]
+                latency.lap("statistics")
+                
+                ###################################### 5. Generate output file ########################################
+                
+                # Appended to the output file and flushed, so it can be read while the loop runs. Climate and air
+                # quality are the engine readings (TMY hour of the tick, air quality refreshed every hour)
+                writer.write(_output_record(house_id, standardize_timestamp_format(timestamp),
+                                            solar_production=solar_kw,
+                                            grid_consumption=electricity_used - solar_kw,
+                                            battery=battery_status["battery"],
+                                            device_consumption=device_usage,
+                                            statistics=device_statistical_data,
+                                            water_consumption=water_used,
+                                            temperature=engine.house.temperature,
+                                            humidity=engine.house.humidity,
+                                            air_quality=engine.air_quality,
+                                            air_quality_description=engine.air_quality_description))
+                writer.flush()
+                latency.lap("output")
+                
+                tick = latency.end_tick()
+                missed_note = f", {missed} missed" if missed else ""
+                print(f"\033[92m[{timestamp}] Tick {engine.ticks}: {electricity_used:.4f} kWh, {water_used:.2f} liters "
+                      f"({tick['compute_s'] * 1000:.1f} ms, started {tick['lag_s'] * 1000:.0f} ms late{missed_note})\033[0m")
+                if latency.ticks % engine.compact_every_ticks == 0:
+                    print(f"Tick latency: {latency.report()}")
+        except KeyboardInterrupt:
+            print("\033[93mReal time simulation stopped by user.\033[0m")
+        finally:
+            engine.close()
+            battery.save()
+            writer.close()
+        
+        print(f"Tick latency: {latency.report()}")
+        instrumentation.note("tick_latency", latency.summary())
+        return {
+            "house_id": house_id,
+            "output_file": writer.output_file,
+            "manifest_file": writer.manifest_file,
+            "number_of_intervals": writer.records_written,
+            "total_electricity_kwh": engine.total_electricity_used_kwh,
+            "total_water_liters": engine.total_water_used_liters,
+            "tick_latency": latency.summary()
+        }
         
         
         
@@ -829,21 +1490,44 @@ def complete_simulation_generate(name_of_config_file: str = "mpsds_generate_simu
 
 if __name__ == "__main__":
     
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Generate the simulation of a house.", usage="python puppeteer.py [config_file] [--seed SEED] [--columnar | --streaming] [--checkpoint FILE] [--resume FILE] [--profile] [--serial-stages] [--output-format FORMAT] [--rotate-mb MB] [--rotate-daily] [--offline-climate [FIXTURES]]")
+    parser.add_argument("config_file", nargs="?", default=None, help="Configuration file (default configuration if not given)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the NPC random streams, for reproducible runs")
+    parser.add_argument("--columnar", action="store_true", help="Keep the fast-forward stages on NumPy arrays")
+    parser.add_argument("--streaming", action="store_true", help="Stream every interval through all the stages as it is simulated")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file of the NPC simulation")
+    parser.add_argument("--checkpoint-every", type=float, default=7, help="Simulated days between checkpoints (default: 7)")
+    parser.add_argument("--resume", default=None, help="Checkpoint file to resume the NPC simulation from")
+    parser.add_argument("--profile", action="store_true", help="Also dump cProfile and tracemalloc snapshots next to the output")
+    parser.add_argument("--serial-stages", action="store_true", help="Run the fast-forward stages one after the other")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default=None, help="Output file format (default: the config, else json)")
+    parser.add_argument("--rotate-mb", type=float, default=None, help="Start a new output file every MB megabytes")
+    parser.add_argument("--rotate-daily", action="store_true", default=None, help="One output file per simulated day")
+    parser.add_argument("--offline-climate", nargs="?", const="", default=None, metavar="FIXTURES",
+                        help="Climate and air quality from a fixtures file (default: benchmark_fixtures.json), no network requests")
+    args = parser.parse_args()
+    if args.offline_climate is not None:
+        getTempHomemade.set_provider("offline", fixtures_file=args.offline_climate or None)
+    rotate_bytes = int(args.rotate_mb * 1024 * 1024) if args.rotate_mb else None
     
-    # Check command-line arguments
-    if len(sys.argv) == 1:
+    if args.config_file is None:
         # No arguments provided, use default config
         print("No configuration file provided. Using default configuration.")
-        complete_simulation_generate()
-    elif len(sys.argv) == 2:
-        # Configuration file provided as an argument
-        print(f"Using configuration file: {sys.argv[1]}")
-        config_file = sys.argv[1]
-        complete_simulation_generate(config_file)
+        complete_simulation_generate(seed=args.seed, columnar=args.columnar, checkpoint_path=args.checkpoint,
+                                     checkpoint_every_days=args.checkpoint_every, resume_from=args.resume,
+                                     streaming=args.streaming, profile=args.profile, output_format=args.output_format,
+                                     rotate_bytes=rotate_bytes, rotate_daily=args.rotate_daily,
+                                     concurrent_stages=not args.serial_stages)
     else:
-        print("Usage: python puppeteer.py [config_file]")
-        exit(1)
+        # Configuration file provided as an argument
+        print(f"Using configuration file: {args.config_file}")
+        complete_simulation_generate(args.config_file, seed=args.seed, columnar=args.columnar, checkpoint_path=args.checkpoint,
+                                     checkpoint_every_days=args.checkpoint_every, resume_from=args.resume,
+                                     streaming=args.streaming, profile=args.profile, output_format=args.output_format,
+                                     rotate_bytes=rotate_bytes, rotate_daily=args.rotate_daily,
+                                     concurrent_stages=not args.serial_stages)
 
         
     
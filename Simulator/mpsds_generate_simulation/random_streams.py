@@ -0,0 +1,98 @@
+"""
+#########################################################################################################################################################
+
+Seeded random streams for the NPC simulation.
+
+A run seed is turned into a numpy SeedSequence and spawned into one independent Generator per NPC (and one child
+sequence per house in fleet runs), so the same config + seed gives the same outputs whatever the worker process doing
+the run, and every NPC gets the same draws in the NPC class and in the NPCPopulation engine. Draws are pre-generated in blocks instead of one call at a time.
+
+#########################################################################################################################################################
+"""
+
+import numpy as np
+
+
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def seed_sequence(seed=None):
+    """Turn None (fresh entropy), an int or an existing SeedSequence into a SeedSequence."""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def spawn_seeds(seed, count):
+    """Independent child SeedSequences, e.g. one per house of a fleet or one per NPC of a house."""
+    return seed_sequence(seed).spawn(count)
+
+
+class RandomStream:
+    """
+    Uniform draws of one numpy Generator, served from a pre-generated block.
+
+    choice() and randint() map a single uniform draw, so the NPC class and the NPCPopulation engine consume the
+    stream of an NPC in exactly the same way.
+    """
+
+    def __init__(self, seed=None, block_size=DEFAULT_BLOCK_SIZE):
+        self.generator = np.random.default_rng(seed_sequence(seed))
+        self.block_size = block_size
+        self.block = []
+        self.position = 0
+
+    def random(self):
+        """Next uniform draw in [0, 1)."""
+        if self.position >= len(self.block):
+            self.block = self.generator.random(self.block_size).tolist()
+            self.position = 0
+        value = self.block[self.position]
+        self.position += 1
+        return value
+
+    def getstate(self):
+        """Generator state plus the unread part of the block (for checkpoints)."""
+        return {"generator": self.generator.bit_generator.state, "block": self.block[self.position:]}
+
+    def setstate(self, state):
+        self.generator.bit_generator.state = state["generator"]
+        self.block = list(state["block"])
+        self.position = 0
+
+    def choice(self, options):
+        """Pick one element of a non-empty sequence."""
+        return options[int(self.random() * len(options))]
+
+    def randint(self, low, high):
+        """Random integer N such that low <= N <= high (like random.randint)."""
+        return low + int(self.random() * (high - low + 1))
+
+
+def spawn_streams(seed, count, block_size=DEFAULT_BLOCK_SIZE):
+    """One RandomStream per NPC, all derived from the run seed."""
+    return [RandomStream(child, block_size) for child in spawn_seeds(seed, count)]
+
+
+class BlockStreams:
+    """
+    The RandomStreams of many NPCs as one (N, block_size) matrix, for the vectorized NPCPopulation engine.
+    Row i yields the same values, in the same order, as spawn_streams(seed, N)[i].
+    """
+
+    def __init__(self, seed, count, block_size=DEFAULT_BLOCK_SIZE):
+        self.generators = [np.random.default_rng(child) for child in spawn_seeds(seed, count)]
+        self.block_size = block_size
+        self.blocks = np.array([generator.random(block_size) for generator in self.generators]).reshape(count, block_size)
+        self.positions = np.zeros(count, dtype=np.int64)
+
+    def draw(self, indexes):
+        """Next uniform draw of each NPC in `indexes` (distinct indexes)."""
+        indexes = np.asarray(indexes, dtype=np.int64)
+        exhausted = indexes[self.positions[indexes] >= self.block_size]
+        for index in exhausted:
+            self.blocks[index] = self.generators[index].random(self.block_size)
+            self.positions[index] = 0
+        values = self.blocks[indexes, self.positions[indexes]]
+        self.positions[indexes] += 1
+        return values
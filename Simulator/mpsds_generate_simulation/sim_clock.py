@@ -0,0 +1,80 @@
+"""
+#########################################################################################################################################################
+
+Simulation time as integer seconds since the epoch.
+
+The fast-forward engines keep every instant (NPC time, action start/end, toilet deadline, interval start) as epoch
+seconds, so the hot loop only adds and compares integers. Wall-clock fields (second of the day for the out-of-home
+schedules) and ISO strings are computed from a LocalTime: one per UTC offset, with the ISO date and time-of-day
+parts cached, so a timestamp string is only built when something is serialized (action log, results dicts).
+
+Fixed-offset timezones (datetime.timezone, what the simulation and fromisoformat use) take the fast path; naive
+datetimes (local time) and other tzinfo implementations go through datetime and give the same values.
+
+#########################################################################################################################################################
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+
+SECONDS_PER_DAY = 86400
+EPOCH_DATE = date(1970, 1, 1)
+
+
+def to_epoch(moment):
+    """Seconds since the epoch of an aware (or naive, local time) datetime; an int unless it has microseconds."""
+    seconds = moment.timestamp()
+    return int(seconds) if seconds.is_integer() else seconds
+
+
+class LocalTime:
+    """
+    Wall-clock view of epoch seconds in one timezone.
+
+    Args:
+        tz (tzinfo): Timezone of the wall clock; None for naive local time.
+    """
+
+    def __init__(self, tz):
+        self.tz = tz
+        # Fast path only for fixed offsets, the others may change offset over the year
+        self.fixed = isinstance(tz, timezone)
+        self.offset = int(tz.utcoffset(None).total_seconds()) if self.fixed else None
+        self.suffix = datetime(2000, 1, 1, tzinfo=tz).isoformat()[19:] if self.fixed else None
+        self._days = {}
+        self._times = {}
+
+    def datetime(self, epoch):
+        return datetime.fromtimestamp(epoch, self.tz)
+
+    def second_of_day(self, epoch):
+        """Wall-clock second of the day (0 to 86399, with the fraction for non-integer epochs)."""
+        if self.fixed:
+            return (epoch + self.offset) % SECONDS_PER_DAY
+        moment = self.datetime(epoch)
+        return moment.hour * 3600 + moment.minute * 60 + moment.second + moment.microsecond / 1e6
+
+    def isoformat(self, epoch):
+        """Same string as datetime.fromtimestamp(epoch, tz).isoformat()."""
+        if not self.fixed or type(epoch) is not int:
+            return self.datetime(epoch).isoformat()
+        day, second = divmod(epoch + self.offset, SECONDS_PER_DAY)
+        day_part = self._days.get(day)
+        if day_part is None:
+            day_part = self._days[day] = (EPOCH_DATE + timedelta(days=day)).isoformat()
+        time_part = self._times.get(second)
+        if time_part is None:
+            hours, rest = divmod(second, 3600)
+            time_part = self._times[second] = f"{hours:02d}:{rest // 60:02d}:{rest % 60:02d}"
+        return f"{day_part}T{time_part}{self.suffix}"
+
+
+_local_times = {}
+
+
+def local_time(tz):
+    """Shared LocalTime of a timezone (None for naive local time)."""
+    clock = _local_times.get(tz)
+    if clock is None:
+        clock = _local_times[tz] = LocalTime(tz)
+    return clock
@@ -0,0 +1,38 @@
+"""
+#########################################################################################################################################################
+
+Checkpoint files of the fast-forward simulation (run_simulation checkpoint_path / resume_from).
+
+A checkpoint is the state of the run at a 5-minute tick boundary: house, NPC needs and action state, random stream
+state, event queue, the partially built series and the position in the action log. It is stored as plain data
+(dicts, lists, numbers, datetimes) in a gzip-compressed pickle, written to a temporary file first so a crash while
+saving never leaves a broken checkpoint behind. Only load checkpoints you wrote yourself, they are pickles.
+
+#########################################################################################################################################################
+"""
+
+import gzip
+import os
+import pickle
+
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(path: str, snapshot: dict):
+    """Atomically write `snapshot` to `path`. Returns the path."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wb", compresslevel=6) as file:
+        pickle.dump(dict(snapshot, version=CHECKPOINT_VERSION), file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_checkpoint(path: str):
+    """Read a checkpoint written by save_checkpoint."""
+    with gzip.open(path, "rb") as file:
+        snapshot = pickle.load(file)
+    if snapshot.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Checkpoint {path} has version {snapshot.get('version')}, expected {CHECKPOINT_VERSION}.")
+    return snapshot
@@ -1,7 +1,8 @@
 
 from pvlib import location
+import numpy as np
 import pandas as pd
-from typing import Dict
+from typing import Dict, Tuple
 from datetime import datetime, timedelta
 import time
 
@@ -40,6 +41,29 @@ def get_solar_irradiance(lat: float, lon: float, tz: str, start_date: str, end_d
 
 
 
+def get_solar_irradiance_array(lat: float, lon: float, tz: str, start_date: str, end_date: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Same global solar irradiance as get_solar_irradiance, as arrays instead of a dict with string keys.
+    
+    Args:
+        lat: float. Latitude of the location.
+        lon: float. Longitude of the location.
+        tz: str. Time zone of the location.
+        start_date: str. Start date.
+        end_date: str. End date.
+    
+    Returns:
+        (epochs, ghi): tuple. int64 epoch seconds of every 5-minute step and the GHI (W/m²) at each of them.
+    """
+    times = pd.date_range(start=pd.to_datetime(start_date), end=pd.to_datetime(end_date), freq='5min', tz=tz)
+    ghi = location.Location(lat, lon, tz=tz).get_clearsky(times)['ghi']
+    
+    # Whole seconds since the epoch, whatever the resolution pandas uses for the index
+    epochs = np.asarray((times - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1), dtype=np.int64)
+    return epochs, ghi.to_numpy(dtype=float)
+
+
+
 def get_real_time_solar_irradiance(lat: float, lon: float, tz: str) -> Dict[str, float]:
     """
     Function to obtain the global solar irradiance at a specific location in real time.
@@ -72,6 +96,52 @@ def get_real_time_solar_irradiance(lat: float, lon: float, tz: str) -> Dict[str,
     return ghi_dict
 
 
+class ClearSkyIrradiance:
+    """
+    Clear-sky GHI for the real time loop. get_real_time_solar_irradiance builds a Location and runs pvlib for a single
+    timestamp on every call; here the Location is built once and the irradiance of a whole local day (every 5 minutes)
+    is computed the first time one of its instants is asked, so the other ticks of the day are an array lookup.
+    
+    Args:
+        lat: float. Latitude of the location.
+        lon: float. Longitude of the location.
+        tz: str. Time zone of the location.
+        step_minutes: int. Step of the irradiance series (default: 5).
+    """
+    
+    def __init__(self, lat: float, lon: float, tz: str, step_minutes: int = 5):
+        self.tz = tz
+        self.step = pd.Timedelta(minutes=step_minutes)
+        self.location = location.Location(lat, lon, tz=tz)
+        self._day = None
+        self._epochs = None
+        self._times = None
+        self._ghi = None
+    
+    def at(self, epoch: float) -> Tuple[str, float]:
+        """
+        Irradiance of the step that contains an instant.
+        
+        Args:
+            epoch: float. Instant in epoch seconds.
+        
+        Returns:
+            (timestamp, ghi): tuple. Start of the step, in the format of get_real_time_solar_irradiance
+            ("2024-06-01 12:05:00+02:00"), and its GHI in W/m².
+        """
+        moment = pd.Timestamp(epoch, unit="s", tz="UTC").tz_convert(self.tz)
+        day = moment.normalize()
+        if day != self._day:
+            # From local midnight to the next one, 23 or 25 hours on the days the clock changes
+            times = pd.date_range(start=day, end=day + pd.DateOffset(days=1), freq=self.step, inclusive="left")
+            self._day = day
+            self._times = times
+            self._epochs = np.asarray((times - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1), dtype=np.int64)
+            self._ghi = self.location.get_clearsky(times)['ghi'].to_numpy(dtype=float)
+        position = int(np.searchsorted(self._epochs, epoch, side="right")) - 1
+        return str(self._times[position]), float(self._ghi[position])
+
+
 
 # Example usage
 if __name__ == "__main__":
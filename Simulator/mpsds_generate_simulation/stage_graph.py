@@ -0,0 +1,161 @@
+"""
+#########################################################################################################################################################
+
+Small dependency graph of stages, for the fast-forward run of complete_simulation_generate.
+
+Every stage names the stages it needs; the results of those are its arguments. run() starts every stage as soon as
+its inputs are ready: "thread" stages (network fetches, and the stages that work on the big dicts of the run) on a
+thread pool, "process" stages (CPU-bound work with small inputs and outputs, e.g. pvlib) on a process pool so they do
+not hold the GIL of the rest, "main" stages in the calling thread while the pools run the others. A long stage that
+must stop on Ctrl+C (the NPC simulation saves a checkpoint and prints how to resume) is a "main" stage: the
+KeyboardInterrupt is raised in the calling thread only, and a pool worker would keep running until its stage is
+done. On an interruption the pools are shut down without waiting for their running stages. With concurrent=False the stages run one after the other in the calling thread, in the
+order they were added (what cProfile needs).
+
+Every stage is timed where it runs (wall and CPU time of its worker, and its memory: the traced peak of the stage
+while tracemalloc runs, which only happens in the serial --profile runs, otherwise the peak RSS of the process it ran
+in when it ended, process-wide) and placed on the timeline of the run. The
+critical path is the chain of dependent stages with the largest total time: the stages worth optimizing next, as the
+others run in its shadow.
+
+#########################################################################################################################################################
+"""
+
+import time
+import tracemalloc
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from instrumentation import peak_memory_mb
+
+
+STAGE_KINDS = ("thread", "process", "main")
+
+
+def _timed_call(function, args):
+    """
+    Run a stage in its worker. Returns (result, wall time, CPU time of the worker thread, (peak memory in MB, how it
+    was measured)).
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    result = function(*args)
+    wall_time, cpu_time = time.perf_counter() - wall_start, time.thread_time() - cpu_start
+    memory = (peak_memory_mb(), "tracemalloc" if tracing else "process_peak_rss")
+    return result, wall_time, cpu_time, memory
+
+
+class StageGraph:
+    """Stages and their dependencies, run once with run()."""
+
+    def __init__(self):
+        self.stages = {}
+        self.timeline = {}
+
+    def add(self, name: str, function, inputs=(), kind: str = "thread"):
+        """
+        Add a stage.
+
+        Args:
+            name (str): Stage name (also its name in the instrumentation).
+            function (callable): Called with the results of `inputs`, in that order. Must be picklable for "process".
+            inputs (tuple): Names of the stages it needs, already added.
+            kind (str): "thread", "process" or "main".
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already in the graph.")
+        if kind not in STAGE_KINDS:
+            raise ValueError(f"Unknown stage kind '{kind}', expected one of {', '.join(STAGE_KINDS)}.")
+        missing = [stage for stage in inputs if stage not in self.stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' needs stages that are not in the graph: {', '.join(missing)}.")
+        self.stages[name] = {"function": function, "inputs": tuple(inputs), "kind": kind}
+
+    def run(self, concurrent: bool = True) -> dict:
+        """
+        Run every stage once. The first exception of a stage is raised once the running stages are done (the
+        stages that did not start are cancelled).
+
+        Returns:
+            dict: {stage: result}.
+        """
+        self.timeline = {}
+        run_start = time.perf_counter()
+        results = {}
+
+        if not concurrent:
+            for name, stage in self.stages.items():
+                started = time.perf_counter() - run_start
+                results[name], wall_time, cpu_time, memory = _timed_call(stage["function"], [results[stage_input] for stage_input in stage["inputs"]])
+                self._record(name, started, time.perf_counter() - run_start, wall_time, cpu_time, memory)
+            return results
+
+        kinds = [stage["kind"] for stage in self.stages.values()]
+        threads = ThreadPoolExecutor(max_workers=max(1, kinds.count("thread")))
+        processes = ProcessPoolExecutor(max_workers=kinds.count("process")) if "process" in kinds else None
+        pending, running = dict(self.stages), {}
+        interrupted = False
+        try:
+            while pending or running:
+                ready = [name for name, stage in pending.items() if all(stage_input in results for stage_input in stage["inputs"])]
+                # Process stages first: the pool forks before the threads of the run start
+                main_stage = None
+                for name in sorted(ready, key=lambda name: self.stages[name]["kind"] != "process"):
+                    stage = pending[name]
+                    if stage["kind"] == "main":
+                        main_stage = main_stage or name
+                        continue
+                    pending.pop(name)
+                    executor = processes if stage["kind"] == "process" else threads
+                    future = executor.submit(_timed_call, stage["function"], [results[stage_input] for stage_input in stage["inputs"]])
+                    running[future] = (name, time.perf_counter() - run_start)
+                if main_stage is not None:
+                    # Runs here while the pools work; the loop then looks again for the stages it unblocked
+                    stage = pending.pop(main_stage)
+                    started = time.perf_counter() - run_start
+                    results[main_stage], wall_time, cpu_time, memory = _timed_call(stage["function"], [results[stage_input] for stage_input in stage["inputs"]])
+                    self._record(main_stage, started, time.perf_counter() - run_start, wall_time, cpu_time, memory)
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, started = running.pop(future)
+                    results[name], wall_time, cpu_time, memory = future.result()
+                    self._record(name, started, time.perf_counter() - run_start, wall_time, cpu_time, memory)
+        except KeyboardInterrupt:
+            interrupted = True
+            raise
+        finally:
+            threads.shutdown(wait=not interrupted, cancel_futures=True)
+            if processes is not None:
+                processes.shutdown(wait=not interrupted, cancel_futures=True)
+        return results
+
+    def _record(self, name, started, finished, wall_time, cpu_time, memory):
+        self.timeline[name] = {"kind": self.stages[name]["kind"], "started_s": started, "finished_s": finished,
+                               "wall_time_s": wall_time, "cpu_time_s": cpu_time,
+                               "peak_memory_mb": memory[0], "memory_measure": memory[1]}
+
+    def critical_path(self):
+        """
+        Longest chain of dependent stages, weighted by the wall time of every stage (after run()).
+
+        Returns:
+            tuple: (list of stage names from the first to the last, total wall time in seconds).
+        """
+        longest = {}
+        for name, stage in self.stages.items():
+            # Stages are added after their inputs, so this is a topological order
+            previous = max(stage["inputs"], key=lambda stage_input: longest[stage_input][1], default=None)
+            chain, total = longest[previous] if previous is not None else ([], 0.0)
+            longest[name] = (chain + [name], total + self.timeline[name]["wall_time_s"])
+        return max(longest.values(), key=lambda entry: entry[1], default=([], 0.0))
+
+    def report(self) -> dict:
+        """Plain dict (JSON-serializable) with the timeline of the stages and the critical path."""
+        path, total = self.critical_path()
+        return {
+            "stages": {name: dict(entry, inputs=list(self.stages[name]["inputs"])) for name, entry in self.timeline.items()},
+            "critical_path": path,
+            "critical_path_s": total
+        }
@@ -0,0 +1,133 @@
+"""
+#########################################################################################################################################################
+
+Streaming accumulators over whole series, for ensembles of simulations.
+
+Every observation is an array (one value per interval of a simulation) and the accumulators keep a fixed amount of
+state per interval whatever the number of observations, so K replicas of a house never have to be in memory together.
+
+RunningMoments: mean and standard deviation with Welford's update (exact).
+StreamingQuantiles: P10/P50/P90-style estimates with the extended P² algorithm (Jain & Chlamtac, generalized to
+several quantiles by Raatikainen): 2m + 3 markers per interval for m quantiles, moved with a parabolic (or linear)
+prediction after every observation. Until there are as many observations as markers they are kept and the quantiles
+are exact (np.percentile, linear interpolation).
+
+#########################################################################################################################################################
+"""
+
+import numpy as np
+
+
+class RunningMoments:
+    """Element-wise count, mean and variance of a stream of equally shaped arrays."""
+
+    def __init__(self):
+        self.count = 0
+        self._mean = None
+        self._m2 = None
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        self.count += 1
+        if self._mean is None:
+            self._mean = values.copy()
+            self._m2 = np.zeros_like(values)
+            return
+        delta = values - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (values - self._mean)
+
+    def mean(self):
+        return self._mean.copy()
+
+    def variance(self, ddof=1):
+        if self.count <= ddof:
+            return np.zeros_like(self._mean)
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.variance(ddof))
+
+
+class StreamingQuantiles:
+    """
+    Element-wise quantile estimates of a stream of equally shaped arrays (extended P²).
+
+    Args:
+        quantiles (tuple): Probabilities to estimate, e.g. (0.1, 0.5, 0.9).
+
+    Elements that are NaN in any observation are NaN in the estimates.
+    """
+
+    def __init__(self, quantiles=(0.1, 0.5, 0.9)):
+        self.quantiles = tuple(quantiles)
+        # Markers at 0, 1, the quantiles and the midpoints between them
+        points = sorted({0.0, 1.0, *self.quantiles})
+        midpoints = [(low + high) / 2 for low, high in zip(points[:-1], points[1:])]
+        self.probabilities = np.array(sorted(points + midpoints))
+        self.markers = len(self.probabilities)
+        self._marker_of = {quantile: int(np.argmin(np.abs(self.probabilities - quantile))) for quantile in self.quantiles}
+
+        self.count = 0
+        self._buffer = []
+        self._heights = None
+        self._positions = None
+        self._missing = None
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        missing = np.isnan(values)
+        self._missing = missing if self._missing is None else self._missing | missing
+        values = np.where(missing, 0.0, values)
+        self.count += 1
+
+        # Exact until every marker has an observation
+        if self._heights is None:
+            self._buffer.append(values)
+            if len(self._buffer) == self.markers:
+                self._heights = np.sort(np.stack(self._buffer), axis=0)
+                self._positions = np.broadcast_to(np.arange(1.0, self.markers + 1)[:, None], self._heights.shape).copy()
+                self._buffer = []
+            return
+
+        heights, positions = self._heights, self._positions
+        np.minimum(heights[0], values, out=heights[0])
+        np.maximum(heights[-1], values, out=heights[-1])
+        positions[1:-1] += heights[1:-1] > values
+        positions[-1] += 1
+
+        desired = 1 + (self.count - 1) * self.probabilities
+        for i in range(1, self.markers - 1):
+            offset = desired[i] - positions[i]
+            move_up = (offset >= 1) & (positions[i + 1] - positions[i] > 1)
+            move_down = (offset <= -1) & (positions[i - 1] - positions[i] < -1)
+            move = move_up | move_down
+            if not move.any():
+                continue
+            step = np.where(move_up, 1.0, -1.0)
+
+            # Parabolic prediction, linear when it would leave the neighbours' interval
+            q_low, q, q_high = heights[i - 1], heights[i], heights[i + 1]
+            n_low, n, n_high = positions[i - 1], positions[i], positions[i + 1]
+            parabolic = q + step / (n_high - n_low) * ((n - n_low + step) * (q_high - q) / (n_high - n)
+                                                        + (n_high - n - step) * (q - q_low) / (n - n_low))
+            neighbour_q = np.where(move_up, q_high, q_low)
+            neighbour_n = np.where(move_up, n_high, n_low)
+            linear = q + step * (neighbour_q - q) / (neighbour_n - n)
+            predicted = np.where((q_low < parabolic) & (parabolic < q_high), parabolic, linear)
+
+            heights[i] = np.where(move, predicted, q)
+            positions[i] = np.where(move, n + step, n)
+
+    def quantile(self, quantile):
+        """Estimate of one of the quantiles given to the constructor."""
+        if self._heights is None:
+            estimate = np.percentile(np.stack(self._buffer), quantile * 100, axis=0)
+        else:
+            estimate = self._heights[self._marker_of[quantile]].copy()
+        return np.where(self._missing, np.nan, estimate)
+
+    @property
+    def exact(self):
+        """True while the estimates are exact (fewer observations than markers)."""
+        return self._heights is None
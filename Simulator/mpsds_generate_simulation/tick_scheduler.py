@@ -0,0 +1,158 @@
+"""
+#########################################################################################################################################################
+
+Clock of the real time loop of puppeteer.py.
+
+The loop used to run a tick and then time.sleep(300): every tick started 300 s plus the duration of the previous tick
+after the one before, so the ticks drifted later and later. TickScheduler keeps the deadlines on the wall-clock grid
+of the interval (12:00:00, 12:05:00, 12:10:00...): the sleep is measured against the clock, whatever the tick took.
+A tick that overruns a whole interval does not queue up ticks to catch up: the missed slots are skipped (and counted),
+the engine accounts for the longer interval on its next tick.
+
+TickLatency measures every tick: the lag (how late it started after its deadline), the time of every stage and the
+latency (from the deadline to the record flushed to the output). Means, P50/P95/P99 (streaming_stats, constant memory
+however long the loop runs) and maxima are reported with summary().
+
+#########################################################################################################################################################
+"""
+
+import math
+import time
+
+import numpy as np
+
+from streaming_stats import RunningMoments, StreamingQuantiles
+
+
+class TickScheduler:
+    """
+    Deadlines every `interval_seconds`, aligned on the wall clock.
+
+    Args:
+        interval_seconds (float): Interval between two ticks (default: 300).
+        immediate (bool): Run the first tick at once, for the slot the loop starts in (lag reported as 0), instead of
+            waiting for the next slot (default: True).
+        clock (callable): Wall clock in epoch seconds (default: time.time).
+        sleep (callable): Sleep function (default: time.sleep).
+        max_sleep_seconds (float): Longest single sleep, so a change of the system clock is noticed (default: 5).
+    """
+
+    def __init__(self, interval_seconds: float = 300, immediate: bool = True, clock=None, sleep=None, max_sleep_seconds: float = 5.0):
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be positive.")
+        self.interval_seconds = interval_seconds
+        self.immediate = immediate
+        self.clock = clock or time.time
+        self.sleep = sleep or time.sleep
+        self.max_sleep_seconds = max_sleep_seconds
+        self.deadline = None
+        self.ticks = 0
+        self.missed_ticks = 0
+
+    def slot(self, epoch: float) -> float:
+        """Start of the slot of the grid that contains `epoch`."""
+        return math.floor(epoch / self.interval_seconds) * self.interval_seconds
+
+    def wait(self):
+        """
+        Sleep until the next deadline.
+
+        Returns:
+            tuple: (deadline in epoch seconds, lag in seconds after it, slots skipped since the previous tick).
+        """
+        now = self.clock()
+        missed = 0
+        if self.deadline is None:
+            self.deadline = self.slot(now) if self.immediate else self.slot(now) + self.interval_seconds
+            if self.immediate:
+                self.ticks += 1
+                return self.deadline, 0.0, 0
+        else:
+            self.deadline += self.interval_seconds
+            if now >= self.deadline + self.interval_seconds:
+                # Overran whole intervals: skip to the slot the clock is in
+                missed = int((now - self.deadline) // self.interval_seconds)
+                self.deadline += missed * self.interval_seconds
+                self.missed_ticks += missed
+
+        while (remaining := self.deadline - now) > 0:
+            self.sleep(min(remaining, self.max_sleep_seconds))
+            now = self.clock()
+        self.ticks += 1
+        return self.deadline, now - self.deadline, missed
+
+
+class TickLatency:
+    """
+    Per-tick timings of the real time loop: start_tick(), lap(stage) after every stage, end_tick().
+
+    Args:
+        quantiles (tuple): Quantiles of the latency and the lag in summary() (default: P50, P95, P99).
+    """
+
+    def __init__(self, quantiles=(0.5, 0.95, 0.99)):
+        self.quantiles = tuple(quantiles)
+        self.ticks = 0
+        self.missed_ticks = 0
+        self._series = {name: (RunningMoments(), StreamingQuantiles(self.quantiles)) for name in ("latency_s", "lag_s", "compute_s")}
+        self._maxima = {name: 0.0 for name in self._series}
+        self._stages = {}
+        self._current = None
+
+    def start_tick(self, lag_seconds: float = 0.0, missed: int = 0):
+        """A tick starts, `lag_seconds` after its deadline."""
+        now = time.perf_counter()
+        self._current = {"lag_s": lag_seconds, "started": now, "last": now, "stages": {}}
+        self.missed_ticks += missed
+
+    def lap(self, stage: str):
+        """The stage `stage` of the current tick is over."""
+        now = time.perf_counter()
+        current = self._current
+        current["stages"][stage] = now - current["last"]
+        current["last"] = now
+
+    def end_tick(self) -> dict:
+        """
+        The tick is over (its record is flushed).
+
+        Returns:
+            dict: Timings of the tick: lag_s, compute_s, latency_s (lag + compute) and stages_s.
+        """
+        current, self._current = self._current, None
+        compute = time.perf_counter() - current["started"]
+        tick = {"lag_s": current["lag_s"], "compute_s": compute, "latency_s": current["lag_s"] + compute, "stages_s": current["stages"]}
+        self.ticks += 1
+        for name, (moments, quantiles) in self._series.items():
+            moments.add(np.array([tick[name]]))
+            quantiles.add(np.array([tick[name]]))
+            self._maxima[name] = max(self._maxima[name], tick[name])
+        for stage, seconds in current["stages"].items():
+            total = self._stages.setdefault(stage, [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+            total[2] = max(total[2], seconds)
+        return tick
+
+    def summary(self) -> dict:
+        """Plain dict (JSON-serializable): ticks, missed ticks, statistics of the latency, lag and compute time and of every stage."""
+        summary = {"ticks": self.ticks, "missed_ticks": self.missed_ticks}
+        for name, (moments, quantiles) in self._series.items():
+            if not self.ticks:
+                summary[name] = None
+                continue
+            summary[name] = {"mean": float(moments.mean()[0]), "max": self._maxima[name]}
+            for quantile in self.quantiles:
+                summary[name][f"p{quantile * 100:g}"] = float(quantiles.quantile(quantile)[0])
+        summary["stages_s"] = {stage: {"mean": total / count, "max": maximum} for stage, (count, total, maximum) in self._stages.items()}
+        return summary
+
+    def report(self) -> str:
+        """One line for the console."""
+        summary = self.summary()
+        if not self.ticks:
+            return "No ticks yet."
+        latency = summary["latency_s"]
+        percentiles = ", ".join(f"{name} {latency[name] * 1000:.1f} ms" for name in latency if name.startswith("p"))
+        return (f"{self.ticks} ticks ({self.missed_ticks} missed), latency: mean {latency['mean'] * 1000:.1f} ms, "
+                f"{percentiles}, max {latency['max'] * 1000:.1f} ms")
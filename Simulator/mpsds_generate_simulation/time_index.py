@@ -0,0 +1,118 @@
+"""
+#########################################################################################################################################################
+
+Canonical time index of a fast-forward run.
+
+Every stage of puppeteer.py produces {timestamp: value} dicts, but not with the same keys: run_simulation uses ISO
+strings ("2021-01-01T00:05:00+01:00"), the solar stage the pandas form ("2021-01-01 00:05:00+01:00") and the grid and
+battery stages the standardized form ("2021-01-01 00:05:00+0100"). Joining them used to mean standardizing every key
+of every dict (fromisoformat + strftime), intersecting the key sets and sorting them again.
+
+A TimeIndex is built once from the simulation horizon: the epoch seconds of the start of every interval, in the UTC
+offset of the simulation. It knows the position of each of the three spellings of its own timestamps, so aligning a
+dict is one lookup per key and the joins are done on integer positions. Keys in another UTC offset (e.g. summer time
+irradiance) are parsed and matched by instant; keys outside the index are ignored.
+
+#########################################################################################################################################################
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import instrumentation
+from sim_clock import local_time
+
+
+class TimeIndex:
+    """
+    Start of every interval of a run.
+
+    Args:
+        epochs (array-like): Epoch seconds of every interval, increasing.
+        utc_offset (int): UTC offset of the timestamps in seconds (the simulation runs in +01:00).
+    """
+
+    def __init__(self, epochs, utc_offset=3600):
+        self.epochs = np.asarray(epochs, dtype=np.int64)
+        self.utc_offset = int(utc_offset)
+        self.tz = timezone(timedelta(seconds=self.utc_offset))
+        self._isoformat = None
+        self._standardized = None
+        self._positions = None
+
+    @classmethod
+    def from_horizon(cls, start_date: str, end_date: str, step_seconds: int = 300, utc_offset: int = 3600):
+        """Intervals run_simulation produces between two dates (YYYY-MM-DD, midnight in the given UTC offset)."""
+        tz = timezone(timedelta(seconds=utc_offset))
+        start_epoch = int(datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=tz).timestamp())
+        end_epoch = int(datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=tz).timestamp())
+        num_ticks = max(0, -(-(end_epoch - start_epoch) // step_seconds))
+        return cls(start_epoch + np.arange(num_ticks, dtype=np.int64) * step_seconds, utc_offset)
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def datetimes(self):
+        return [datetime.fromtimestamp(epoch, self.tz) for epoch in self.epochs.tolist()]
+
+    def isoformat(self):
+        """ISO timestamps of the index, the keys of run_simulation."""
+        if self._isoformat is None:
+            clock = local_time(self.tz)
+            self._isoformat = [clock.isoformat(epoch) for epoch in self.epochs.tolist()]
+        return self._isoformat
+
+    def standardized(self):
+        """Timestamps of the index in the standardize_timestamp_format form ("2021-01-01 00:05:00+0100")."""
+        if self._standardized is None:
+            self._standardized = [f"{timestamp[:10]} {timestamp[11:22]}{timestamp[23:]}" for timestamp in self.isoformat()]
+            instrumentation.count("timestamps_standardized", len(self._standardized))
+        return self._standardized
+
+    def _position_of_key(self):
+        if self._positions is None:
+            positions = {}
+            for position, (iso_key, standardized_key) in enumerate(zip(self.isoformat(), self.standardized())):
+                positions[iso_key] = positions[iso_key.replace("T", " ")] = positions[standardized_key] = position
+            self._positions = positions
+        return self._positions
+
+    def position(self, timestamp):
+        """Position of a timestamp string (any ISO spelling or UTC offset), None when it is not in the index."""
+        position = self._position_of_key().get(timestamp)
+        if position is not None:
+            return position
+        try:
+            epoch = datetime.fromisoformat(timestamp.replace(" ", "T")).timestamp()
+        except (AttributeError, ValueError):
+            return None
+        position = int(np.searchsorted(self.epochs, epoch))
+        return position if position < len(self.epochs) and self.epochs[position] == epoch else None
+
+    def positions(self, series):
+        """{position: value} of a {timestamp: value} dict, keys outside the index dropped."""
+        aligned = {}
+        for timestamp, value in series.items():
+            position = self.position(timestamp)
+            if position is not None:
+                aligned[position] = value
+        return aligned
+
+    def align(self, series):
+        """Float values of a {timestamp: value} dict at every position of the index, NaN where missing."""
+        values = np.full(len(self.epochs), np.nan)
+        for position, value in self.positions(series).items():
+            values[position] = value
+        return values
+
+    def align_epochs(self, epochs, values):
+        """Values given at epoch seconds (e.g. an irradiance series) at every position of the index, NaN where missing."""
+        epochs = np.asarray(epochs, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        aligned = np.full(len(self.epochs), np.nan)
+        positions = np.searchsorted(self.epochs, epochs)
+        inside = positions < len(self.epochs)
+        inside[inside] = self.epochs[positions[inside]] == epochs[inside]
+        aligned[positions[inside]] = values[inside]
+        return aligned